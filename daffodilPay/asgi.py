@@ -3,6 +3,9 @@ ASGI config for daffodilPay project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests to ``EVENT_STREAM_PATH`` (SSE or WebSocket) are served by the
+wallet event stream; everything else goes to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -13,4 +16,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "daffodilPay.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from wallet.streaming import event_stream  # noqa: E402
+
+EVENT_STREAM_PATH = getattr(settings, 'EVENT_STREAM_PATH', '/api/v1/events/')
+
+
+async def application(scope, receive, send):
+    if scope['type'] in ('http', 'websocket') and scope['path'] == EVENT_STREAM_PATH:
+        await event_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
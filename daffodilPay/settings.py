@@ -32,6 +32,9 @@ LOCAL_APPS = [
 INSTALLED_APPS += THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'wallet.metrics.MetricsMiddleware',
+    'wallet.profiling.SlowRequestMiddleware',
+    'wallet.tracing.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -66,13 +69,30 @@ WSGI_APPLICATION = 'daffodilPay.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL lets readers run alongside the one writer; IMMEDIATE transactions queue for the
+# write lock (up to the busy timeout) instead of failing on their first write
+SQLITE_OPTIONS = {
+    'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': 'PRAGMA journal_mode=WAL',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'daffodilPay.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Optional second database, e.g. a SQLite file on another disk (see torture_transfers --database stress)
+if config('STRESS_DATABASE_NAME', default=''):
+    DATABASES['stress'] = {
+        'ENGINE': 'daffodilPay.sqlite3',
+        'NAME': config('STRESS_DATABASE_NAME'),
+        'OPTIONS': SQLITE_OPTIONS,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -182,47 +202,160 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Wallet engine
+FEE_SCHEDULE_CHECK_SECONDS = config('FEE_SCHEDULE_CHECK_SECONDS', default=30, cast=int)
+FX_RATE_REFRESH_SECONDS = config('FX_RATE_REFRESH_SECONDS', default=60, cast=int)
+FX_PIVOT_CURRENCY = 'USD'
+
+# Event stream (ASGI only, see daffodilPay/asgi.py)
+EVENT_STREAM_PATH = '/api/v1/events/'
+EVENT_STREAM_HEARTBEAT_SECONDS = config('EVENT_STREAM_HEARTBEAT_SECONDS', default=15, cast=int)
+EVENT_STREAM_QUEUE_SIZE = 100
+EVENT_BROKER = {
+    # utils.events.LocalBroker (single process) or utils.events.SocketBroker
+    'BACKEND': config('EVENT_BROKER_BACKEND', default='utils.events.LocalBroker'),
+    'HOST': config('EVENT_BROKER_HOST', default='127.0.0.1'),
+    'PORT': config('EVENT_BROKER_PORT', default=8765, cast=int),
+}
+
+# Payment providers (simulated when PROVIDER_API_URL is empty)
+PROVIDER_API_URL = config('PROVIDER_API_URL', default='')
+PROVIDER_MAX_CONCURRENCY = config('PROVIDER_MAX_CONCURRENCY', default=100, cast=int)
+PROVIDER_TIMEOUT_SECONDS = config('PROVIDER_TIMEOUT_SECONDS', default=10, cast=int)
+PROVIDER_SIMULATED_LATENCY_MS = config('PROVIDER_SIMULATED_LATENCY_MS', default=0, cast=int)
+
+# Per-provider bulkheads and circuit breakers (utils.resilience); keys: MAX_CONCURRENT,
+# MAX_WAIT_SECONDS, FAILURE_THRESHOLD, RECOVERY_SECONDS, HALF_OPEN_CALLS
+PROVIDER_RESILIENCE = {
+    'default': {'MAX_CONCURRENT': 20, 'MAX_WAIT_SECONDS': 0.1, 'FAILURE_THRESHOLD': 5, 'RECOVERY_SECONDS': 30},
+    # 'bkash': {'MAX_CONCURRENT': 10},
+}
+
+# Provider retries (see retry_transactions); attempts include the first call
+TRANSACTION_RETRY_MAX_ATTEMPTS = config('TRANSACTION_RETRY_MAX_ATTEMPTS', default=5, cast=int)
+TRANSACTION_RETRY_BACKOFF_SECONDS = 5
+TRANSACTION_RETRY_MAX_BACKOFF_SECONDS = 600
+
+# Pending/processing transactions untouched this long are settled by sweep_stale_transactions
+TRANSACTION_STALE_AFTER_MINUTES = config('TRANSACTION_STALE_AFTER_MINUTES', default=15, cast=int)
+
+# Transactional outbox (see dispatch_outbox)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=500, cast=int)
+OUTBOX_LEASE_SECONDS = 30
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_BACKOFF_SECONDS = 2
+OUTBOX_MAX_BACKOFF_SECONDS = 300
+OUTBOX_RETENTION_HOURS = config('OUTBOX_RETENTION_HOURS', default=24, cast=int)
+OUTBOX_SINKS = [
+    # utils.outbox.HttpSink (URL), utils.outbox.FileSink (PATH) or utils.outbox.QueueSink
+    {'BACKEND': 'utils.outbox.FileSink', 'PATH': str(BASE_DIR / 'outbox.jsonl')},
+]
+
+# Bulk disbursements (see run_disbursements)
+DISBURSEMENT_CHUNK_SIZE = config('DISBURSEMENT_CHUNK_SIZE', default=500, cast=int)
+DISBURSEMENT_MAX_ROWS = 200000
+DISBURSEMENT_LEASE_SECONDS = 300
+
+# Provider settlement files (see generate_settlements)
+SETTLEMENT_ROOT = config('SETTLEMENT_ROOT', default=str(BASE_DIR / 'settlements'))
+SETTLEMENT_CUTOFF_HOUR = config('SETTLEMENT_CUTOFF_HOUR', default=18, cast=int)
+SETTLEMENT_CHUNK_SIZE = 1000
+# A window also settles rows completed this long before its start, committed after that file
+SETTLEMENT_GRACE_MINUTES = 10
+
+# Transaction archive (see archive_transactions)
+TRANSACTION_ARCHIVE_ROOT = config('TRANSACTION_ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+TRANSACTION_ARCHIVE_AFTER_MONTHS = config('TRANSACTION_ARCHIVE_AFTER_MONTHS', default=12, cast=int)
+TRANSACTION_ARCHIVE_BLOCK_SIZE = 256
+TRANSACTION_ARCHIVE_CHUNK_SIZE = 2000
+
+# Transaction log partitions (see partition_transaction_logs)
+TRANSACTION_LOG_RETENTION_MONTHS = config('TRANSACTION_LOG_RETENTION_MONTHS', default=36, cast=int)
+
+# End-of-day balance snapshots (see snapshot_balances)
+BALANCE_SNAPSHOT_CHUNK_SIZE = config('BALANCE_SNAPSHOT_CHUNK_SIZE', default=1000, cast=int)
+BALANCE_HISTORY_MAX_DAYS = config('BALANCE_HISTORY_MAX_DAYS', default=366, cast=int)
+
+# Monthly statements (see generate_statements)
+STATEMENT_ROOT = config('STATEMENT_ROOT', default=str(BASE_DIR / 'statements'))
+STATEMENT_SHARD_SIZE = config('STATEMENT_SHARD_SIZE', default=1000, cast=int)
+
+# Request metrics at /metrics (see wallet/metrics.py); set the directory when running several worker processes
+METRICS_MULTIPROCESS_DIR = config('METRICS_MULTIPROCESS_DIR', default='')
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=1.0, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Slow-request profiler (see wallet/profiling.py); off while the threshold is 0
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=0, cast=int)
+SLOW_REQUEST_SAMPLE_INTERVAL_MS = config('SLOW_REQUEST_SAMPLE_INTERVAL_MS', default=5, cast=int)
+SLOW_REQUEST_CPROFILE_RATE = config('SLOW_REQUEST_CPROFILE_RATE', default=0.0, cast=float)
+SLOW_REQUEST_DIR = config('SLOW_REQUEST_DIR', default=str(BASE_DIR / 'slow_requests'))
+SLOW_REQUEST_KEEP = config('SLOW_REQUEST_KEEP', default=100, cast=int)
+
+# Transfer tracing (see utils/tracing.py and trace_summary); off while both targets are empty
+TRACING_FILE = config('TRACING_FILE', default='')
+TRACING_OTLP_ENDPOINT = config('TRACING_OTLP_ENDPOINT', default='')  # e.g. http://localhost:4318/v1/traces
+TRACING_SAMPLE_RATE = config('TRACING_SAMPLE_RATE', default=1.0, cast=float)
+TRACING_BATCH_SIZE = config('TRACING_BATCH_SIZE', default=512, cast=int)
+TRACING_EXPORT_SECONDS = config('TRACING_EXPORT_SECONDS', default=2.0, cast=float)
+
+# Memory profiling (see wallet/memory.py and memory_report); tracemalloc slows allocation, so it is opt-in
+MEMORY_PROFILING = config('MEMORY_PROFILING', default=False, cast=bool)
+MEMORY_TRACE_FRAMES = config('MEMORY_TRACE_FRAMES', default=1, cast=int)
+MEMORY_SNAPSHOT_INTERVAL = config('MEMORY_SNAPSHOT_INTERVAL', default=0, cast=int)  # seconds; 0: no periodic dumps
+MEMORY_SNAPSHOT_DIR = config('MEMORY_SNAPSHOT_DIR', default=str(BASE_DIR / 'memory_snapshots'))
+MEMORY_SNAPSHOT_KEEP = config('MEMORY_SNAPSHOT_KEEP', default=24, cast=int)  # per process
+MEMORY_SNAPSHOT_PROCESSES = config('MEMORY_SNAPSHOT_PROCESSES', default=20, cast=int)
+
+# Logging pipeline (see utils/log_pipeline.py); LOG_SAMPLE_RATES is e.g. "wallet.signals=0.1,utils.wallet_process=0.1".
+# Every process appends to LOG_FILE and the one holding LOG_FILE.lock rotates it: do not also logrotate it.
+LOG_FILE = config('LOG_FILE', default=str(BASE_DIR / 'debug.log'))
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+LOG_ROTATE_SECONDS = config('LOG_ROTATE_SECONDS', default=24 * 3600, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=14, cast=int)
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (item.split('=') for item in config('LOG_SAMPLE_RATES', default='').split(',') if item.strip())
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+    'filters': {
+        'sampling': {
+            '()': 'utils.log_pipeline.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
         },
     },
     'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'debug.log',
-            'formatter': 'verbose',
-        },
-        'console': {
+        # JSON lines to LOG_FILE (INFO and up) and text to the console, written by a background thread
+        'queue': {
             'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'class': 'utils.log_pipeline.QueueingHandler',
+            'filters': ['sampling'],
+            'filename': LOG_FILE,
+            'max_bytes': LOG_MAX_BYTES,
+            'rotate_seconds': LOG_ROTATE_SECONDS,
+            'backup_count': LOG_BACKUP_COUNT,
+            'queue_size': LOG_QUEUE_SIZE,
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'wallet': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
@@ -0,0 +1 @@
+# daffodilPay/sqlite3/__init__.py
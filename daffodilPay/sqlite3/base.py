@@ -0,0 +1,34 @@
+# daffodilPay/sqlite3/base.py
+"""
+SQLite backend with the two concurrency OPTIONS Django 5.1 adds to its own.
+
+init_command: statements (';'-separated PRAGMAs) run on every new connection.
+transaction_mode: BEGIN mode for atomic blocks, e.g. IMMEDIATE, so a
+transaction takes the write lock up front and waits out the busy timeout,
+instead of failing with "database is locked" when it first writes.
+
+Switch back to django.db.backends.sqlite3 after upgrading to Django 5.1.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        init_command = kwargs.pop('init_command', '')
+        self.init_commands = [command.strip() for command in init_command.split(';') if command.strip()]
+        self.transaction_mode = kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
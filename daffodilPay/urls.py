@@ -8,6 +8,8 @@ from drf_yasg import openapi
 from rest_framework import permissions
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 
+from wallet.metrics import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="DaffodilPay API",
@@ -25,6 +27,7 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('wallet.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 
@@ -0,0 +1,66 @@
+# utils/anomaly.py
+import numpy as np
+
+
+def build_daily_matrix(user_ids, row_user_ids, row_day_index, row_amounts, n_days):
+    """Scatter (user, day, amount) rows into a dense users x days matrix"""
+    matrix = np.zeros((len(user_ids), n_days), dtype=np.float64)
+    if len(row_user_ids) == 0:
+        return matrix
+
+    rows = np.searchsorted(user_ids, row_user_ids)
+    np.add.at(matrix, (rows, row_day_index), row_amounts)
+    return matrix
+
+
+def rolling_zscores(matrix, window, min_std=1.0):
+    """
+    Z-score of every day against the mean/std of the preceding `window` days.
+
+    Columns without a full trailing window get a z-score of 0.
+    """
+    n_users, n_days = matrix.shape
+    zscores = np.zeros_like(matrix)
+    if n_days <= window:
+        return zscores
+
+    # Prefix sums give every trailing window sum in O(1)
+    padded = np.zeros((n_users, n_days + 1))
+    padded_sq = np.zeros((n_users, n_days + 1))
+    np.cumsum(matrix, axis=1, out=padded[:, 1:])
+    np.cumsum(matrix * matrix, axis=1, out=padded_sq[:, 1:])
+
+    window_sum = padded[:, window:n_days] - padded[:, :n_days - window]
+    window_sq = padded_sq[:, window:n_days] - padded_sq[:, :n_days - window]
+    mean = window_sum / window
+    variance = np.clip(window_sq / window - mean * mean, 0.0, None)
+    std = np.maximum(np.sqrt(variance), min_std)
+
+    zscores[:, window:] = (matrix[:, window:] - mean) / std
+    return zscores
+
+
+def peer_percentiles(group_codes, values):
+    """
+    Percentile rank (0-100) of every value within its peer group.
+
+    Returns (percentiles, group_sizes). Single-member groups rank at 0.
+    """
+    n = len(values)
+    percentiles = np.zeros(n, dtype=np.float64)
+    group_sizes = np.zeros(n, dtype=np.int64)
+    if n == 0:
+        return percentiles, group_sizes
+
+    order = np.lexsort((values, group_codes))
+    sorted_groups = group_codes[order]
+
+    counts = np.bincount(group_codes)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank_in_group = np.arange(n) - starts[sorted_groups]
+    size = counts[sorted_groups]
+
+    denominator = np.maximum(size - 1, 1)
+    percentiles[order] = 100.0 * rank_in_group / denominator
+    group_sizes[order] = size
+    return percentiles, group_sizes
@@ -0,0 +1,216 @@
+# utils/archive.py
+from bisect import bisect_left
+from datetime import date, datetime
+from decimal import Decimal
+import hashlib
+import json
+import mmap
+import os
+import struct
+import uuid
+import zlib
+
+# Segment files (append-only, written once):
+#   <name>.seg   zlib-compressed blocks of JSON lines, records sorted by (user_id, -created_at)
+#   <name>.blk   block table: offset, compressed length, record count
+#   <name>.uidx  sparse index: one entry per (user, block) run with its date range
+#   <name>.tidx  transaction_id -> block, sorted by transaction_id
+BLOCK_ENTRY = struct.Struct('<QII')
+USER_ENTRY = struct.Struct('<qddIII')
+TXN_ENTRY = struct.Struct('<16sI')
+
+
+def _encode(value):
+    """JSON fallback keeping full precision (DjangoJSONEncoder truncates microseconds)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class SegmentWriter:
+    """
+    Build one archive segment from records already sorted by (user_id, -created_at).
+
+    Records are buffered one block at a time, so memory is bounded by the
+    block size plus 20 bytes per record for the transaction_id index.
+    """
+
+    def __init__(self, path, block_size=256, compression_level=6):
+        self.path = path
+        self.block_size = block_size
+        self.compression_level = compression_level
+        self.block = []
+        self.blocks = []
+        self.user_entries = []
+        self.txn_entries = []
+        self.count = 0
+        self.digest = hashlib.sha256()
+        self.data = open(self._part(path, '.seg'), 'wb')
+
+    @staticmethod
+    def _part(path, suffix):
+        return f'{path}{suffix}.part'
+
+    def add(self, record):
+        """Append one record: a dict with user_id, created_at (datetime) and transaction_id"""
+        self.block.append(record)
+        if len(self.block) >= self.block_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.block:
+            return
+        block_no = len(self.blocks)
+        lines = ''.join(json.dumps(record, default=_encode) + '\n' for record in self.block)
+        compressed = zlib.compress(lines.encode('utf-8'), self.compression_level)
+        self.blocks.append((self.data.tell(), len(compressed), len(self.block)))
+        self.data.write(compressed)
+        self.digest.update(compressed)
+
+        for row, record in enumerate(self.block):
+            timestamp = record['created_at'].timestamp()
+            entry = self.user_entries[-1] if self.user_entries else None
+            if entry and entry[0] == record['user_id'] and entry[3] == block_no:
+                # Same user run: extend it (rows are newest first)
+                entry[2] = timestamp
+                entry[5] += 1
+            else:
+                self.user_entries.append([record['user_id'], timestamp, timestamp, block_no, row, 1])
+            self.txn_entries.append((uuid.UUID(str(record['transaction_id'])).bytes, block_no))
+
+        self.count += len(self.block)
+        self.block = []
+
+    def close(self):
+        """Write the index files and move everything into place; returns the data checksum"""
+        self._flush()
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        self.data.close()
+
+        self.txn_entries.sort()
+        indexes = {
+            '.blk': (BLOCK_ENTRY, self.blocks),
+            '.uidx': (USER_ENTRY, self.user_entries),
+            '.tidx': (TXN_ENTRY, self.txn_entries),
+        }
+        for suffix, (layout, entries) in indexes.items():
+            with open(self._part(self.path, suffix), 'wb') as f:
+                for entry in entries:
+                    f.write(layout.pack(*entry))
+                f.flush()
+                os.fsync(f.fileno())
+
+        for suffix in ('.seg', *indexes):
+            os.replace(self._part(self.path, suffix), f'{self.path}{suffix}')
+        return self.digest.hexdigest()
+
+    def abort(self):
+        self.data.close()
+        for suffix in ('.seg', '.blk', '.uidx', '.tidx'):
+            try:
+                os.remove(self._part(self.path, suffix))
+            except FileNotFoundError:
+                pass
+
+
+class _MappedIndex:
+    """Read-only memory-mapped array of fixed-width entries"""
+
+    def __init__(self, filename, layout):
+        self.layout = layout
+        self.file = open(filename, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.length = size // layout.size
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.layout.unpack_from(self.map, index * self.layout.size)
+
+    def close(self):
+        if self.length:
+            self.map.close()
+        self.file.close()
+
+
+class _Keys:
+    """Sequence view of the first field of each index entry, for bisect"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, position):
+        return self.index[position][0]
+
+
+class SegmentReader:
+    """Random access to one segment through its memory-mapped indexes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.blocks = _MappedIndex(f'{path}.blk', BLOCK_ENTRY)
+        self.users = _MappedIndex(f'{path}.uidx', USER_ENTRY)
+        self.txns = _MappedIndex(f'{path}.tidx', TXN_ENTRY)
+        self.data = open(f'{path}.seg', 'rb')
+
+    def read_block(self, block_no):
+        """Decompress one block into its records (JSON-decoded dicts)"""
+        offset, length, count = self.blocks[block_no]
+        data = os.pread(self.data.fileno(), length, offset)
+        return [json.loads(line) for line in zlib.decompress(data).decode('utf-8').splitlines()]
+
+    def user_runs(self, user_id, since=None, until=None):
+        """(block, start, count) runs holding the user's records, optionally limited by date"""
+        position = bisect_left(_Keys(self.users), user_id)
+        while position < len(self.users):
+            entry_user, newest, oldest, block_no, start, count = self.users[position]
+            if entry_user != user_id:
+                break
+            position += 1
+            if since is not None and newest < since.timestamp():
+                continue
+            if until is not None and oldest >= until.timestamp():
+                continue
+            yield block_no, start, count
+
+    def user_count(self, user_id):
+        return sum(count for _, _, count in self.user_runs(user_id))
+
+    def user_records(self, user_id, since=None, until=None, oldest_first=False):
+        """The user's records, newest first, reading only the blocks that hold them"""
+        runs = list(self.user_runs(user_id, since, until))
+        if oldest_first:
+            runs.reverse()
+        for block_no, start, count in runs:
+            records = self.read_block(block_no)[start:start + count]
+            yield from reversed(records) if oldest_first else records
+
+    def find(self, transaction_id):
+        """Record for a transaction_id, reading a single block; None if absent"""
+        key = uuid.UUID(str(transaction_id)).bytes
+        position = bisect_left(_Keys(self.txns), key)
+        if position == len(self.txns) or self.txns[position][0] != key:
+            return None
+        block_no = self.txns[position][1]
+        for record in self.read_block(block_no):
+            if record['transaction_id'] == str(transaction_id):
+                return record
+        return None
+
+    def transaction_ids(self):
+        """Every transaction_id in the segment, in index order"""
+        for position in range(len(self.txns)):
+            yield uuid.UUID(bytes=self.txns[position][0])
+
+    def close(self):
+        for index in (self.blocks, self.users, self.txns):
+            index.close()
+        self.data.close()
@@ -0,0 +1,181 @@
+# utils/events.py
+import asyncio
+import itertools
+import json
+import logging
+import socket
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One connected client: a bounded queue on the client's event loop"""
+
+    def __init__(self, hub, user_id, maxsize):
+        self.hub = hub
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event):
+        # Slow consumers lose their oldest events rather than growing memory
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def push(self, event):
+        """Thread-safe: schedule delivery on the subscriber's loop"""
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, event)
+        except RuntimeError:
+            # Loop already closed; the connection is gone
+            self.hub.unsubscribe(self)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    In-process pub/sub keyed by user id.
+
+    Publishing is safe from any thread; each subscriber receives events on
+    its own event loop. Idle subscribers cost one queue and one set entry.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id):
+        """Register a subscriber; must be called from a running event loop"""
+        subscription = Subscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event):
+        """Deliver an event to this process's subscribers for a user"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return 0
+
+        event = dict(event, id=next(self._ids))
+        for subscription in subscribers:
+            subscription.push(event)
+        return len(subscribers)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+event_hub = EventHub(queue_size=getattr(settings, 'EVENT_STREAM_QUEUE_SIZE', 100))
+
+
+class LocalBroker:
+    """Single-process broker: publishes straight into the local hub"""
+
+    def __init__(self, hub=None, **options):
+        self.hub = hub or event_hub
+
+    def publish(self, user_id, event):
+        self.hub.publish(user_id, event)
+
+
+class SocketBroker:
+    """
+    Cross-process broker using a local TCP relay (see run_event_relay).
+
+    Every process sends its events to the relay as JSON lines and a reader
+    thread feeds whatever the relay fans out back into the local hub. If
+    the relay is unreachable events are still delivered locally.
+    """
+
+    def __init__(self, hub=None, host='127.0.0.1', port=8765, reconnect_seconds=2.0, **options):
+        self.hub = hub or event_hub
+        self.address = (host, port)
+        self.reconnect_seconds = reconnect_seconds
+        self._sock = None
+        self._lock = threading.Lock()
+        self._reader = None
+
+    def _connect(self):
+        if self._sock is not None:
+            return self._sock
+        sock = socket.create_connection(self.address, timeout=1.0)
+        sock.settimeout(None)
+        self._sock = sock
+        self._reader = threading.Thread(target=self._read_loop, args=(sock,), daemon=True, name='event-broker-reader')
+        self._reader.start()
+        return sock
+
+    def _read_loop(self, sock):
+        try:
+            for line in sock.makefile('r', encoding='utf-8'):
+                try:
+                    message = json.loads(line)
+                    self.hub.publish(message['user_id'], message['event'])
+                except (ValueError, KeyError):
+                    logger.warning("Discarding malformed relay message")
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+
+    def publish(self, user_id, event):
+        data = (json.dumps({'user_id': user_id, 'event': event}) + '\n').encode('utf-8')
+        with self._lock:
+            try:
+                self._connect().sendall(data)
+                return
+            except OSError as e:
+                logger.warning("Event relay unavailable, delivering locally: %s", e)
+                if self._sock is not None:
+                    self._sock.close()
+                self._sock = None
+        self.hub.publish(user_id, event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the broker configured in EVENT_BROKER (LocalBroker by default)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = dict(getattr(settings, 'EVENT_BROKER', {}))
+                backend = import_string(config.pop('BACKEND', 'utils.events.LocalBroker'))
+                _broker = backend(**{key.lower(): value for key, value in config.items()})
+    return _broker
+
+
+def publish_on_commit(user_id, event):
+    """Publish once the surrounding transaction commits (immediately if none)"""
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
@@ -0,0 +1,200 @@
+# utils/fee_schedule.py
+from bisect import bisect_right
+from decimal import Decimal
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from utils.money import currency_exponent, div_round_half_even, to_minor
+
+RATE_SCALE = 1000000  # rates are compiled to integer millionths
+
+
+def round_half_even(numerator, denominator):
+    """Integer division rounded half-to-even, matching Decimal.quantize()"""
+    quotient, remainder = np.divmod(numerator, denominator)
+    twice = remainder * 2
+    round_up = (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+class FeeTable:
+    """Amount bands for one rule key, in the minor units of one currency"""
+
+    __slots__ = ('bounds', 'rates', 'flats', 'min_fees', 'max_fees', 'arrays')
+
+    def __init__(self, bands, exponent, min_fee, max_fee):
+        self.bounds = [to_minor(rule['min_amount'], exponent) for rule in bands]
+        self.rates = [int(Decimal(rule['rate']) * RATE_SCALE) for rule in bands]
+        self.flats = [to_minor(rule['flat_fee'], exponent) for rule in bands]
+        self.min_fees = [to_minor(rule['min_fee'] if rule['min_fee'] is not None else min_fee, exponent)
+                         for rule in bands]
+        self.max_fees = [to_minor(rule['max_fee'] if rule['max_fee'] is not None else max_fee, exponent)
+                         for rule in bands]
+        self.arrays = tuple(
+            np.array(column, dtype=np.int64)
+            for column in (self.bounds, self.rates, self.flats, self.min_fees, self.max_fees)
+        )
+
+    def price(self, amount_minor):
+        """Fee for one amount, without numpy overhead"""
+        band = max(bisect_right(self.bounds, amount_minor) - 1, 0)
+        fee = div_round_half_even(amount_minor * self.rates[band], RATE_SCALE) + self.flats[band]
+        return min(max(fee, self.min_fees[band]), self.max_fees[band])
+
+    def price_many(self, amounts_minor):
+        """Fees for an int64 array of amounts"""
+        bounds, rates, flats, min_fees, max_fees = self.arrays
+        band = np.clip(np.searchsorted(bounds, amounts_minor, side='right') - 1, 0, None)
+        fee = round_half_even(amounts_minor * rates[band], RATE_SCALE) + flats[band]
+        return np.clip(fee, min_fees[band], max_fees[band])
+
+
+class CompiledFeeSchedule:
+    """
+    Fee schedule compiled into integer lookup tables.
+
+    Each (plan, currency, transaction_type) key maps to its amount bands.
+    Tables are built per currency exponent on first use, so pricing a batch
+    is one searchsorted per transaction type and a single leg is one bisect.
+    """
+
+    def __init__(self, version, rules, min_fee, max_fee):
+        self.version = version
+        self.min_fee = min_fee
+        self.max_fee = max_fee
+        self.rules = {}
+        self._tables = {}
+
+        for rule in rules:
+            key = (rule['plan'], rule['currency'], rule['transaction_type'])
+            self.rules.setdefault(key, []).append(rule)
+        for bands in self.rules.values():
+            bands.sort(key=lambda rule: rule['min_amount'])
+
+    def lookup(self, transaction_type, currency='', plan=''):
+        """Return the FeeTable for a type, falling back from specific to wildcard keys"""
+        cache_key = (plan, currency, transaction_type)
+        try:
+            return self._tables[cache_key]
+        except KeyError:
+            pass
+
+        table = None
+        for key in ((plan, currency, transaction_type), (plan, '', transaction_type),
+                    ('', currency, transaction_type), ('', '', transaction_type)):
+            if key in self.rules:
+                table = FeeTable(self.rules[key], currency_exponent(currency), self.min_fee, self.max_fee)
+                break
+
+        self._tables[cache_key] = table
+        return table
+
+    def price_minor(self, transaction_type, amount_minor, currency='', plan=''):
+        """Fee for a single leg in minor units; unknown types are free"""
+        table = self.lookup(transaction_type, currency or '', plan or '')
+        if table is None:
+            return 0
+        return table.price(amount_minor)
+
+    def price_many_minor(self, types, amounts_minor, currency='', plan=''):
+        """Vectorised fee calculation in minor units; unknown types are free"""
+        types = np.asarray(types)
+        amounts_minor = np.asarray(amounts_minor, dtype=np.int64)
+        fees = np.zeros(len(amounts_minor), dtype=np.int64)
+        if len(amounts_minor) == 0:
+            return fees
+
+        unique_types, inverse = np.unique(types, return_inverse=True)
+        for index, transaction_type in enumerate(unique_types):
+            table = self.lookup(str(transaction_type), currency or '', plan or '')
+            if table is None:
+                continue
+            mask = inverse == index
+            fees[mask] = table.price_many(amounts_minor[mask])
+
+        return fees
+
+
+def compile_default_schedule(fee_structure, min_fee, max_fee):
+    """Compile the built-in FeeCalculator rates (used when nothing is stored)"""
+    rules = [
+        {
+            'transaction_type': transaction_type,
+            'currency': '',
+            'plan': '',
+            'min_amount': Decimal('0.00'),
+            'rate': rate,
+            'flat_fee': Decimal('0.00'),
+            'min_fee': None,
+            'max_fee': None,
+        }
+        for transaction_type, rate in fee_structure.items()
+    ]
+    return CompiledFeeSchedule(0, rules, min_fee, max_fee)
+
+
+class FeeScheduleCache:
+    """
+    Process-local cache of the compiled active fee schedule.
+
+    The active schedule is re-checked at most every FEE_SCHEDULE_CHECK_SECONDS
+    and only recompiled when its stamp changes: the version, when the
+    schedule and its rules were last edited, and how many rules it has.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled = None
+        self._stamp = None
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        """Force a recompile on next access"""
+        with self._lock:
+            self._compiled = None
+            self._expires_at = 0.0
+
+    def get(self, default_factory):
+        compiled = self._compiled
+        if compiled is not None and time.monotonic() < self._expires_at:
+            return compiled
+
+        with self._lock:
+            now = time.monotonic()
+            if self._compiled is not None and now < self._expires_at:
+                return self._compiled
+
+            from wallet.models import FeeSchedule, FeeRule
+
+            schedule = FeeSchedule.objects.filter(is_active=True).order_by('-version').first()
+            if schedule is None:
+                stamp = None
+            else:
+                # Rules edited in place, added or deleted change the stamp, not just a new version
+                rules_stamp = FeeRule.objects.filter(schedule=schedule).aggregate(
+                    edited=Max('updated_at'), count=Count('id')
+                )
+                stamp = (schedule.version, schedule.updated_at, rules_stamp['edited'], rules_stamp['count'])
+
+            if self._compiled is None or self._stamp != stamp:
+                if schedule is None:
+                    self._compiled = default_factory()
+                else:
+                    rules = FeeRule.objects.filter(schedule=schedule).values(
+                        'transaction_type', 'currency', 'plan', 'min_amount',
+                        'rate', 'flat_fee', 'min_fee', 'max_fee'
+                    )
+                    self._compiled = CompiledFeeSchedule(
+                        schedule.version, list(rules), schedule.min_fee, schedule.max_fee
+                    )
+                self._stamp = stamp
+
+            self._expires_at = now + getattr(settings, 'FEE_SCHEDULE_CHECK_SECONDS', 30)
+            return self._compiled
+
+
+fee_schedule_cache = FeeScheduleCache()
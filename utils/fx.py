@@ -0,0 +1,167 @@
+# utils/fx.py
+from decimal import Decimal, ROUND_HALF_EVEN
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.utils import timezone
+
+from utils.money import Money, currency_exponent, div_round_half_even
+
+RATE_PLACES = 8
+RATE_SCALE = 10 ** RATE_PLACES
+RATE_QUANTUM = Decimal(1).scaleb(-RATE_PLACES)
+
+
+class FxRateUnavailable(ValidationError):
+    """No usable rate for a currency pair"""
+
+
+class RateSnapshot:
+    """
+    Immutable set of rates as of one table version.
+
+    Every convertible pair (direct, inverse and crossed through the pivot
+    currency) is precomputed, so a conversion is a single dict lookup.
+    """
+
+    def __init__(self, version, rates, pivot='USD'):
+        self.version = version
+        self.pairs = {}
+
+        direct = {}
+        for base, quote, rate in rates:
+            direct[(base, quote)] = Decimal(rate)
+            direct.setdefault((quote, base), 1 / Decimal(rate))
+
+        # Cross every currency through the pivot
+        to_pivot = {base: rate for (base, quote), rate in direct.items() if quote == pivot}
+        to_pivot[pivot] = Decimal(1)
+        for base, base_rate in to_pivot.items():
+            for quote, quote_rate in to_pivot.items():
+                if base != quote:
+                    direct.setdefault((base, quote), base_rate / quote_rate)
+
+        for pair, rate in direct.items():
+            rate = rate.quantize(RATE_QUANTUM, rounding=ROUND_HALF_EVEN)
+            self.pairs[pair] = (rate, int(rate.scaleb(RATE_PLACES)))
+
+    def rate(self, from_currency, to_currency):
+        """Return (Decimal rate, integer rate scaled by RATE_SCALE)"""
+        if from_currency == to_currency:
+            return Decimal(1), RATE_SCALE
+        try:
+            return self.pairs[(from_currency, to_currency)]
+        except KeyError:
+            raise FxRateUnavailable(f"No exchange rate for {from_currency} to {to_currency}")
+
+    def convert(self, amount, to_currency):
+        """Convert Money to another currency; returns (Money, Decimal rate)"""
+        rate, scaled = self.rate(amount.currency, to_currency)
+        to_exponent = currency_exponent(to_currency)
+
+        numerator = amount.minor * scaled
+        denominator = RATE_SCALE
+        shift = to_exponent - amount.exponent
+        if shift >= 0:
+            numerator *= 10 ** shift
+        else:
+            denominator *= 10 ** -shift
+
+        return Money(div_round_half_even(numerator, denominator), to_currency, to_exponent), rate
+
+
+class FxRateCache:
+    """
+    Process-local, time-versioned cache of the latest rate per pair.
+
+    The table version (latest valid_from) is checked at most every
+    FX_RATE_REFRESH_SECONDS; rates are only reloaded when it moves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        """Force a version check on next access"""
+        self._expires_at = 0.0
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._expires_at:
+            return snapshot
+
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now < self._expires_at:
+                return self._snapshot
+
+            from wallet.models import ExchangeRate
+
+            version = ExchangeRate.objects.filter(
+                valid_from__lte=timezone.now()
+            ).aggregate(version=Max('valid_from'))['version']
+
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = RateSnapshot(
+                    version,
+                    self._load_latest(ExchangeRate),
+                    getattr(settings, 'FX_PIVOT_CURRENCY', 'USD')
+                )
+
+            self._expires_at = now + getattr(settings, 'FX_RATE_REFRESH_SECONDS', 60)
+            return self._snapshot
+
+    def _load_latest(self, model):
+        """Latest rate per (base, quote) pair"""
+        latest = {}
+        rows = model.objects.filter(valid_from__lte=timezone.now()).order_by(
+            'base_currency', 'quote_currency', '-valid_from'
+        ).values_list('base_currency', 'quote_currency', 'rate')
+        for base, quote, rate in rows.iterator():
+            latest.setdefault((base, quote), rate)
+        return [(base, quote, rate) for (base, quote), rate in latest.items()]
+
+    def convert(self, amount, to_currency):
+        """Convert Money using the cached rates; returns (Money, Decimal rate)"""
+        return self.snapshot().convert(amount, to_currency)
+
+
+fx_rate_cache = FxRateCache()
+
+
+class LocalRateFeed:
+    """
+    Stand-in for an external rate provider.
+
+    Returns quotes against USD around fixed mid rates, optionally with a
+    small random walk so refreshes produce new versions.
+    """
+
+    MID_RATES = {
+        'BDT': Decimal('119.50'),
+        'EUR': Decimal('0.9200'),
+        'GBP': Decimal('0.7900'),
+        'INR': Decimal('83.20'),
+        'JPY': Decimal('151.30'),
+        'SGD': Decimal('1.3500'),
+    }
+
+    def __init__(self, jitter=Decimal('0.0'), seed=None):
+        self.jitter = Decimal(jitter)
+        self.random = random.Random(seed)
+
+    def fetch(self):
+        """Return [(base, quote, rate)] quotes"""
+        quotes = []
+        for currency, mid in self.MID_RATES.items():
+            if self.jitter:
+                drift = Decimal(str(self.random.uniform(-1, 1))) * self.jitter
+                mid = mid * (1 + drift)
+            quotes.append(('USD', currency, mid.quantize(RATE_QUANTUM, rounding=ROUND_HALF_EVEN)))
+        return quotes
@@ -0,0 +1,303 @@
+# utils/log_pipeline.py
+"""
+Non-blocking structured logging.
+
+QueueingHandler only puts records on a bounded queue. A QueueListener
+thread formats them, one JSON object per line with sensitive values
+masked, and writes them to a file rotated by size and age, and to the
+console. Any number of processes may share the file; one of them at a
+time rotates it (see SizeAndTimeRotatingFileHandler). Messages stay unformatted until then, so log %-style
+(logger.info("... %s", value)) with values that do not change
+afterwards. When the queue is full, records below WARNING are dropped
+and counted; warnings and errors wait up to a second for room.
+SamplingFilter keeps only a fraction of the info and debug records of
+chatty loggers.
+"""
+from datetime import datetime, timezone
+from multiprocessing import util as multiprocessing_util
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per log file
+    fcntl = None
+
+from utils.tracing import current_span
+
+SENSITIVE_FIELDS = ('card_number', 'mobile_number', 'cvv')
+# Bangladeshi mobile numbers and 13-19 digit card numbers, possibly grouped by spaces or dashes
+MOBILE_NUMBER = re.compile(r'(?<!\d)(?:\+?88)?01[3-9]\d{8}(?!\d)')
+CARD_NUMBER = re.compile(r'(?<!\d)\d(?:[ -]?\d){12,18}(?!\d)')
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def _mask(value, field_name):
+    # Imported late: logging is configured before the apps are loaded
+    from utils.wallet_process import mask_sensitive_data
+    return mask_sensitive_data(value, field_name)
+
+
+def mask_text(text):
+    """text with card and mobile numbers masked"""
+    text = MOBILE_NUMBER.sub(lambda match: _mask(match.group(), 'mobile_number'), text)
+    return CARD_NUMBER.sub(lambda match: _mask(re.sub(r'\D', '', match.group()), 'card_number'), text)
+
+
+def mask_value(key, value):
+    """A value logged under key, masked if the key or its contents are sensitive"""
+    if key in SENSITIVE_FIELDS:
+        return _mask(str(value), key)
+    if isinstance(value, dict):
+        return {item_key: mask_value(item_key, item) for item_key, item in value.items()}
+    if isinstance(value, str):
+        return mask_text(value)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, masked message, extra= fields and trace ids"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': mask_text(record.getMessage()),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = mask_value(key, value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class MaskingFormatter(logging.Formatter):
+    """Plain text formatter that masks card and mobile numbers"""
+
+    def format(self, record):
+        return mask_text(super().format(record))
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rolls over at max_bytes or every rotate_seconds, whichever comes first,
+    keeping backup_count files.
+
+    Gunicorn workers, pool processes and management commands all append to
+    the same file, but only the process holding an exclusive lock on
+    <filename>.lock rotates it; two rotating at once would rename each
+    other's backups away. The others only append and, like
+    WatchedFileHandler, reopen the file once it was renamed under them. They
+    try for the lock every LOCK_RETRY_SECONDS, so another process takes
+    over when the rotating one exits.
+    """
+    LOCK_RETRY_SECONDS = 60
+
+    def __init__(self, filename, max_bytes=0, rotate_seconds=0, backup_count=5, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds if rotate_seconds else None
+        self.lock_path = self.baseFilename + '.lock'
+        self._lock_file = None
+        self._lock_pid = None
+        self._lock_tried_at = None
+
+    def rotates(self):
+        """Whether this process holds the rotation lock, trying for it now and then"""
+        if fcntl is None:
+            return True
+        pid = os.getpid()
+        if self._lock_pid != pid:
+            # Forked: the lock stays with the parent
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            self._lock_pid = pid
+            self._lock_tried_at = None
+        if self._lock_file is not None:
+            return True
+        now = time.monotonic()
+        if self._lock_tried_at is not None and now - self._lock_tried_at < self.LOCK_RETRY_SECONDS:
+            return False
+        self._lock_tried_at = now
+
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        if self.rotate_seconds:
+            # The lock file is touched at every rollover, so a new holder keeps the old schedule
+            self.rollover_at = os.fstat(lock_file.fileno()).st_mtime + self.rotate_seconds
+        return True
+
+    def _reopen_if_rotated(self):
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = None  # FileHandler.emit opens the new file
+
+    def emit(self, record):
+        if self.stream is not None and not self.rotates():
+            self._reopen_if_rotated()
+        super().emit(record)
+
+    def shouldRollover(self, record):
+        if not self.rotates():
+            return False
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.rotate_seconds:
+            os.utime(self.lock_path)
+            self.rollover_at = time.time() + self.rotate_seconds
+
+    def close(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps rates[name] of the records below WARNING from the logger name
+    and its children (the most specific name wins); everything else passes.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._by_logger = {}
+
+    def _rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._by_logger.get(record.name)
+        if rate is None:
+            rate = self._by_logger[record.name] = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for a writer thread that sends them to a JSON lines
+    file (INFO and up by default) and, with console, to stderr as text.
+    """
+    _exceptions = logging.Formatter()
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, rotate_seconds=24 * 3600, backup_count=14,
+                 file_level='INFO', console=True, console_format='{levelname} {message}', queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.queue_size = queue_size
+        self.dropped = 0
+
+        file_handler = SizeAndTimeRotatingFileHandler(filename, max_bytes, rotate_seconds, backup_count)
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(JsonFormatter())
+        self.targets = [file_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(MaskingFormatter(console_format, style='{'))
+            self.targets.append(console_handler)
+
+        self.listener = None
+        self._closed = False
+        self._start_listener()
+        # The writer thread does not survive a fork (gunicorn --preload, process pools)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_listener(self):
+        self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+
+    def _stop_listener(self):
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    def _after_fork(self):
+        if self._closed:
+            return
+        self.queue = queue.Queue(self.queue_size)
+        self.dropped = 0
+        self._start_listener()
+        # Pool workers leave through os._exit, skipping logging's atexit shutdown
+        multiprocessing_util.Finalize(None, self._stop_listener, exitpriority=0)
+
+    def prepare(self, record):
+        """
+        Runs in the logging thread. The message is left unformatted; only
+        what would not survive until the writer gets to it is captured.
+        """
+        if record.exc_info:
+            # A copy, so handlers of other loggers still see exc_info
+            record = copy.copy(record)
+            record.exc_text = self._exceptions.formatException(record.exc_info)
+            record.exc_info = None
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return record
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=1)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': 'Log queue was full: dropped %d records', 'args': (dropped,),
+                }))
+            except queue.Full:
+                self.dropped += dropped
+
+    def close(self):
+        """Drain the queue and close the targets (logging.shutdown calls this at exit)"""
+        self._closed = True
+        self._stop_listener()
+        for target in self.targets:
+            target.close()
+        super().close()
@@ -0,0 +1,327 @@
+# utils/metrics.py
+"""
+In-process Prometheus metrics (text exposition format 0.0.4).
+
+Every thread counts into its own shard, so recording takes no lock; only
+a thread's first sample of a new series does. A scrape sums the shards.
+With METRICS_MULTIPROCESS_DIR set, each process also dumps its totals
+there (at most every METRICS_FLUSH_SECONDS) and a scrape adds the other
+processes' files, so one scrape of any worker covers them all. Files of
+exited workers are folded into one and deleted, so the directory holds
+one file per live worker plus one.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' files are left in place
+    fcntl = None
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Counters of every exited worker, summed
+EXITED_FILE = 'metrics-exited.json'
+
+_metrics = {}
+_shards = []  # (owner thread, {(name, labels): values})
+_retired = {}  # shards of finished threads, folded in at scrape time
+_lock = threading.Lock()
+_local = threading.local()
+_process_file = None
+_last_flush = 0.0
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _lock:
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _empty(self):
+        return [0]
+
+    def inc(self, *labels, amount=1):
+        shard = _shard()
+        values = shard.get((self.name, labels))
+        if values is None:
+            values = shard[(self.name, labels)] = self._empty()
+        values[0] += amount
+
+    def samples(self, labels, values):
+        yield self.name, labels, values[0]
+
+
+class Histogram(Counter):
+    """Per-bucket (non-cumulative) counts plus the sum; cumulated when rendered"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _empty(self):
+        return [0] * (len(self.buckets) + 2)
+
+    def observe(self, value, *labels):
+        shard = _shard()
+        values = shard.get((self.name, labels))
+        if values is None:
+            values = shard[(self.name, labels)] = self._empty()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), values):
+            cumulative += count
+            yield self.name + '_bucket', (*labels, ('le', str(bound))), cumulative
+        yield self.name + '_count', labels, cumulative
+        yield self.name + '_sum', labels, values[-1]
+
+
+def _merge(into, series):
+    for key, values in series:
+        current = into.get(key)
+        if current is None:
+            into[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                current[i] += value
+
+
+def local_totals():
+    """This process's series summed over its threads; finished threads are folded away"""
+    with _lock:
+        alive = []
+        for thread, shard in _shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                _merge(_retired, shard.copy().items())
+        _shards[:] = alive
+        totals = {key: list(values) for key, values in _retired.items()}
+    for _, shard in alive:
+        # dict.copy() is atomic under the GIL, so the owner may keep inserting meanwhile
+        _merge(totals, ((key, list(values)) for key, values in shard.copy().items()))
+    return totals
+
+
+def _multiprocess_dir():
+    return getattr(settings, 'METRICS_MULTIPROCESS_DIR', '')
+
+
+def _write(path, data):
+    part = f'{path}.part'
+    with open(part, 'w') as f:
+        json.dump(data, f)
+    os.replace(part, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _series(data):
+    return (((name, tuple(labels)), values) for name, labels, values in data['series'])
+
+
+def _dump_series(totals):
+    return [[name, list(labels), values] for (name, labels), values in totals.items()]
+
+
+def flush(gauges=None):
+    """Write this process's totals (and sampled gauges) for the other workers' scrapes"""
+    global _process_file, _last_flush
+    directory = _multiprocess_dir()
+    if not directory:
+        return
+    if _process_file is None:
+        os.makedirs(directory, exist_ok=True)
+        # pid for liveness checks, plus a nonce so a recycled pid never overwrites a dead worker's counts
+        _process_file = os.path.join(directory, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        atexit.register(flush)
+    _write(_process_file, {
+        'pid': os.getpid(),
+        'series': _dump_series(local_totals()),
+        'gauges': [[name, list(labels), value] for (name, labels), value in (gauges or {}).items()],
+    })
+    _last_flush = time.monotonic()
+
+
+def maybe_flush(gauges=None):
+    """flush() at most every METRICS_FLUSH_SECONDS; cheap to call after every request"""
+    if _multiprocess_dir() and time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_SECONDS', 1.0):
+        flush(gauges() if callable(gauges) else gauges)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _file_pid(filename):
+    # metrics-<pid>-<nonce>.json, or .json.part while being written
+    parts = filename.split('-')
+    if len(parts) == 3 and parts[0] == 'metrics' and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+@contextmanager
+def _directory_lock(directory, shared=False):
+    """Scrapes read the files under a shared lock; folding takes it exclusively"""
+    with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+
+
+def fold_exited(directory):
+    """
+    Add the counters of workers that have exited to EXITED_FILE and delete
+    their files (as prometheus_client's mark_process_dead does). EXITED_FILE
+    lists the files it holds until they are gone, so one left behind by a
+    crash between the two steps is deleted rather than counted again.
+    """
+    if fcntl is None:
+        return
+    exited = [name for name in os.listdir(directory) if _file_pid(name) and not _pid_alive(_file_pid(name))]
+    if not exited:
+        return
+    with _directory_lock(directory):
+        path = os.path.join(directory, EXITED_FILE)
+        data = _read(path) or {'series': [], 'folded': []}
+        folded = {name for name in data['folded'] if os.path.exists(os.path.join(directory, name))}
+        totals = {}
+        _merge(totals, _series(data))
+        for name in exited:
+            if name in folded or not name.endswith('.json'):
+                continue
+            worker = _read(os.path.join(directory, name))
+            if worker is not None:  # else already folded by another worker's scrape
+                _merge(totals, _series(worker))
+                folded.add(name)
+        _write(path, {'series': _dump_series(totals), 'folded': sorted(folded)})
+        for name in exited:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def collect(gauges=None):
+    """
+    (series totals, gauge values) over every thread and, in multiprocess mode, every worker.
+
+    Counters of exited workers are kept (Prometheus counters never go
+    down); their gauges are dropped.
+    """
+    totals = local_totals()
+    gauge_totals = dict(gauges or {})
+    directory = _multiprocess_dir()
+    if directory and os.path.isdir(directory):
+        fold_exited(directory)
+        with _directory_lock(directory, shared=True) if fcntl else nullcontext():
+            filenames = os.listdir(directory)
+            exited = _read(os.path.join(directory, EXITED_FILE)) if EXITED_FILE in filenames else None
+            skip = set(exited['folded']) if exited else set()
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if not filename.endswith('.json') or path == _process_file or filename in skip:
+                    continue
+                data = _read(path)
+                if data is None:
+                    continue  # being replaced right now
+                _merge(totals, _series(data))
+                pid = data.get('pid')
+                if pid and _pid_alive(pid):
+                    for name, labels, value in data['gauges']:
+                        key = (name, tuple(map(tuple, labels)))
+                        gauge_totals[key] = gauge_totals.get(key, 0) + value
+    return totals, gauge_totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render(gauges=None, gauge_help=None):
+    """The exposition text for every registered metric plus the given gauges"""
+    totals, gauge_totals = collect(gauges)
+    by_name = {}
+    for (name, labels), values in totals.items():
+        by_name.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name in sorted(by_name):
+        metric = _metrics.get(name)
+        if metric is None:
+            continue  # only known to another worker's code version
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, values in sorted(by_name[name]):
+            named = tuple(zip(metric.labelnames, labels))
+            for sample, sample_labels, value in metric.samples(named, values):
+                lines.append(f'{sample}{_format_labels(sample_labels)} {_format_value(value)}')
+
+    gauge_names = sorted({name for name, _ in gauge_totals})
+    for name in gauge_names:
+        lines.append(f'# HELP {name} {(gauge_help or {}).get(name, name)}')
+        lines.append(f'# TYPE {name} gauge')
+        for (gauge_name, labels), value in sorted(gauge_totals.items()):
+            if gauge_name == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def reset_metrics():
+    """Drop every recorded sample of this process (tests)"""
+    global _process_file
+    with _lock:
+        for _, shard in _shards:
+            shard.clear()
+        _retired.clear()
+    _process_file = None
@@ -0,0 +1,142 @@
+# utils/money.py
+from decimal import Decimal, ROUND_HALF_EVEN
+
+# Number of minor-unit digits per ISO 4217 currency; anything else uses 2
+CURRENCY_EXPONENTS = {
+    'BHD': 3,
+    'JPY': 0,
+    'KRW': 0,
+    'KWD': 3,
+    'OMR': 3,
+}
+DEFAULT_EXPONENT = 2
+
+
+def currency_exponent(currency):
+    """Minor-unit digits for a currency code"""
+    return CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+
+
+_SCALES = {exponent: Decimal(10) ** exponent for exponent in range(7)}
+
+
+def to_minor(value, exponent=DEFAULT_EXPONENT):
+    """Convert a Decimal/str/int amount to integer minor units (half-even)"""
+    if value.__class__ is int:
+        return value * 10 ** exponent
+    if value.__class__ is not Decimal:
+        value = Decimal(value)
+    return int((value * _SCALES[exponent]).to_integral_value(ROUND_HALF_EVEN))
+
+
+def format_minor(minor, exponent=DEFAULT_EXPONENT):
+    """Render integer minor units as an exact decimal string"""
+    if exponent == 0:
+        return str(minor)
+    sign = '-' if minor < 0 else ''
+    units, fraction = divmod(abs(minor), 10 ** exponent)
+    return f"{sign}{units}.{fraction:0{exponent}d}"
+
+
+def div_round_half_even(numerator, denominator):
+    """Integer division rounded half-to-even, matching Decimal.quantize()"""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or (twice == denominator and quotient % 2 == 1):
+        quotient += 1
+    return quotient
+
+
+class CurrencyMismatch(ValueError):
+    """Raised when combining amounts in different currencies"""
+
+
+class Money:
+    """
+    Amount held as integer minor units plus a currency code.
+
+    Arithmetic stays in integers, so sums never drift; convert to Decimal
+    only at the model boundary and to str only when rendering responses.
+    Instances are treated as immutable: operations always return new ones.
+    """
+
+    __slots__ = ('minor', 'currency', 'exponent')
+
+    def __init__(self, minor, currency='USD', exponent=None):
+        self.minor = minor
+        self.currency = currency
+        self.exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT) if exponent is None else exponent
+
+    @classmethod
+    def from_decimal(cls, value, currency='USD'):
+        """Build from a Decimal (or str/int) in major units"""
+        exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+        return cls(to_minor(value, exponent) if value is not None else 0, currency, exponent)
+
+    @classmethod
+    def zero(cls, currency='USD'):
+        return cls(0, currency)
+
+    def to_decimal(self):
+        """Exact Decimal in major units, for model fields"""
+        return Decimal(str(self))
+
+    def _mismatch(self, other):
+        if other.__class__ is not Money:
+            raise TypeError(f"Cannot combine Money with {type(other).__name__}")
+        raise CurrencyMismatch(f"Cannot combine {self.currency} and {other.currency}")
+
+    def __add__(self, other):
+        if other.__class__ is not Money or other.currency != self.currency:
+            self._mismatch(other)
+        return Money(self.minor + other.minor, self.currency, self.exponent)
+
+    def __sub__(self, other):
+        if other.__class__ is not Money or other.currency != self.currency:
+            self._mismatch(other)
+        return Money(self.minor - other.minor, self.currency, self.exponent)
+
+    def __neg__(self):
+        return Money(-self.minor, self.currency, self.exponent)
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __eq__(self, other):
+        if other.__class__ is not Money:
+            return NotImplemented
+        return self.minor == other.minor and self.currency == other.currency
+
+    def __hash__(self):
+        return hash((self.minor, self.currency))
+
+    def __lt__(self, other):
+        if other.__class__ is not Money or other.currency != self.currency:
+            self._mismatch(other)
+        return self.minor < other.minor
+
+    def __le__(self, other):
+        if other.__class__ is not Money or other.currency != self.currency:
+            self._mismatch(other)
+        return self.minor <= other.minor
+
+    def __gt__(self, other):
+        if other.__class__ is not Money or other.currency != self.currency:
+            self._mismatch(other)
+        return self.minor > other.minor
+
+    def __ge__(self, other):
+        if other.__class__ is not Money or other.currency != self.currency:
+            self._mismatch(other)
+        return self.minor >= other.minor
+
+    def max(self, other):
+        return self if self >= other else other
+
+    def __str__(self):
+        if self.exponent == 2 and self.minor >= 0:
+            return '%d.%02d' % divmod(self.minor, 100)
+        return format_minor(self.minor, self.exponent)
+
+    def __repr__(self):
+        return f"Money('{self}', '{self.currency}')"
@@ -0,0 +1,251 @@
+# utils/outbox.py
+from datetime import timedelta
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+
+import httpx
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def transaction_event(transaction_obj, previous_status):
+    """Outbox event type and payload for a Transaction change"""
+    event_type = 'transaction.created' if previous_status is None else 'transaction.status_changed'
+    return event_type, {
+        'transaction_id': str(transaction_obj.transaction_id),
+        'user_id': transaction_obj.user_id,
+        'transaction_type': transaction_obj.transaction_type,
+        'amount': str(transaction_obj.amount),
+        'fee': str(transaction_obj.fee),
+        'previous_status': previous_status,
+        'status': transaction_obj.status,
+        'reference_number': transaction_obj.reference_number,
+        'occurred_at': timezone.now().isoformat(),
+    }
+
+
+def record_transaction_event(transaction_obj, previous_status):
+    """Insert the outbox row; call inside the transaction that changed the row"""
+    from wallet.models import OutboxEvent
+
+    event_type, payload = transaction_event(transaction_obj, previous_status)
+    return OutboxEvent.objects.create(
+        event_type=event_type,
+        aggregate_id=str(transaction_obj.transaction_id),
+        payload=payload
+    )
+
+
+def _serialise(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'aggregate_id': event.aggregate_id,
+        'created_at': event.created_at,
+        'data': event.payload,
+    }
+
+
+class HttpSink:
+    """POST each batch as one JSON array (see run_outbox_stub for a local receiver)"""
+
+    def __init__(self, url='http://127.0.0.1:8766/events', timeout=5.0, **options):
+        self.url = url
+        self.client = httpx.Client(timeout=timeout)
+
+    def send(self, events):
+        body = json.dumps([_serialise(event) for event in events], cls=DjangoJSONEncoder)
+        response = self.client.post(self.url, content=body, headers={'Content-Type': 'application/json'})
+        response.raise_for_status()
+
+
+class FileSink:
+    """Append events as JSON lines, fsynced once per batch"""
+
+    def __init__(self, path='outbox.jsonl', **options):
+        self.path = path
+
+    def send(self, events):
+        lines = ''.join(json.dumps(_serialise(event), cls=DjangoJSONEncoder) + '\n' for event in events)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# Shared with in-process consumers of QueueSink
+event_queue = queue.Queue(maxsize=100000)
+
+
+class QueueSink:
+    """Hand events to in-process consumers via a bounded queue"""
+
+    def __init__(self, timeout=1.0, **options):
+        self.queue = event_queue
+        self.timeout = timeout
+
+    def send(self, events):
+        for event in events:
+            self.queue.put(_serialise(event), timeout=self.timeout)
+
+
+def get_sinks():
+    """Instantiate the sinks configured in OUTBOX_SINKS"""
+    sinks = []
+    for config in getattr(settings, 'OUTBOX_SINKS', [{'BACKEND': 'utils.outbox.FileSink'}]):
+        config = dict(config)
+        backend = import_string(config.pop('BACKEND'))
+        sinks.append(backend(**{key.lower(): value for key, value in config.items()}))
+    return sinks
+
+
+class OutboxDispatcher:
+    """
+    Lease-based batch reader for the outbox.
+
+    Several dispatchers may run at once: each claims a batch by stamping
+    lease_owner/lease_expires_at in the write transaction that picked it,
+    so a row is only ever held by one node and is reclaimed if that node
+    dies. Events for one transaction are delivered in id order; a
+    transaction whose earlier event is held elsewhere or waiting on a
+    retry is skipped.
+    """
+
+    def __init__(self, sinks=None, node_id=None, batch_size=None, lease_seconds=None):
+        self.sinks = sinks if sinks is not None else get_sinks()
+        self.node_id = node_id or f'{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}'
+        self.batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 500)
+        self.lease_seconds = lease_seconds or getattr(settings, 'OUTBOX_LEASE_SECONDS', 30)
+        self.max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+        self.backoff_seconds = getattr(settings, 'OUTBOX_BACKOFF_SECONDS', 2)
+        self.max_backoff_seconds = getattr(settings, 'OUTBOX_MAX_BACKOFF_SECONDS', 300)
+
+    def _available(self, now):
+        """Pending rows nobody else holds and not waiting on a retry"""
+        from wallet.models import OutboxEvent
+
+        return OutboxEvent.objects.filter(status='pending').filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+        ).filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+        )
+
+    def claim(self):
+        """Lease the next batch; returns events in id order"""
+        from wallet.models import OutboxEvent
+
+        now = timezone.now()
+        ids = []
+        scanned_to = 0
+        # One write transaction (IMMEDIATE on SQLite) from the first read to the lease, so two
+        # nodes cannot each lease a different event of the same transaction
+        with transaction.atomic():
+            # Page past transactions whose earlier event is held elsewhere until the batch is full
+            while len(ids) < self.batch_size:
+                candidates = list(
+                    self._available(now).filter(id__gt=scanned_to).order_by('id')
+                    .values_list('id', 'aggregate_id')[:self.batch_size]
+                )
+                if not candidates:
+                    break
+                scanned_to = candidates[-1][0]
+
+                # Earliest undelivered event per aggregate that we cannot take right now
+                blocked = dict(
+                    OutboxEvent.objects.filter(
+                        status='pending',
+                        aggregate_id__in={aggregate_id for _, aggregate_id in candidates},
+                        id__lt=scanned_to
+                    ).exclude(
+                        id__in=self._available(now).values('id')
+                    ).values('aggregate_id').annotate(first_id=Min('id')).values_list('aggregate_id', 'first_id')
+                )
+                ids.extend(
+                    event_id for event_id, aggregate_id in candidates
+                    if aggregate_id not in blocked or event_id < blocked[aggregate_id]
+                )
+            ids = ids[:self.batch_size]
+            if not ids:
+                return []
+
+            OutboxEvent.objects.filter(id__in=ids).update(
+                lease_owner=self.node_id,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+            )
+            return list(OutboxEvent.objects.filter(id__in=ids).order_by('id'))
+
+    def deliver(self, events):
+        """Send one claimed batch to every sink and record the outcome"""
+        from wallet.models import OutboxEvent
+
+        ids = [event.id for event in events]
+        try:
+            for sink in self.sinks:
+                sink.send(events)
+        except Exception as e:
+            self._record_failure(events, e)
+            return 0
+
+        OutboxEvent.objects.filter(id__in=ids, lease_owner=self.node_id).update(
+            status='delivered',
+            delivered_at=timezone.now(),
+            lease_owner='',
+            lease_expires_at=None,
+            last_error=''
+        )
+        return len(ids)
+
+    def _record_failure(self, events, error):
+        """Schedule a retry with exponential backoff and jitter, or give up"""
+        from wallet.models import OutboxEvent
+
+        logger.warning("Outbox delivery of %s events failed: %s", len(events), error)
+        now = timezone.now()
+        with transaction.atomic():
+            for event in events:
+                attempts = event.attempts + 1
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+                OutboxEvent.objects.filter(id=event.id, lease_owner=self.node_id).update(
+                    status='dead' if attempts >= self.max_attempts else 'pending',
+                    attempts=attempts,
+                    next_attempt_at=now + timedelta(seconds=delay * random.uniform(0.5, 1.0)),
+                    lease_owner='',
+                    lease_expires_at=None,
+                    last_error=str(error)[:1000]
+                )
+
+    def run_once(self):
+        """Claim and deliver one batch; returns the number delivered"""
+        events = self.claim()
+        if not events:
+            return 0
+        return self.deliver(events)
+
+
+def compact(retention_hours=None, chunk_size=5000):
+    """Delete delivered rows older than the retention window in chunks"""
+    from wallet.models import OutboxEvent
+
+    if retention_hours is None:
+        retention_hours = getattr(settings, 'OUTBOX_RETENTION_HOURS', 24)
+    cutoff = timezone.now() - timedelta(hours=retention_hours)
+    deleted = 0
+    while True:
+        ids = list(
+            OutboxEvent.objects.filter(status='delivered', delivered_at__lt=cutoff)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,229 @@
+# utils/providers.py
+import asyncio
+from collections import namedtuple
+import random
+import threading
+import time
+import uuid
+import weakref
+
+import httpx
+from django.conf import settings
+
+from utils.resilience import BulkheadFull, provider_guard
+from utils.tracing import trace_headers
+
+# Which external provider handles each transaction type
+TRANSACTION_PROVIDERS = {
+    'card_to_wallet': 'card',
+    'wallet_to_card': 'card',
+    'wallet_to_bkash': 'bkash',
+    'bkash_to_wallet': 'bkash',
+    'wallet_to_nagad': 'nagad',
+    'nagad_to_wallet': 'nagad',
+}
+
+# Success rates used when no provider API is configured
+SIMULATED_SUCCESS_RATES = {
+    'card': 0.95,
+    'bkash': 0.90,
+    'nagad': 0.90,
+}
+
+# retryable marks transient failures (timeouts, 5xx, simulated blips) worth another attempt
+ProviderResult = namedtuple('ProviderResult', ['success', 'reference', 'message', 'retryable'], defaults=(False,))
+
+
+def provider_for(transaction_type):
+    """Provider name for a transaction type, or None for internal transfers"""
+    return TRANSACTION_PROVIDERS.get(transaction_type)
+
+
+def simulated_outcome(provider):
+    """Random approve/decline at the provider's simulated success rate"""
+    if random.random() < SIMULATED_SUCCESS_RATES.get(provider, 1.0):
+        return ProviderResult(True, uuid.uuid4().hex[:20], 'Approved')
+    return ProviderResult(False, '', f'{provider} is temporarily unavailable', True)
+
+
+def simulate_provider(provider):
+    """Blocking stand-in for a provider call, with PROVIDER_SIMULATED_LATENCY_MS"""
+    latency = getattr(settings, 'PROVIDER_SIMULATED_LATENCY_MS', 0)
+    if latency:
+        time.sleep(latency / 1000)
+    return simulated_outcome(provider)
+
+
+def _guarded_result(guard, call):
+    """Run call() behind the guard's bulkhead; feeds the outcome to its breaker"""
+    try:
+        result = call()
+    except BulkheadFull:
+        guard.breaker.record(None)
+        return ProviderResult(False, '', f'{guard.name} is at its concurrency limit', True)
+    except Exception:
+        guard.breaker.record(False)
+        raise
+    # Declines are business outcomes; only transient failures count against the provider
+    guard.breaker.record(result.success or not result.retryable)
+    return result
+
+
+def open_circuit_result(provider):
+    return ProviderResult(False, '', f'{provider} circuit is open', True)
+
+
+def call_provider(provider):
+    """Blocking provider call behind the provider's bulkhead and circuit breaker"""
+    guard = provider_guard(provider)
+    if not guard.breaker.allow():
+        return open_circuit_result(provider)
+
+    def call():
+        with guard.bulkhead.slot():
+            return simulate_provider(provider)
+
+    return _guarded_result(guard, call)
+
+
+def query_provider(transaction_obj):
+    """
+    What the provider recorded for a transaction, used to settle stuck rows.
+
+    Returns a ProviderResult (approved or not found/declined), or None when
+    the outcome cannot be determined right now.
+    """
+    provider = provider_for(transaction_obj.transaction_type)
+    base_url = getattr(settings, 'PROVIDER_API_URL', '')
+    if not base_url:
+        # Simulated providers keep no records; a call that never returned did not go through
+        return ProviderResult(False, '', f'{provider} has no record of the transaction')
+
+    guard = provider_guard(provider)
+    if not guard.breaker.allow():
+        return None
+    try:
+        response = httpx.get(
+            f"{base_url.rstrip('/')}/{provider}/transactions/{transaction_obj.transaction_id}",
+            headers=trace_headers(),
+            timeout=getattr(settings, 'PROVIDER_TIMEOUT_SECONDS', 10)
+        )
+    except httpx.HTTPError:
+        guard.breaker.record(False)
+        return None
+    guard.breaker.record(response.status_code < 500)
+
+    if response.status_code == 404:
+        return ProviderResult(False, '', f'{provider} has no record of the transaction')
+    if response.status_code >= 400:
+        return None
+    data = response.json()
+    if data.get('status') not in ('approved', 'declined'):
+        return None
+    return ProviderResult(data['status'] == 'approved', data.get('reference', ''), data.get('message', ''))
+
+
+def _payload(transaction_obj):
+    return {
+        'transaction_id': str(transaction_obj.transaction_id),
+        'transaction_type': transaction_obj.transaction_type,
+        'amount': str(transaction_obj.amount),
+        'mobile_number': transaction_obj.mobile_number,
+        'card_id': transaction_obj.card_id,
+    }
+
+
+class AsyncProviderClient:
+    """
+    Async HTTP client for provider APIs with bounded concurrency.
+
+    One shared httpx.AsyncClient (connection pool) per event loop; a
+    semaphore caps in-flight provider calls so a slow provider cannot
+    exhaust sockets. Without PROVIDER_API_URL calls are simulated.
+    """
+
+    def __init__(self, base_url=None, max_concurrency=None, timeout=None, simulated_latency=None):
+        self.base_url = base_url if base_url is not None else getattr(settings, 'PROVIDER_API_URL', '')
+        self.max_concurrency = max_concurrency or getattr(settings, 'PROVIDER_MAX_CONCURRENCY', 100)
+        self.timeout = timeout or getattr(settings, 'PROVIDER_TIMEOUT_SECONDS', 10)
+        self.simulated_latency = (
+            simulated_latency if simulated_latency is not None
+            else getattr(settings, 'PROVIDER_SIMULATED_LATENCY_MS', 0) / 1000
+        )
+        self._per_loop = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _resources(self):
+        """Client, global semaphore and per-provider bulkhead semaphores bound to the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.get(loop)
+            if resources is None:
+                client = None
+                if self.base_url:
+                    client = httpx.AsyncClient(
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        limits=httpx.Limits(max_connections=self.max_concurrency),
+                    )
+                resources = (client, asyncio.Semaphore(self.max_concurrency), {})
+                self._per_loop[loop] = resources
+        return resources
+
+    async def submit(self, transaction_obj):
+        """Send a transaction to its provider and return a ProviderResult"""
+        provider = provider_for(transaction_obj.transaction_type)
+        guard = provider_guard(provider)
+        if not guard.breaker.allow():
+            return open_circuit_result(provider)
+
+        client, semaphore, bulkheads = self._resources()
+        bulkhead = bulkheads.get(provider)
+        if bulkhead is None:
+            bulkhead = bulkheads.setdefault(provider, asyncio.Semaphore(guard.bulkhead.max_concurrent))
+
+        try:
+            await asyncio.wait_for(bulkhead.acquire(), guard.bulkhead.max_wait)
+        except asyncio.TimeoutError:
+            return _guarded_result(guard, guard.bulkhead.reject)
+        try:
+            with guard.bulkhead.in_use():
+                result = await self._send(client, semaphore, provider, transaction_obj)
+        except Exception:
+            guard.breaker.record(False)
+            raise
+        finally:
+            bulkhead.release()
+        return _guarded_result(guard, lambda: result)
+
+    async def _send(self, client, semaphore, provider, transaction_obj):
+        async with semaphore:
+            if client is None:
+                if self.simulated_latency:
+                    await asyncio.sleep(self.simulated_latency)
+                return simulated_outcome(provider)
+
+            try:
+                response = await client.post(
+                    f'/{provider}/transactions', json=_payload(transaction_obj), headers=trace_headers()
+                )
+            except httpx.HTTPError as e:
+                return ProviderResult(False, '', f'{provider} unreachable: {e}', True)
+
+        if response.status_code >= 500:
+            return ProviderResult(False, '', f'{provider} error {response.status_code}', True)
+        data = response.json()
+        return ProviderResult(
+            bool(data.get('approved')), data.get('reference', ''), data.get('message', ''), bool(data.get('retryable'))
+        )
+
+    async def aclose(self):
+        """Close the client for the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._per_loop.pop(loop, None)
+        if resources and resources[0] is not None:
+            await resources[0].aclose()
+
+
+async_provider_client = AsyncProviderClient()
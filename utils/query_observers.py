@@ -0,0 +1,49 @@
+# utils/query_observers.py
+"""
+execute_wrappers scoped to a request instead of a connection.
+
+Connections are per thread, so wrapping connections.all() in a middleware
+misses the queries an async view runs through sync_to_async. Instead one
+dispatcher is installed on every connection when it connects, and hands
+each query to the observers in a context variable, which sync_to_async
+carries into its worker thread. WalletConfig.ready() imports this module
+before the first connection is made.
+"""
+from contextlib import contextmanager
+from functools import partial
+import contextvars
+
+from django.db.backends.signals import connection_created
+
+_observers = contextvars.ContextVar('query_observers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    observers = _observers.get()
+    # Chained like Django chains execute_wrappers: the first observer is outermost
+    for observer in reversed(observers):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    # First, not last: execute_wrapper() pops the last wrapper when its block ends
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch)
+
+
+def _connected(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_connected, dispatch_uid='utils.query_observers')
+
+
+@contextmanager
+def observe(wrapper):
+    """Run the block with wrapper, an execute_wrapper, seeing every query it makes in any thread"""
+    token = _observers.set((*_observers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
@@ -0,0 +1,168 @@
+# utils/resilience.py
+from contextlib import contextmanager
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_POLICY = {
+    'MAX_CONCURRENT': 20,
+    'MAX_WAIT_SECONDS': 0.1,
+    'FAILURE_THRESHOLD': 5,
+    'RECOVERY_SECONDS': 30,
+    'HALF_OPEN_CALLS': 1,
+}
+
+
+class BulkheadFull(Exception):
+    """No free slot for the provider within MAX_WAIT_SECONDS"""
+
+
+class Bulkhead:
+    """Caps the calls in flight to one provider so it cannot take every worker thread"""
+
+    def __init__(self, max_concurrent, max_wait):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for a blocking call, waiting at most max_wait"""
+        if not self._semaphore.acquire(timeout=self.max_wait):
+            self.reject()
+        try:
+            with self.in_use():
+                yield
+        finally:
+            self._semaphore.release()
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+        raise BulkheadFull()
+
+    @contextmanager
+    def in_use(self):
+        """Count a call as in flight (the async client holds its own per-loop semaphore)"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls pass; FAILURE_THRESHOLD failures in a row open it.
+    open: calls are refused until RECOVERY_SECONDS have passed.
+    half_open: up to HALF_OPEN_CALLS probes pass; a success closes the
+    circuit, a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, recovery_seconds, half_open_calls):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.rejected = 0
+        self.transitions = 0
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.transitions += 1
+
+    def allow(self):
+        """Whether a call may go ahead; counts a half-open probe if so"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.recovery_seconds:
+                self._set_state('half_open')
+                self.probes = 0
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and self.probes < self.half_open_calls:
+                self.probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, healthy):
+        """Record a call outcome: True, False, or None when the call never reached the provider"""
+        with self._lock:
+            if self.state == 'half_open':
+                self.probes = max(0, self.probes - 1)
+            if healthy is None:
+                return
+            if healthy:
+                self.failures = 0
+                self._set_state('closed')
+                return
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self._set_state('open')
+                self.opened_at = time.monotonic()
+
+
+class ProviderGuard:
+    """Bulkhead and circuit breaker for one provider"""
+
+    def __init__(self, name, policy):
+        self.name = name
+        self.bulkhead = Bulkhead(policy['MAX_CONCURRENT'], policy['MAX_WAIT_SECONDS'])
+        self.breaker = CircuitBreaker(
+            policy['FAILURE_THRESHOLD'], policy['RECOVERY_SECONDS'], policy['HALF_OPEN_CALLS']
+        )
+
+    def snapshot(self):
+        return {
+            'provider': self.name,
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'breaker_rejections': self.breaker.rejected,
+            'breaker_transitions': self.breaker.transitions,
+            'in_flight': self.bulkhead.in_flight,
+            'max_concurrent': self.bulkhead.max_concurrent,
+            'bulkhead_rejections': self.bulkhead.rejected,
+        }
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def provider_policy(provider):
+    """DEFAULT_POLICY overlaid with PROVIDER_RESILIENCE['default'] and the provider's entry"""
+    configured = getattr(settings, 'PROVIDER_RESILIENCE', {})
+    return {**DEFAULT_POLICY, **configured.get('default', {}), **configured.get(provider, {})}
+
+
+def provider_guard(provider):
+    """Process-wide guard for a provider, created on first use"""
+    guard = _guards.get(provider)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(provider, ProviderGuard(provider, provider_policy(provider)))
+    return guard
+
+
+def guard_snapshots():
+    """State of every guard created so far, for health checks and metrics"""
+    return [guard.snapshot() for guard in list(_guards.values())]
+
+
+def reset_guards():
+    """Forget all guard state (tests, settings changes)"""
+    with _guards_lock:
+        _guards.clear()
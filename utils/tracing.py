@@ -0,0 +1,277 @@
+# utils/tracing.py
+"""
+Timing spans with W3C trace context, exported as OTLP/JSON.
+
+Spans nest through a context variable, so a trace follows a request down
+the call stack and into coroutines. Outside a sampled trace span() and
+@traced cost a context variable lookup; with TRACING_FILE and
+TRACING_OTLP_ENDPOINT both empty no trace is ever started. Finished spans
+are batched and written by a background thread, one
+ExportTraceServiceRequest per line, to TRACING_FILE and/or POSTed to an
+OTLP/HTTP collector.
+"""
+from functools import wraps
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'daffodilPay'
+# OTLP enum values
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+def tracing_enabled():
+    return bool(getattr(settings, 'TRACING_FILE', '') or getattr(settings, 'TRACING_OTLP_ENDPOINT', ''))
+
+
+def parse_traceparent(header):
+    """(trace_id, parent_span_id, sampled) from a traceparent header, or None if absent or malformed"""
+    match = _TRACEPARENT.match((header or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'start', 'end', 'error', '_token')
+
+    def __init__(self, trace_id, parent_id, name, kind=KIND_INTERNAL, attributes=None):
+        self.trace_id = trace_id
+        # os.urandom, not random: forked workers share the random module's state
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start = self.end = 0
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def rename(self, name):
+        self.name = name
+
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        exporter.add(self)
+        return False
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': STATUS_ERROR, 'message': self.error} if self.error else {'code': STATUS_OK},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class _NoSpan:
+    """Stands in for a span outside a sampled trace"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def rename(self, name):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def start_trace(name, traceparent=None, kind=KIND_SERVER, attributes=None):
+    """
+    Root span of this service's part of a trace.
+
+    Continues the caller's trace (and its sampling decision) when
+    traceparent is a valid header, else starts one for
+    TRACING_SAMPLE_RATE of the calls.
+    """
+    if not tracing_enabled():
+        return _NO_SPAN
+    parent = parse_traceparent(traceparent)
+    if parent is None:
+        if random.random() >= getattr(settings, 'TRACING_SAMPLE_RATE', 1.0):
+            return _NO_SPAN
+        return Span(os.urandom(16).hex(), None, name, kind, attributes)
+    trace_id, parent_id, sampled = parent
+    return Span(trace_id, parent_id, name, kind, attributes) if sampled else _NO_SPAN
+
+
+def span(name, attributes=None, kind=KIND_INTERNAL):
+    """Child of the current span; a no-op outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        return _NO_SPAN
+    return Span(parent.trace_id, parent.span_id, name, kind, attributes)
+
+
+def traced(name, kind=KIND_INTERNAL):
+    """Decorator running the function in span(name)"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return function(*args, **kwargs)
+            with span(name, kind=kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """The span the caller runs in, or None outside a trace"""
+    return _current.get()
+
+
+def set_attribute(key, value):
+    """Set an attribute on the current span, if any"""
+    current = _current.get()
+    if current is not None:
+        current.set(key, value)
+
+
+def trace_headers():
+    """traceparent header for an outgoing call made inside a trace"""
+    current = _current.get()
+    return {'traceparent': current.traceparent()} if current is not None else {}
+
+
+def otlp_request(spans):
+    """An OTLP ExportTraceServiceRequest body for spans"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', SERVICE_NAME), _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': __name__}, 'spans': [span.to_otlp() for span in spans]}],
+    }]}
+
+
+class BatchExporter:
+    """
+    Collects finished spans; a daemon thread exports them every
+    TRACING_EXPORT_SECONDS, sooner once TRACING_BATCH_SIZE are waiting.
+    """
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def add(self, span):
+        with self._lock:
+            self._spans.append(span)
+            full = len(self._spans) >= getattr(settings, 'TRACING_BATCH_SIZE', 512)
+        if self._pid != os.getpid():
+            self._start()
+        if full:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.flush)
+            # After a fork only the forking thread survives, so each process starts its own
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(getattr(settings, 'TRACING_EXPORT_SECONDS', 2.0))
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Trace export failed: %s", e)
+
+    def flush(self):
+        """Export the waiting spans now; returns how many there were"""
+        # Held from taking the batch to writing it, so flush() returns only once earlier spans are out
+        with self._write_lock:
+            with self._lock:
+                spans, self._spans = self._spans, []
+            if not spans:
+                return 0
+            body = json.dumps(otlp_request(spans), separators=(',', ':'))
+            path = getattr(settings, 'TRACING_FILE', '')
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                # One write per batch in append mode, so several workers can share the file
+                with open(path, 'a') as f:
+                    f.write(body + '\n')
+            endpoint = getattr(settings, 'TRACING_OTLP_ENDPOINT', '')
+            if endpoint:
+                try:
+                    httpx.post(endpoint, content=body, headers={'Content-Type': 'application/json'}, timeout=5)
+                except httpx.HTTPError as e:
+                    logger.warning("Could not send %s spans to %s: %s", len(spans), endpoint, e)
+        return len(spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans = []
+
+
+exporter = BatchExporter()
+
+
+def read_spans(path):
+    """Every span in an OTLP/JSON lines file, as the dicts to_otlp() produced"""
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line)['resourceSpans']:
+                for scope_spans in resource_spans['scopeSpans']:
+                    yield from scope_spans['spans']
@@ -3,44 +3,191 @@ from decimal import Decimal
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.db import transaction
-import random
+from django.db.models import Q, Sum
 import logging
 
+from utils.fee_schedule import fee_schedule_cache, compile_default_schedule
+from utils.money import Money, currency_exponent, format_minor, to_minor
+from utils.fx import fx_rate_cache
+from utils.events import publish_on_commit
+from utils.metrics import Counter
+from utils.providers import call_provider, provider_for
+from utils.tracing import KIND_CLIENT, set_attribute, span, traced
+
 logger = logging.getLogger(__name__)
 
+PROCESSED = Counter(
+    'wallet_transactions_processed_total', 'TransactionProcessor outcomes by type and provider',
+    ['transaction_type', 'provider', 'outcome']
+)
+
+
+class ProviderUnavailable(ValidationError):
+    """Transient provider failure; the transaction is retried later"""
+
 
 class TransactionProcessor:
     """Utility class for processing different types of transactions"""
 
-    def __init__(self, user, transaction_obj):
+    def __init__(self, user, transaction_obj, provider_result=None):
         self.user = user
         self.transaction = transaction_obj
         self.wallet = user.wallet
-
+        self.recipient_wallet = None
+        # Set when the provider was already called outside the DB transaction
+        self.provider_result = provider_result
+        self._provider_checked = None
+
+    def needs_provider_call(self):
+        """
+        True if the transaction's provider still has to be called: it has
+        one, no outcome was passed in, and for outgoing types the wallet
+        can cover the total (the provider must not move money it cannot).
+        """
+        from wallet.models import Transaction
+        if self.provider_result is not None or provider_for(self.transaction.transaction_type) is None:
+            return False
+        if self.transaction.transaction_type in Transaction.OUTGOING_TYPES:
+            self.wallet.refresh_from_db(fields=['balance', 'is_active'])
+            return self.wallet.can_debit(self.transaction.total_amount)
+        return True
+
+    def claim(self):
+        """
+        Claim the row (pending/retrying -> processing, committed on its
+        own) before the provider call, so no cancel can win while money
+        may be moving. A row already 'processing' was claimed by the caller
+        (retrier, sweeper, async view).
+        """
+        return self.transaction.status == 'processing' or self.transaction.claim()
+
+    def call_provider_first(self):
+        """
+        Claim the transaction and call its provider (bulkhead + breaker),
+        if needs_provider_call(). Must run outside any DB transaction: on
+        SQLite an open transaction holds the write lock for every other
+        writer while the provider answers. False if the claim was lost, in
+        which case the transaction must not be processed.
+        """
+        if self._provider_checked is not None:
+            return self._provider_checked
+        self._provider_checked = True
+        if self.needs_provider_call():
+            if not self.claim():
+                self._provider_checked = False
+                return False
+            provider = provider_for(self.transaction.transaction_type)
+            with span('provider.call', {'provider': provider}, kind=KIND_CLIENT):
+                self.provider_result = call_provider(provider)
+        return True
+
+    @traced('processor.process')
     def process_transaction(self):
         """Process transaction based on type"""
-        transaction_type = self.transaction.transaction_type
-
+        set_attribute('transaction.type', self.transaction.transaction_type)
+        if not self.call_provider_first():
+            self._count('skipped')
+            return False, f"Transaction is already {self.transaction.status}"
         try:
             with transaction.atomic():
-                if transaction_type == 'card_to_wallet':
-                    return self._process_card_to_wallet()
-                elif transaction_type == 'wallet_to_card':
-                    return self._process_wallet_to_card()
-                elif transaction_type in ['wallet_to_bkash', 'wallet_to_nagad']:
-                    return self._process_wallet_to_mobile()
-                elif transaction_type in ['bkash_to_wallet', 'nagad_to_wallet']:
-                    return self._process_mobile_to_wallet()
-                elif transaction_type == 'wallet_to_wallet':
-                    return self._process_wallet_to_wallet()
-                else:
-                    raise ValidationError("Invalid transaction type")
-
+                if not self._still_open():
+                    self._count('skipped')
+                    return False, f"Transaction is already {self.transaction.status}"
+                result = self._dispatch()
+        except ProviderUnavailable as e:
+            logger.warning("Provider attempt %s failed: %s", self.transaction.attempt_count, e.message)
+            if self.transaction.schedule_retry(e.message):
+                result = (False, f"{e.message}; retry scheduled")
+            else:
+                self.transaction.mark_failed(e.message)
+                result = (False, e.message)
         except Exception as e:
-            logger.error(f"Transaction processing failed: {str(e)}")
-            self.transaction.mark_failed(str(e))
-            return False, str(e)
+            if self.provider_result is not None and self.provider_result.success:
+                # The provider has moved the money; failing the row would lose track of it
+                reason = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                logger.error(
+                    "Transaction %s succeeded at the provider but not in the wallet: %s",
+                    self.transaction.transaction_id, reason
+                )
+                self.transaction.mark_unreconciled(reason)
+                result = (False, f"{reason}; held for reconciliation")
+            else:
+                logger.error("Transaction processing failed: %s", e)
+                self.transaction.mark_failed(str(e))
+                result = (False, str(e))
+
+        self._count(self.transaction.status)
+        set_attribute('transaction.status', self.transaction.status)
+        self._publish_events()
+        return result
+
+    def _count(self, outcome):
+        transaction_type = self.transaction.transaction_type
+        PROCESSED.inc(transaction_type, provider_for(transaction_type) or 'internal', outcome)
+
+    @traced('processor.lock')
+    def _still_open(self):
+        """Re-read the status inside the DB transaction, so a concurrent cancel either wins or waits"""
+        from wallet.models import Transaction
+        current = Transaction.objects.select_for_update().filter(
+            pk=self.transaction.pk
+        ).values_list('status', flat=True).first()
+        if current in Transaction.OPEN_STATUSES:
+            return True
+        self.transaction.status = current
+        return False
+
+    def _dispatch(self):
+        """Run the handler for the transaction type"""
+        transaction_type = self.transaction.transaction_type
+
+        if transaction_type == 'card_to_wallet':
+            return self._process_card_to_wallet()
+        elif transaction_type == 'wallet_to_card':
+            return self._process_wallet_to_card()
+        elif transaction_type in ['wallet_to_bkash', 'wallet_to_nagad']:
+            return self._process_wallet_to_mobile()
+        elif transaction_type in ['bkash_to_wallet', 'nagad_to_wallet']:
+            return self._process_mobile_to_wallet()
+        elif transaction_type == 'wallet_to_wallet':
+            return self._process_wallet_to_wallet()
+        else:
+            raise ValidationError("Invalid transaction type")
+
+    @traced('processor.publish_events')
+    def _publish_events(self):
+        """Queue status and balance events for delivery once the transfer commits"""
+        transaction_obj = self.transaction
+        publish_on_commit(self.user.id, {
+            'type': 'transaction.status',
+            'transaction_id': str(transaction_obj.transaction_id),
+            'transaction_type': transaction_obj.transaction_type,
+            'status': transaction_obj.status,
+            'amount': str(transaction_obj.amount),
+        })
+        if transaction_obj.status != 'completed':
+            return
+
+        publish_on_commit(self.user.id, self._balance_event(self.wallet))
+        if self.recipient_wallet is not None:
+            publish_on_commit(self.recipient_wallet.user_id, {
+                'type': 'transaction.received',
+                'transaction_id': str(transaction_obj.transaction_id),
+                'sender': self.user.username,
+                'amount': str(transaction_obj.converted_amount or transaction_obj.amount),
+                'currency': self.recipient_wallet.currency,
+            })
+            publish_on_commit(self.recipient_wallet.user_id, self._balance_event(self.recipient_wallet))
 
+    @staticmethod
+    def _balance_event(wallet):
+        return {
+            'type': 'wallet.balance',
+            'balance': str(Money.from_decimal(wallet.balance, wallet.currency)),
+            'currency': wallet.currency,
+        }
+
+    @traced('processor.card_to_wallet')
     def _process_card_to_wallet(self):
         """Process card to wallet transaction"""
         if not self.transaction.card:
@@ -50,11 +197,12 @@ class TransactionProcessor:
         if self._simulate_card_processing():
             self.wallet.credit(self.transaction.amount)
             self.transaction.mark_completed()
-            logger.info(f"Card to wallet transaction completed: {self.transaction.transaction_id}")
+            logger.info("Card to wallet transaction completed: %s", self.transaction.transaction_id)
             return True, "Transaction completed successfully"
         else:
             raise ValidationError("Card processing failed")
 
+    @traced('processor.wallet_to_card')
     def _process_wallet_to_card(self):
         """Process wallet to card transaction"""
         if not self.transaction.card:
@@ -67,11 +215,12 @@ class TransactionProcessor:
         if self._simulate_card_processing():
             self.wallet.debit(self.transaction.total_amount)
             self.transaction.mark_completed()
-            logger.info(f"Wallet to card transaction completed: {self.transaction.transaction_id}")
+            logger.info("Wallet to card transaction completed: %s", self.transaction.transaction_id)
             return True, "Transaction completed successfully"
         else:
             raise ValidationError("Card processing failed")
 
+    @traced('processor.wallet_to_mobile')
     def _process_wallet_to_mobile(self):
         """Process wallet to mobile payment transaction"""
         if not self.transaction.mobile_number:
@@ -84,11 +233,12 @@ class TransactionProcessor:
         if self._simulate_mobile_processing():
             self.wallet.debit(self.transaction.total_amount)
             self.transaction.mark_completed()
-            logger.info(f"Wallet to mobile transaction completed: {self.transaction.transaction_id}")
+            logger.info("Wallet to mobile transaction completed: %s", self.transaction.transaction_id)
             return True, "Transaction completed successfully"
         else:
             raise ValidationError("Mobile payment processing failed")
 
+    @traced('processor.mobile_to_wallet')
     def _process_mobile_to_wallet(self):
         """Process mobile payment to wallet transaction"""
         if not self.transaction.mobile_number:
@@ -98,11 +248,12 @@ class TransactionProcessor:
         if self._simulate_mobile_processing():
             self.wallet.credit(self.transaction.amount)
             self.transaction.mark_completed()
-            logger.info(f"Mobile to wallet transaction completed: {self.transaction.transaction_id}")
+            logger.info("Mobile to wallet transaction completed: %s", self.transaction.transaction_id)
             return True, "Transaction completed successfully"
         else:
             raise ValidationError("Mobile payment processing failed")
 
+    @traced('processor.wallet_to_wallet')
     def _process_wallet_to_wallet(self):
         """Process wallet to wallet transaction"""
         if not self.transaction.recipient_user:
@@ -116,30 +267,60 @@ class TransactionProcessor:
             if not recipient_wallet.is_active:
                 raise ValidationError("Recipient wallet is inactive")
 
+            # Convert into the recipient's currency when the wallets differ
+            credit_amount = self.transaction.amount
+            if recipient_wallet.currency != self.wallet.currency:
+                converted, rate = fx_rate_cache.convert(
+                    Money.from_decimal(self.transaction.amount, self.wallet.currency),
+                    recipient_wallet.currency
+                )
+                credit_amount = converted.to_decimal()
+                self.transaction.fx_rate = rate
+                self.transaction.converted_amount = credit_amount
+                self.transaction.converted_currency = recipient_wallet.currency
+
             # Transfer money
             self.wallet.debit(self.transaction.total_amount)
-            recipient_wallet.credit(self.transaction.amount)
+            recipient_wallet.credit(credit_amount)
+            self.recipient_wallet = recipient_wallet
 
             self.transaction.mark_completed()
-            logger.info(f"Wallet to wallet transaction completed: {self.transaction.transaction_id}")
+            logger.info("Wallet to wallet transaction completed: %s", self.transaction.transaction_id)
             return True, "Transaction completed successfully"
 
         except Exception as e:
             raise ValidationError(f"Wallet transfer failed: {str(e)}")
 
+    @traced('provider.result')
+    def _call_provider(self):
+        """Apply the provider outcome from call_provider_first() or the caller"""
+        result = self.provider_result
+        set_attribute('provider', provider_for(self.transaction.transaction_type))
+        if result is None:
+            # Skipped for lack of balance, which has since come in; call again on the retry
+            raise ProviderUnavailable('Provider was not called')
+        set_attribute('provider.success', result.success)
+        self.transaction.attempt_count += 1
+        if result.reference:
+            self.transaction.reference_number = result.reference[:50]
+        if not result.success and result.retryable:
+            raise ProviderUnavailable(result.message or 'Provider temporarily unavailable')
+        return result.success
+
     def _simulate_card_processing(self):
         """Simulate card processing with 95% success rate"""
-        return random.random() < 0.95
+        return self._call_provider()
 
     def _simulate_mobile_processing(self):
         """Simulate mobile payment processing with 90% success rate"""
-        return random.random() < 0.90
+        return self._call_provider()
 
 
 class FeeCalculator:
     """Utility class for calculating transaction fees"""
 
-    # Fee structure (percentage of transaction amount)
+    # Default fee structure (percentage of transaction amount), used until a
+    # FeeSchedule is stored in the database
     FEE_STRUCTURE = {
         'card_to_wallet': Decimal('0.02'),  # 2%
         'wallet_to_card': Decimal('0.015'),  # 1.5%
@@ -150,48 +331,113 @@ class FeeCalculator:
         'wallet_to_wallet': Decimal('0.001'),  # 0.1%
     }
 
-    # Minimum and maximum fees
+    # Default minimum and maximum fees
     MIN_FEE = Decimal('0.10')
     MAX_FEE = Decimal('50.00')
 
     @classmethod
-    def calculate_fee(cls, transaction_type, amount):
+    def get_schedule(cls):
+        """Return the compiled fee schedule currently in force"""
+        return fee_schedule_cache.get(cls._default_schedule)
+
+    @classmethod
+    def _default_schedule(cls):
+        return compile_default_schedule(cls.FEE_STRUCTURE, cls.MIN_FEE, cls.MAX_FEE)
+
+    @classmethod
+    def calculate_fee(cls, transaction_type, amount, currency='', plan=''):
         """Calculate transaction fee"""
-        if transaction_type not in cls.FEE_STRUCTURE:
-            return Decimal('0.00')
+        exponent = currency_exponent(currency)
+        fee_minor = cls.get_schedule().price_minor(
+            transaction_type, to_minor(amount, exponent), currency, plan
+        )
+        return Decimal(format_minor(fee_minor, exponent))
 
-        fee_rate = cls.FEE_STRUCTURE[transaction_type]
-        calculated_fee = amount * fee_rate
+    @classmethod
+    @traced('fee.calculate')
+    def calculate_fee_money(cls, transaction_type, amount, plan=''):
+        """Calculate the fee for a Money amount"""
+        fee_minor = cls.get_schedule().price_minor(
+            transaction_type, amount.minor, amount.currency, plan
+        )
+        return Money(fee_minor, amount.currency, amount.exponent)
 
-        # Apply minimum and maximum limits
-        if calculated_fee < cls.MIN_FEE:
-            return cls.MIN_FEE
-        elif calculated_fee > cls.MAX_FEE:
-            return cls.MAX_FEE
+    @classmethod
+    def calculate_fees(cls, types, amounts, currency='', plan=''):
+        """Calculate fees for many legs in one vectorised call"""
+        exponent = currency_exponent(currency)
+        amounts_minor = [to_minor(amount, exponent) for amount in amounts]
+        fees_minor = cls.calculate_fees_minor(types, amounts_minor, currency, plan)
+        return [Decimal(format_minor(int(fee), exponent)) for fee in fees_minor]
 
-        return calculated_fee.quantize(Decimal('0.01'))
+    @classmethod
+    def calculate_fees_minor(cls, types, amounts_minor, currency='', plan=''):
+        """Calculate fees for minor-unit amounts, returning an int64 array"""
+        return cls.get_schedule().price_many_minor(types, amounts_minor, currency, plan)
 
 
 class TransactionValidator:
     """Utility class for validating transactions"""
 
     @staticmethod
-    def validate_daily_limit(user, amount):
-        """Check if transaction exceeds daily limit"""
-        from ..wallet.models import Transaction
-        from datetime import datetime, timedelta
-
-        today = timezone.now().date()
-        daily_total = Transaction.objects.filter(
+    def get_limit_totals(user):
+        """
+        Return today's and this month's totals counted against the limits,
+        as Money: completed transactions plus open ones (pending, processing,
+        retrying), which may still complete without being validated again.
+        """
+        from wallet.models import Transaction
+
+        now = timezone.now()
+        current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        totals = Transaction.objects.filter(
             user=user,
-            status='completed',
-            created_at__date=today
+            status__in=['completed', *Transaction.OPEN_STATUSES],
+            created_at__gte=current_month
         ).aggregate(
-            total=models.Sum('amount')
-        )['total'] or Decimal('0.00')
+            monthly=Sum('amount'),
+            daily=Sum('amount', filter=Q(created_at__gte=today))
+        )
+
+        currency = user.wallet.currency
+        return Money.from_decimal(totals['daily'], currency), Money.from_decimal(totals['monthly'], currency)
+
+    @staticmethod
+    def get_remaining_limits(user):
+        """Return (daily_remaining, monthly_remaining) as Money"""
+        wallet = user.wallet
+        daily_total, monthly_total = TransactionValidator.get_limit_totals(user)
+        zero = Money.zero(wallet.currency)
+        return (
+            (Money.from_decimal(wallet.daily_limit, wallet.currency) - daily_total).max(zero),
+            (Money.from_decimal(wallet.monthly_limit, wallet.currency) - monthly_total).max(zero),
+        )
+
+    @staticmethod
+    def validate_limits(user, amount):
+        """Check daily and monthly limits with a single aggregate query"""
+        wallet = user.wallet
+        amount = Money.from_decimal(amount, wallet.currency)
+        daily_total, monthly_total = TransactionValidator.get_limit_totals(user)
+
+        if daily_total + amount > Money.from_decimal(wallet.daily_limit, wallet.currency):
+            raise ValidationError(
+                f"Transaction exceeds daily limit of {wallet.currency} {wallet.daily_limit}"
+            )
+        if monthly_total + amount > Money.from_decimal(wallet.monthly_limit, wallet.currency):
+            raise ValidationError(
+                f"Transaction exceeds monthly limit of {wallet.currency} {wallet.monthly_limit}"
+            )
 
+    @staticmethod
+    def validate_daily_limit(user, amount):
+        """Check if transaction exceeds daily limit"""
         wallet = user.wallet
-        if daily_total + amount > wallet.daily_limit:
+        daily_total, _ = TransactionValidator.get_limit_totals(user)
+        limit = Money.from_decimal(wallet.daily_limit, wallet.currency)
+        if daily_total + Money.from_decimal(amount, wallet.currency) > limit:
             raise ValidationError(
                 f"Transaction exceeds daily limit of {wallet.currency} {wallet.daily_limit}"
             )
@@ -199,20 +445,10 @@ class TransactionValidator:
     @staticmethod
     def validate_monthly_limit(user, amount):
         """Check if transaction exceeds monthly limit"""
-        from ..wallet.models import Transaction
-        from datetime import datetime
-
-        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_total = Transaction.objects.filter(
-            user=user,
-            status='completed',
-            created_at__gte=current_month
-        ).aggregate(
-            total=models.Sum('amount')
-        )['total'] or Decimal('0.00')
-
         wallet = user.wallet
-        if monthly_total + amount > wallet.monthly_limit:
+        _, monthly_total = TransactionValidator.get_limit_totals(user)
+        limit = Money.from_decimal(wallet.monthly_limit, wallet.currency)
+        if monthly_total + Money.from_decimal(amount, wallet.currency) > limit:
             raise ValidationError(
                 f"Transaction exceeds monthly limit of {wallet.currency} {wallet.monthly_limit}"
             )
@@ -3,7 +3,12 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import UserProfile, Wallet, Card, Transaction, TransactionLog
+from .models import (
+    UserProfile, Wallet, Card, Transaction, TransactionLog, SpendingAnomaly,
+    FeeSchedule, FeeRule, ExchangeRate, OutboxEvent, ScheduledTransfer, ScheduledTransferRun,
+    DisbursementJob, SettlementBatch, ArchiveSegment, TransactionLogPartition,
+    BalanceSnapshot
+)
 
 
 @admin.register(UserProfile)
@@ -55,7 +60,7 @@ class WalletAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
         ('Wallet Information', {
-            'fields': ('user', 'balance', 'currency', 'is_active')
+            'fields': ('user', 'balance', 'currency', 'fee_plan', 'is_active')
         }),
         ('Limits', {
             'fields': ('daily_limit', 'monthly_limit')
@@ -139,7 +144,9 @@ class TransactionAdmin(admin.ModelAdmin):
     ]
     readonly_fields = [
         'transaction_id', 'total_amount', 'created_at',
-        'completed_at', 'failed_at', 'ip_address'
+        'completed_at', 'failed_at', 'ip_address',
+        'fx_rate', 'converted_amount', 'converted_currency',
+        'attempt_count', 'next_attempt_at'
     ]
     date_hierarchy = 'created_at'
     inlines = [TransactionLogInline]
@@ -159,6 +166,14 @@ class TransactionAdmin(admin.ModelAdmin):
             'fields': ('mobile_number', 'description', 'reference_number'),
             'classes': ('collapse',)
         }),
+        ('Provider Retries', {
+            'fields': ('attempt_count', 'next_attempt_at'),
+            'classes': ('collapse',)
+        }),
+        ('Currency Conversion', {
+            'fields': ('fx_rate', 'converted_amount', 'converted_currency'),
+            'classes': ('collapse',)
+        }),
         ('Metadata', {
             'fields': ('ip_address', 'user_agent'),
             'classes': ('collapse',)
@@ -183,9 +198,11 @@ class TransactionAdmin(admin.ModelAdmin):
         colors = {
             'pending': 'orange',
             'processing': 'blue',
+            'retrying': 'purple',
             'completed': 'green',
             'failed': 'red',
-            'cancelled': 'gray'
+            'cancelled': 'gray',
+            'unreconciled': 'darkred'
         }
         color = colors.get(obj.status, 'black')
         return format_html(
@@ -295,6 +312,171 @@ class TransactionLogAdmin(admin.ModelAdmin):
         return self.readonly_fields
 
 
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    """Admin interface for Exchange Rates"""
+    list_display = ['base_currency', 'quote_currency', 'rate', 'source', 'valid_from']
+    list_filter = ['base_currency', 'quote_currency', 'source']
+    date_hierarchy = 'valid_from'
+    readonly_fields = ['created_at', 'updated_at']
+
+
+class FeeRuleInline(admin.TabularInline):
+    """Inline admin for Fee Rules"""
+    model = FeeRule
+    extra = 0
+    fields = [
+        'transaction_type', 'plan', 'currency', 'min_amount',
+        'rate', 'flat_fee', 'min_fee', 'max_fee'
+    ]
+
+
+@admin.register(FeeSchedule)
+class FeeScheduleAdmin(admin.ModelAdmin):
+    """Admin interface for Fee Schedules"""
+    list_display = ['version', 'name', 'is_active', 'min_fee', 'max_fee', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name']
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [FeeRuleInline]
+
+
+@admin.register(SpendingAnomaly)
+class SpendingAnomalyAdmin(admin.ModelAdmin):
+    """Admin review queue for flagged spending anomalies"""
+    list_display = [
+        'user', 'reasons', 'z_score', 'anomaly_amount', 'period_total',
+        'peer_percentile', 'current_country', 'current_city', 'status', 'period_end'
+    ]
+    list_filter = ['status', 'reasons', 'period_end', 'current_country']
+    search_fields = ['user__username', 'current_city']
+    readonly_fields = [
+        'user', 'period_start', 'period_end', 'anomaly_date', 'anomaly_amount',
+        'z_score', 'period_total', 'peer_percentile', 'peer_group_size',
+        'current_country', 'current_city', 'reasons', 'reviewed_by', 'created_at'
+    ]
+
+    actions = ['mark_confirmed', 'mark_dismissed']
+
+    def mark_confirmed(self, request, queryset):
+        """Confirm selected anomalies"""
+        count = queryset.update(status='confirmed', reviewed_by=request.user)
+        self.message_user(request, f'{count} anomalies confirmed.')
+
+    mark_confirmed.short_description = 'Confirm selected anomalies'
+
+    def mark_dismissed(self, request, queryset):
+        """Dismiss selected anomalies"""
+        count = queryset.update(status='dismissed', reviewed_by=request.user)
+        self.message_user(request, f'{count} anomalies dismissed.')
+
+    mark_dismissed.short_description = 'Dismiss selected anomalies'
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Outbox delivery state"""
+    list_display = ['id', 'event_type', 'aggregate_id', 'status', 'attempts', 'lease_owner', 'created_at', 'delivered_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['aggregate_id']
+    readonly_fields = [
+        'event_type', 'aggregate_id', 'payload', 'attempts', 'lease_owner',
+        'lease_expires_at', 'last_error', 'created_at', 'delivered_at'
+    ]
+
+    actions = ['requeue_events']
+
+    def requeue_events(self, request, queryset):
+        """Send dead events again"""
+        count = queryset.filter(status='dead').update(
+            status='pending', attempts=0, next_attempt_at=None, lease_owner='', lease_expires_at=None
+        )
+        self.message_user(request, f'{count} events requeued.')
+
+    requeue_events.short_description = 'Requeue dead events'
+
+
+class ScheduledTransferRunInline(admin.TabularInline):
+    model = ScheduledTransferRun
+    extra = 0
+    readonly_fields = ['scheduled_for', 'status', 'message', 'transaction', 'created_at']
+    can_delete = False
+    ordering = ['-scheduled_for']
+
+
+@admin.register(ScheduledTransfer)
+class ScheduledTransferAdmin(admin.ModelAdmin):
+    """Scheduled and recurring transfers"""
+    list_display = [
+        'id', 'user', 'transaction_type', 'amount', 'frequency',
+        'next_run_at', 'last_run_at', 'run_count', 'is_active'
+    ]
+    list_filter = ['frequency', 'is_active', 'transaction_type']
+    search_fields = ['user__username', 'recipient_user__username', 'mobile_number']
+    readonly_fields = ['last_run_at', 'run_count', 'created_at', 'updated_at']
+    raw_id_fields = ['user', 'recipient_user', 'card']
+    inlines = [ScheduledTransferRunInline]
+
+
+@admin.register(DisbursementJob)
+class DisbursementJobAdmin(admin.ModelAdmin):
+    """Bulk disbursement jobs (legs are downloadable from the API)"""
+    list_display = [
+        'job_id', 'user', 'status', 'total_rows', 'processed_legs',
+        'succeeded_legs', 'failed_legs', 'invalid_legs', 'total_amount', 'created_at'
+    ]
+    list_filter = ['status', 'created_at']
+    search_fields = ['job_id', 'user__username', 'original_filename']
+    readonly_fields = [
+        'job_id', 'user', 'source_file', 'original_filename', 'total_rows', 'valid_legs',
+        'invalid_legs', 'processed_legs', 'succeeded_legs', 'failed_legs', 'total_amount',
+        'total_fee', 'error', 'lease_owner', 'lease_expires_at', 'started_at', 'finished_at', 'created_at'
+    ]
+
+
+@admin.register(SettlementBatch)
+class SettlementBatchAdmin(admin.ModelAdmin):
+    """Provider settlement files (see generate_settlements)"""
+    list_display = [
+        'provider', 'window_start', 'window_end', 'status', 'transaction_count',
+        'total_amount', 'total_fee', 'generated_at'
+    ]
+    list_filter = ['provider', 'status', 'window_end']
+    search_fields = ['batch_id', 'file_path']
+    readonly_fields = [
+        'batch_id', 'provider', 'window_start', 'window_end', 'status', 'file_path', 'checksum',
+        'transaction_count', 'total_amount', 'total_fee', 'error', 'generated_at', 'created_at'
+    ]
+
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    """Archived transaction segments (see archive_transactions)"""
+    list_display = ['period', 'status', 'transaction_count', 'log_count', 'oldest_created_at', 'newest_created_at']
+    list_filter = ['status', 'period']
+    search_fields = ['segment_id', 'path']
+    readonly_fields = [
+        'segment_id', 'path', 'period', 'status', 'oldest_created_at', 'newest_created_at',
+        'min_user_id', 'max_user_id', 'transaction_count', 'log_count', 'checksum', 'created_at'
+    ]
+
+
+@admin.register(TransactionLogPartition)
+class TransactionLogPartitionAdmin(admin.ModelAdmin):
+    """Monthly transaction log tables (see partition_transaction_logs)"""
+    list_display = ['month', 'table_name', 'row_count', 'created_at']
+    readonly_fields = ['month', 'table_name', 'row_count', 'created_at']
+
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    """End-of-day wallet balances (see snapshot_balances)"""
+    list_display = ['wallet', 'date', 'balance', 'currency']
+    list_filter = ['date', 'currency']
+    search_fields = ['wallet__user__username']
+    readonly_fields = ['wallet', 'date', 'balance', 'currency', 'created_at', 'updated_at']
+
+
 # Customize admin site
 admin.site.site_header = "Digital Wallet Administration"
 admin.site.site_title = "Digital Wallet Admin"
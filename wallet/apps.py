@@ -9,5 +9,9 @@ class WalletConfig(AppConfig):
     verbose_name = 'Digital Wallet'
 
     def ready(self):
-        """Import signals when app is ready"""
-        import wallet.signals
\ No newline at end of file
+        """Import signals, hook up the query observers and start memory profiling if configured"""
+        import wallet.signals
+        # Before any connection connects, so every one gets the dispatcher
+        import utils.query_observers
+        from wallet.memory import start_from_settings
+        start_from_settings()
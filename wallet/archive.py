@@ -0,0 +1,296 @@
+# wallet/archive.py
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+import heapq
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, prefetch_related_objects
+from django.utils import timezone
+
+from .models import ArchiveSegment, Transaction, TransactionLog
+from .partitions import partition_logs_for_transactions
+from .settlements import SETTLEMENT_TYPES
+from utils.archive import SegmentReader, SegmentWriter
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ['completed', 'failed', 'cancelled']
+TRANSACTION_FIELDS = [field.attname for field in Transaction._meta.concrete_fields]
+LOG_FIELDS = ['previous_status', 'new_status', 'reason', 'changed_by_id', 'created_at']
+
+
+def _archive_root():
+    return Path(getattr(settings, 'TRANSACTION_ARCHIVE_ROOT', Path(settings.BASE_DIR) / 'archive'))
+
+
+def archive_cutoff(months, now=None):
+    """Start of the month `months` months before now; older transactions are archived"""
+    now = timezone.localtime(now or timezone.now())
+    month_index = now.year * 12 + now.month - 1 - months
+    return now.replace(
+        year=month_index // 12, month=month_index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def archivable(cutoff):
+    """Finished transactions created before cutoff; provider payouts wait for their settlement file"""
+    return Transaction.objects.filter(created_at__lt=cutoff, status__in=ARCHIVABLE_STATUSES).exclude(
+        status='completed', transaction_type__in=SETTLEMENT_TYPES.values(), settlement_batch__isnull=True
+    )
+
+
+def _records(queryset, chunk_size):
+    """Stream rows in (user_id, -created_at, -id) order with their logs, one keyset chunk at a time"""
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(
+                Q(user_id__gt=last['user_id'])
+                | Q(user_id=last['user_id'], created_at__lt=last['created_at'])
+                | Q(user_id=last['user_id'], created_at=last['created_at'], id__lt=last['id'])
+            )
+        rows = list(chunk.order_by('user_id', '-created_at', '-id').values(*TRANSACTION_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1]
+
+        ids = [row['id'] for row in rows]
+        logs = defaultdict(list)
+        # Older logs may already have been rolled into monthly partitions
+        partitioned = partition_logs_for_transactions(ids, min(row['created_at'] for row in rows))
+        live = TransactionLog.objects.filter(transaction_id__in=ids).values('transaction_id', *LOG_FIELDS)
+        for log in sorted([*partitioned, *live], key=lambda log: log['created_at']):
+            logs[log.pop('transaction_id')].append(log)
+        for row in rows:
+            row['logs'] = logs.get(row['id'], [])
+            yield row
+
+
+def archive_period(period_start, period_end, cutoff):
+    """Write one segment for the archivable rows created in [period_start, period_end)"""
+    queryset = archivable(cutoff).filter(created_at__gte=period_start, created_at__lt=period_end)
+    bounds = queryset.aggregate(
+        count=Count('id'), oldest=Min('created_at'), newest=Max('created_at'),
+        min_user=Min('user_id'), max_user=Max('user_id')
+    )
+    if not bounds['count']:
+        return None
+
+    directory = _archive_root() / f'{period_start:%Y}' / f'{period_start:%m}'
+    directory.mkdir(parents=True, exist_ok=True)
+    segment = ArchiveSegment(period=period_start.date())
+    path = directory / str(segment.segment_id)
+
+    writer = SegmentWriter(str(path), block_size=getattr(settings, 'TRANSACTION_ARCHIVE_BLOCK_SIZE', 256))
+    log_count = 0
+    try:
+        for record in _records(queryset, getattr(settings, 'TRANSACTION_ARCHIVE_CHUNK_SIZE', 2000)):
+            log_count += len(record['logs'])
+            writer.add(record)
+        checksum = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    segment.path = str(path)
+    segment.checksum = checksum
+    segment.transaction_count = writer.count
+    segment.log_count = log_count
+    segment.oldest_created_at = bounds['oldest']
+    segment.newest_created_at = bounds['newest']
+    segment.min_user_id = bounds['min_user']
+    segment.max_user_id = bounds['max_user']
+    segment.save()
+
+    _delete_archived(segment)
+    logger.info(
+        "Archived %s transactions from %d-%02d to %s",
+        segment.transaction_count, period_start.year, period_start.month, path
+    )
+    return segment
+
+
+def _delete_archived(segment, chunk_size=1000):
+    """Delete the live copies of a sealed segment's rows in chunks, then mark it complete"""
+    reader = SegmentReader(segment.path)
+    try:
+        ids = reader.transaction_ids()
+        while True:
+            chunk = list(islice(ids, chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                # Logs go with their transaction (on_delete=CASCADE)
+                Transaction.objects.filter(transaction_id__in=chunk, status__in=ARCHIVABLE_STATUSES).delete()
+    finally:
+        reader.close()
+    ArchiveSegment.objects.filter(id=segment.id).update(status='complete')
+
+
+def archive_transactions(months=None, now=None):
+    """Archive every whole month older than `months`; returns the new segments"""
+    if months is None:
+        months = getattr(settings, 'TRANSACTION_ARCHIVE_AFTER_MONTHS', 12)
+    cutoff = archive_cutoff(months, now)
+
+    # Finish runs that died after writing their files
+    for segment in ArchiveSegment.objects.filter(status='sealed'):
+        _delete_archived(segment)
+
+    segments = []
+    for period_start in archivable(cutoff).dates('created_at', 'month'):
+        start = timezone.make_aware(datetime.combine(period_start, datetime.min.time()))
+        month_index = start.year * 12 + start.month
+        end = start.replace(year=month_index // 12, month=month_index % 12 + 1)
+        segment = archive_period(start, min(end, cutoff), cutoff)
+        if segment is not None:
+            segments.append(segment)
+    return segments
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def segment_reader(segment):
+    """Process-wide reader for a segment; its index mmaps stay open between requests"""
+    reader = _readers.get(segment.path)
+    if reader is None:
+        with _readers_lock:
+            reader = _readers.get(segment.path)
+            if reader is None:
+                reader = _readers[segment.path] = SegmentReader(segment.path)
+    return reader
+
+
+def reset_readers():
+    """Close every cached reader (tests, segment files replaced)"""
+    with _readers_lock:
+        for reader in _readers.values():
+            reader.close()
+        _readers.clear()
+
+
+def _user_segments(user_id):
+    return ArchiveSegment.objects.filter(min_user_id__lte=user_id, max_user_id__gte=user_id)
+
+
+def _to_instance(record):
+    fields = Transaction._meta.concrete_fields
+    instance = Transaction(**{field.attname: field.to_python(record[field.attname]) for field in fields})
+    instance._state.adding = False
+    instance.archived = True
+    return instance
+
+
+def _still_live(segment, records):
+    """Drop records of a sealed segment whose live row has not been deleted yet"""
+    if segment.status == 'complete':
+        yield from records
+        return
+    while True:
+        chunk = list(islice(records, 200))
+        if not chunk:
+            return
+        live = {
+            str(value) for value in Transaction.objects.filter(
+                transaction_id__in=[record['transaction_id'] for record in chunk]
+            ).values_list('transaction_id', flat=True)
+        }
+        yield from (record for record in chunk if record['transaction_id'] not in live)
+
+
+class TransactionHistory:
+    """
+    A user's live transactions followed by their archived ones.
+
+    Quacks like a queryset for Django's Paginator (count() and slicing),
+    ordered by created_at. Archived rows are always older than the live
+    rows they are listed with, so a page is a live slice, an archived
+    slice, or the join of both; the archive is only read for pages that
+    reach past the live rows.
+    """
+    ordered = True
+
+    def __init__(self, queryset, user, filters=None, oldest_first=False):
+        self.queryset = queryset
+        self.user = user
+        self.filters = {key: value for key, value in (filters or {}).items() if value}
+        self.oldest_first = oldest_first
+        self.segments = list(_user_segments(user.id))
+        self._live_count = None
+        self._archived_count = None
+
+    def _matches(self, record):
+        return all(record[key] == value for key, value in self.filters.items())
+
+    def _archived(self):
+        streams = []
+        for segment in self.segments:
+            records = segment_reader(segment).user_records(self.user.id, oldest_first=self.oldest_first)
+            streams.append(_still_live(segment, (record for record in records if self._matches(record))))
+        return heapq.merge(
+            *streams, key=lambda record: datetime.fromisoformat(record['created_at']), reverse=not self.oldest_first
+        )
+
+    def live_count(self):
+        if self._live_count is None:
+            self._live_count = self.queryset.count()
+        return self._live_count
+
+    def archived_count(self):
+        if self._archived_count is None:
+            if self.filters or any(segment.status != 'complete' for segment in self.segments):
+                self._archived_count = sum(1 for _ in self._archived())
+            else:
+                # Straight from the sparse indexes, no block reads
+                self._archived_count = sum(segment_reader(segment).user_count(self.user.id) for segment in self.segments)
+        return self._archived_count
+
+    def count(self):
+        return self.live_count() + self.archived_count()
+
+    def __len__(self):
+        return self.count()
+
+    def _archived_slice(self, start, stop):
+        instances = [_to_instance(record) for record in islice(self._archived(), start, stop)]
+        for instance in instances:
+            instance.user = self.user
+        prefetch_related_objects(instances, 'card', 'recipient_user')
+        return instances
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop if key.stop is not None else self.count()
+        if self.oldest_first:
+            archived = self.archived_count()
+            items = self._archived_slice(start, min(stop, archived)) if start < archived else []
+            return items + list(self.queryset[max(start - archived, 0):max(stop - archived, 0)])
+
+        live = self.live_count()
+        items = list(self.queryset[start:min(stop, live)]) if start < live else []
+        if stop > live:
+            items += self._archived_slice(max(start - live, 0), stop - live)
+        return items
+
+
+def find_archived(transaction_id, user):
+    """An archived transaction of the user by transaction_id (one block read per segment holding it)"""
+    for segment in _user_segments(user.id):
+        try:
+            record = segment_reader(segment).find(transaction_id)
+        except ValueError:
+            return None  # not a UUID
+        if record is not None and record['user_id'] == user.id:
+            instance = _to_instance(record)
+            instance.user = user
+            return instance
+    return None
@@ -0,0 +1,207 @@
+# wallet/async_views.py
+from functools import wraps
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse
+from rest_framework import status
+
+from .authentication import aauthenticate_token, extract_token
+from .models import Transaction, Wallet
+from .serializers import WalletSerializer, TransactionSerializer
+from .services import (
+    TransferError, validate_transfer_data, prepare_transfer, complete_transfer, transfer_response,
+    dashboard_aggregates, dashboard_summary
+)
+from utils.providers import async_provider_client, provider_for
+from utils.wallet_process import TransactionProcessor, get_client_ip
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+TRANSACTION_ORDERING = ['created_at', '-created_at', 'amount', '-amount']
+
+
+def async_api_view(*methods):
+    """
+    Wrap a coroutine view with method checks and token authentication.
+
+    Mirrors the DRF defaults (JWT or Token auth, active users only) without
+    leaving the event loop; the view receives the user as request.user.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+
+            authorization = request.headers.get('Authorization', '').encode('latin-1')
+            user = await aauthenticate_token(extract_token([(b'authorization', authorization)]))
+            if user is None:
+                return JsonResponse(
+                    {'detail': 'Authentication credentials were not provided or are invalid.'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            request.user = user
+            return await view(request, *args, **kwargs)
+
+        # Token-authenticated API: no session cookie, so no CSRF check
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_api_view('GET')
+async def wallet_detail(request):
+    """Async wallet details"""
+    wallet, created = await Wallet.objects.aget_or_create(user=request.user)
+    wallet.user = request.user
+    return JsonResponse(WalletSerializer(wallet).data)
+
+
+@async_api_view('GET')
+async def dashboard(request):
+    """Async dashboard with summary statistics"""
+    user = request.user
+    wallet = await Wallet.objects.aget(user=user)
+
+    transactions = Transaction.objects.filter(user=user)
+    stats = await transactions.aaggregate(**dashboard_aggregates())
+
+    recent_transactions = [
+        txn async for txn in transactions.select_related(
+            'user', 'card', 'recipient_user'
+        ).order_by('-created_at')[:10]
+    ]
+
+    return JsonResponse({
+        'summary': dashboard_summary(wallet, stats),
+        'recent_transactions': TransactionSerializer(recent_transactions, many=True).data
+    })
+
+
+@async_api_view('GET')
+async def transaction_list(request):
+    """Async transaction history with the same filters and pagination as the viewset"""
+    queryset = Transaction.objects.filter(user=request.user)
+    for field in ('transaction_type', 'status'):
+        if request.GET.get(field):
+            queryset = queryset.filter(**{field: request.GET[field]})
+
+    ordering = request.GET.get('ordering', '-created_at')
+    if ordering not in TRANSACTION_ORDERING:
+        ordering = '-created_at'
+    queryset = queryset.order_by(ordering)
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    count = await queryset.acount()
+    offset = (page - 1) * PAGE_SIZE
+    if offset and offset >= count:
+        return JsonResponse({'detail': 'Invalid page.'}, status=status.HTTP_404_NOT_FOUND)
+
+    results = [
+        txn async for txn in queryset.select_related(
+            'user', 'card', 'recipient_user'
+        )[offset:offset + PAGE_SIZE]
+    ]
+
+    def page_url(number):
+        query = request.GET.copy()
+        query['page'] = number
+        return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return JsonResponse({
+        'count': count,
+        'next': page_url(page + 1) if offset + PAGE_SIZE < count else None,
+        'previous': page_url(page - 1) if page > 1 else None,
+        'results': TransactionSerializer(results, many=True).data
+    })
+
+
+def _prepare(user, data, ip_address, user_agent):
+    """
+    Validate and create the pending transaction in its own DB transaction.
+
+    Returns the transaction once it is claimed for its provider call,
+    like the sync path does before calling; otherwise the response.
+    """
+    try:
+        validated_data = validate_transfer_data(user, data)
+    except TransferError as e:
+        return None, (e.message, e.status_code)
+
+    wallet = Wallet.objects.filter(user=user).first()
+    if wallet is None or not wallet.is_active:
+        return None, ({'detail': 'You do not have permission to perform this action.'}, status.HTTP_403_FORBIDDEN)
+
+    try:
+        with transaction.atomic():
+            transaction_obj = prepare_transfer(user, validated_data, ip_address, user_agent)
+            if provider_for(transaction_obj.transaction_type) is None:
+                # Internal transfers need no provider round trip
+                success, message = complete_transfer(user, transaction_obj)
+                return None, transfer_response(user, transaction_obj, success, message)
+
+        # Committed: claim it for the provider call, unless the wallet cannot cover it
+        processor = TransactionProcessor(user, transaction_obj)
+        if processor.needs_provider_call():
+            if processor.claim():
+                return transaction_obj, None
+            return None, ({'error': f'Transaction is already {transaction_obj.status}'}, status.HTTP_409_CONFLICT)
+
+        # Fails for lack of balance without the provider moving any money
+        success, message = complete_transfer(user, transaction_obj)
+        return None, transfer_response(user, transaction_obj, success, message)
+    except TransferError as e:
+        return None, ({'error': e.message}, e.status_code)
+    except Exception as e:
+        logger.error("Transaction error for user %s: %s", user.username, e)
+        return None, ({'error': f'Transaction failed: {str(e)}'}, status.HTTP_400_BAD_REQUEST)
+
+
+def _complete(user, transaction_obj, provider_result):
+    """Apply the provider outcome to the pending transaction"""
+    try:
+        with transaction.atomic():
+            # Balance may have moved while the provider call was in flight
+            user.wallet.refresh_from_db()
+            success, message = complete_transfer(user, transaction_obj, provider_result=provider_result)
+            return transfer_response(user, transaction_obj, success, message)
+    except Exception as e:
+        logger.error("Transaction error for user %s: %s", user.username, e)
+        return {'error': f'Transaction failed: {str(e)}'}, status.HTTP_400_BAD_REQUEST
+
+
+@async_api_view('POST')
+async def transfer(request):
+    """
+    Async money transfer.
+
+    The pending transaction is committed and claimed first, the provider
+    is called without holding a DB transaction or a worker thread, and the
+    outcome is applied in a second short transaction.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    transaction_obj, response = await sync_to_async(_prepare)(
+        request.user, data, get_client_ip(request), request.META.get('HTTP_USER_AGENT', '')
+    )
+    if transaction_obj is not None:
+        provider_result = await async_provider_client.submit(transaction_obj)
+        response = await sync_to_async(_complete)(request.user, transaction_obj, provider_result)
+
+    payload, response_status = response
+    return JsonResponse(payload, status=response_status)
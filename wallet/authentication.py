@@ -0,0 +1,38 @@
+# wallet/authentication.py
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def extract_token(headers, query_string=b''):
+    """Token from an Authorization header (Bearer/Token) or a ?token= parameter"""
+    for name, value in headers:
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0] in ('Bearer', 'Token'):
+                return parts[1]
+
+    query = parse_qs(query_string.decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+async def aauthenticate_token(raw_token):
+    """Resolve a JWT access token or legacy DRF token to an active user, using the async ORM"""
+    if not raw_token:
+        return None
+
+    try:
+        access = AccessToken(raw_token)
+        user_id = access[settings.SIMPLE_JWT.get('USER_ID_CLAIM', 'user_id')]
+        return await User.objects.filter(pk=user_id, is_active=True).afirst()
+    except TokenError:
+        pass
+
+    token = await Token.objects.select_related('user').filter(key=raw_token).afirst()
+    if token and token.user.is_active:
+        return token.user
+    return None
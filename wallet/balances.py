@@ -0,0 +1,165 @@
+# wallet/balances.py
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import BalanceSnapshot, Transaction, Wallet
+
+logger = logging.getLogger(__name__)
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def day_bounds(day):
+    """[start, end) of a calendar day in the current time zone"""
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def _completed(start=None, end=None):
+    completed = Transaction.objects.filter(status='completed')
+    if start is not None:
+        completed = completed.filter(completed_at__gte=start)
+    if end is not None:
+        completed = completed.filter(completed_at__lt=end)
+    return completed
+
+
+def _own_net(rows):
+    """Sum incoming amounts and subtract outgoing amount + fee over grouped rows"""
+    return rows.annotate(
+        incoming=Sum('amount', filter=Q(transaction_type__in=Transaction.INCOMING_TYPES)),
+        outgoing=Sum(F('amount') + F('fee'), filter=Q(transaction_type__in=Transaction.OUTGOING_TYPES),
+                     output_field=MONEY),
+    )
+
+
+def _received(rows):
+    return rows.annotate(received=Sum(Coalesce('converted_amount', 'amount'), output_field=MONEY))
+
+
+def net_changes(user_ids, start=None, end=None):
+    """
+    Net balance change per user from transactions completed in [start, end).
+
+    Incoming types credit the amount, outgoing types debit amount + fee,
+    and a wallet_to_wallet also credits its recipient (converted amount
+    when the wallets differ in currency).
+    """
+    completed = _completed(start, end)
+    net = defaultdict(Decimal)
+    for row in _own_net(completed.filter(user_id__in=user_ids).values('user_id')):
+        net[row['user_id']] += (row['incoming'] or Decimal('0')) - (row['outgoing'] or Decimal('0'))
+
+    received = completed.filter(transaction_type='wallet_to_wallet', recipient_user_id__in=user_ids)
+    for row in _received(received.values('recipient_user_id')):
+        net[row['recipient_user_id']] += row['received']
+    return net
+
+
+def daily_net_changes(user_id, start, end):
+    """One user's net balance change per local calendar day from transactions completed in [start, end)"""
+    completed = _completed(start, end).annotate(
+        day=TruncDate('completed_at', tzinfo=timezone.get_current_timezone())
+    )
+    net = defaultdict(Decimal)
+    for row in _own_net(completed.filter(user_id=user_id).values('day')):
+        net[row['day']] += (row['incoming'] or Decimal('0')) - (row['outgoing'] or Decimal('0'))
+
+    received = completed.filter(transaction_type='wallet_to_wallet', recipient_user_id=user_id)
+    for row in _received(received.values('day')):
+        net[row['day']] += row['received']
+    return net
+
+
+def snapshot_day(day, chunk_size=None):
+    """
+    Write every wallet's closing balance for a closed day; returns the row count.
+
+    Wallets are read in id-ordered chunks. For each chunk the live balances
+    and the net change of everything completed since the day ended are
+    read in one DB transaction, and the difference is upserted in bulk,
+    so reruns and backfills overwrite rather than duplicate.
+    """
+    chunk_size = chunk_size or getattr(settings, 'BALANCE_SNAPSHOT_CHUNK_SIZE', 1000)
+    _, end = day_bounds(day)
+    if end > timezone.now():
+        raise ValueError(f"{day} has not closed yet")
+
+    written, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            wallets = list(
+                Wallet.objects.filter(id__gt=last_id, created_at__lt=end).order_by('id').values(
+                    'id', 'user_id', 'balance', 'currency'
+                )[:chunk_size]
+            )
+            if not wallets:
+                break
+            since_close = net_changes([wallet['user_id'] for wallet in wallets], start=end)
+            BalanceSnapshot.objects.bulk_create(
+                [
+                    BalanceSnapshot(
+                        wallet_id=wallet['id'], date=day, currency=wallet['currency'],
+                        balance=wallet['balance'] - since_close.get(wallet['user_id'], Decimal('0'))
+                    )
+                    for wallet in wallets
+                ],
+                update_conflicts=True, unique_fields=['wallet', 'date'], update_fields=['balance', 'currency']
+            )
+        written += len(wallets)
+        last_id = wallets[-1]['id']
+
+    logger.info("Snapshotted %s wallet balances for %s", written, day)
+    return written
+
+
+def balance_as_of(wallet, moment):
+    """
+    Balance just before `moment`.
+
+    Starts from the nearest earlier closing snapshot and replays only the
+    transactions completed since; without one, works back from the live
+    balance instead.
+    """
+    snapshot = wallet.balance_snapshots.filter(date__lt=timezone.localdate(moment)).order_by('-date').first()
+    if snapshot is not None:
+        _, closed = day_bounds(snapshot.date)
+        return snapshot.balance + net_changes([wallet.user_id], start=closed, end=moment)[wallet.user_id]
+    if moment >= timezone.now():
+        return wallet.balance
+    return wallet.balance - net_changes([wallet.user_id], start=moment)[wallet.user_id]
+
+
+def balance_history(wallet, start_date, end_date):
+    """
+    Closing balance for each day in [start_date, end_date].
+
+    Days with a snapshot use it. The rest roll forward from the balance
+    before the first day with one grouped query of daily net changes, so
+    the query count does not grow with the range.
+    """
+    snapshots = dict(
+        wallet.balance_snapshots.filter(date__range=(start_date, end_date)).values_list('date', 'balance')
+    )
+    first_day = max(start_date, timezone.localdate(wallet.created_at))
+    days = [first_day + timedelta(days=offset) for offset in range((end_date - first_day).days + 1)]
+    if all(day in snapshots for day in days):
+        return [(day, snapshots[day]) for day in days]
+
+    start = day_bounds(first_day)[0]
+    balance = balance_as_of(wallet, start)
+    daily = daily_net_changes(wallet.user_id, start, min(day_bounds(end_date)[1], timezone.now()))
+    series = []
+    for day in days:
+        # Today, or a day the nightly job has not covered, comes from the running balance
+        balance = snapshots.get(day, balance + daily.get(day, Decimal('0')))
+        series.append((day, balance))
+    return series
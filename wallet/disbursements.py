@@ -0,0 +1,291 @@
+# wallet/disbursements.py
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+import logging
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import DisbursementJob, DisbursementLeg, Transaction, UserProfile
+from .services import complete_transfer
+from utils.money import Money
+from utils.wallet_process import FeeCalculator, TransactionValidator
+
+logger = logging.getLogger(__name__)
+
+PHONE_PATTERN = re.compile(r'^\+?1?\d{9,15}$')
+RESULT_COLUMNS = ['row', 'recipient', 'amount', 'fee', 'status', 'message', 'transaction_id']
+
+
+def _chunk_size():
+    return getattr(settings, 'DISBURSEMENT_CHUNK_SIZE', 500)
+
+
+def _read_rows(job):
+    """Stream (row_number, recipient, amount_text, description) from the uploaded CSV"""
+    with job.source_file.open('rb') as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [name.strip().lower() for name in header]
+        if 'recipient' not in columns or 'amount' not in columns:
+            raise ValidationError("CSV header must include 'recipient' and 'amount' columns")
+        recipient_col, amount_col = columns.index('recipient'), columns.index('amount')
+        description_col = columns.index('description') if 'description' in columns else None
+
+        def cell(row, index):
+            return row[index].strip() if index is not None and index < len(row) else ''
+
+        for row_number, row in enumerate(reader, start=1):
+            if not any(value.strip() for value in row):
+                continue
+            yield row_number, cell(row, recipient_col), cell(row, amount_col), cell(row, description_col)
+
+
+def _resolve_recipients(identifiers):
+    """Map usernames and phone numbers to user ids with two IN queries"""
+    phones = [value for value in identifiers if PHONE_PATTERN.match(value)]
+    resolved = dict(
+        User.objects.filter(username__in=identifiers, is_active=True).values_list('username', 'id')
+    )
+    if phones:
+        for phone, user_id in UserProfile.objects.filter(
+            phone_number__in=phones, user__is_active=True
+        ).values_list('phone_number', 'user_id'):
+            resolved.setdefault(phone, user_id)
+    return resolved
+
+
+def _build_legs(job, rows):
+    """Validate one chunk of rows into DisbursementLeg objects"""
+    wallet = job.user.wallet
+    resolved = _resolve_recipients({recipient for _, recipient, _, _ in rows if recipient})
+    legs = []
+
+    for row_number, recipient, amount_text, description in rows:
+        leg = DisbursementLeg(
+            job=job, row_number=row_number, recipient=recipient[:150], description=description[:255]
+        )
+        legs.append(leg)
+        try:
+            amount = Decimal(amount_text)
+            if not amount.is_finite() or amount != amount.quantize(Decimal('0.01')):
+                raise InvalidOperation
+        except InvalidOperation:
+            leg.status, leg.message = 'invalid', f'Invalid amount: {amount_text!r}'
+            continue
+
+        leg.amount = amount
+        try:
+            TransactionValidator.validate_minimum_amount(amount)
+            TransactionValidator.validate_maximum_amount(amount)
+        except ValidationError as e:
+            leg.status, leg.message = 'invalid', e.messages[0]
+            continue
+
+        leg.recipient_user_id = resolved.get(recipient)
+        if leg.recipient_user_id is None:
+            leg.status, leg.message = 'invalid', 'Recipient not found'
+        elif leg.recipient_user_id == job.user_id:
+            leg.status, leg.message = 'invalid', 'Cannot pay yourself'
+
+    # Price every valid leg of the chunk in one vectorised call
+    valid = [leg for leg in legs if leg.status == 'pending']
+    if valid:
+        fees = FeeCalculator.calculate_fees(
+            ['wallet_to_wallet'] * len(valid), [leg.amount for leg in valid], wallet.currency, wallet.fee_plan
+        )
+        for leg, fee in zip(valid, fees):
+            leg.fee = fee
+    return legs
+
+
+def parse_job(job):
+    """Stream the CSV into legs, committing one chunk at a time"""
+    max_rows = getattr(settings, 'DISBURSEMENT_MAX_ROWS', 200000)
+    chunk_size = _chunk_size()
+    chunk = []
+
+    def flush():
+        legs = _build_legs(job, chunk)
+        valid = [leg for leg in legs if leg.status == 'pending']
+        with transaction.atomic():
+            DisbursementLeg.objects.bulk_create(legs, batch_size=chunk_size)
+            DisbursementJob.objects.filter(id=job.id).update(
+                total_rows=F('total_rows') + len(legs),
+                valid_legs=F('valid_legs') + len(valid),
+                invalid_legs=F('invalid_legs') + len(legs) - len(valid),
+                total_amount=F('total_amount') + sum((leg.amount for leg in valid), Decimal('0.00')),
+                total_fee=F('total_fee') + sum((leg.fee for leg in valid), Decimal('0.00')),
+                lease_expires_at=_lease_deadline()
+            )
+        chunk.clear()
+
+    for count, row in enumerate(_read_rows(job), start=1):
+        if count > max_rows:
+            raise ValidationError(f"File has more than {max_rows} rows")
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    job.refresh_from_db()
+
+
+def execute_job(job):
+    """Run pending legs in chunks, each chunk in its own DB transaction"""
+    user = job.user
+    chunk_size = _chunk_size()
+    last_row = 0
+
+    while True:
+        status = DisbursementJob.objects.values_list('status', flat=True).get(id=job.id)
+        if status == 'cancelled':
+            return
+
+        legs = list(
+            job.legs.filter(status='pending', row_number__gt=last_row)
+            .select_related('recipient_user')
+            .order_by('row_number')[:chunk_size]
+        )
+        if not legs:
+            return
+        last_row = legs[-1].row_number
+        _execute_chunk(job, user, legs)
+
+
+def _execute_chunk(job, user, legs):
+    succeeded = failed = 0
+    with transaction.atomic():
+        user.wallet.refresh_from_db()
+        daily_remaining, monthly_remaining = TransactionValidator.get_remaining_limits(user)
+        currency = user.wallet.currency
+
+        for leg in legs:
+            amount = Money.from_decimal(leg.amount, currency)
+            if amount > daily_remaining or amount > monthly_remaining:
+                leg.status = 'failed'
+                leg.message = 'Exceeds daily or monthly limit'
+                failed += 1
+                continue
+
+            transaction_obj = Transaction.objects.create(
+                user=user,
+                transaction_type='wallet_to_wallet',
+                amount=leg.amount,
+                fee=leg.fee,
+                recipient_user=leg.recipient_user,
+                description=leg.description or f'Disbursement {job.job_id} row {leg.row_number}',
+                user_agent='disbursement'
+            )
+            success, message = complete_transfer(user, transaction_obj)
+            leg.transaction = transaction_obj
+            leg.status = 'completed' if success else 'failed'
+            leg.message = message
+            if success:
+                succeeded += 1
+                daily_remaining -= amount
+                monthly_remaining -= amount
+            else:
+                failed += 1
+
+        DisbursementLeg.objects.bulk_update(legs, ['status', 'message', 'transaction'])
+        DisbursementJob.objects.filter(id=job.id).update(
+            processed_legs=F('processed_legs') + len(legs),
+            succeeded_legs=F('succeeded_legs') + succeeded,
+            failed_legs=F('failed_legs') + failed,
+            lease_expires_at=_lease_deadline()
+        )
+
+
+def _lease_deadline():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'DISBURSEMENT_LEASE_SECONDS', 300))
+
+
+def claim_next_job(owner):
+    """Take the oldest queued job, or one whose worker stopped renewing its lease"""
+    now = timezone.now()
+    candidates = DisbursementJob.objects.filter(
+        Q(status='queued') | Q(status__in=['parsing', 'running'], lease_expires_at__lt=now)
+    ).order_by('created_at').values_list('id', 'status')[:10]
+
+    for job_id, status in candidates:
+        claimed = DisbursementJob.objects.filter(id=job_id, status=status).filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+        ).update(lease_owner=owner, lease_expires_at=_lease_deadline())
+        if claimed:
+            return DisbursementJob.objects.select_related('user__wallet').get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Parse (if not done yet) and execute a claimed job"""
+    try:
+        if job.status in ['queued', 'parsing']:
+            if job.status == 'parsing':
+                # A previous worker died mid-parse; start the file over
+                job.legs.all().delete()
+                DisbursementJob.objects.filter(id=job.id).update(
+                    total_rows=0, valid_legs=0, invalid_legs=0,
+                    total_amount=Decimal('0.00'), total_fee=Decimal('0.00')
+                )
+            DisbursementJob.objects.filter(id=job.id).update(status='parsing', started_at=timezone.now())
+            parse_job(job)
+
+            required = job.total_amount + job.total_fee
+            if job.user.wallet.balance < required:
+                raise ValidationError(
+                    f"Insufficient wallet balance: job needs {job.user.wallet.currency} {required}"
+                )
+            DisbursementJob.objects.filter(id=job.id, status='parsing').update(status='running')
+
+        execute_job(job)
+        DisbursementJob.objects.filter(id=job.id, status='running').update(
+            status='completed', finished_at=timezone.now(), lease_owner='', lease_expires_at=None
+        )
+    except ValidationError as e:
+        _fail(job, '; '.join(e.messages))
+    except Exception as e:
+        logger.error("Disbursement job %s failed: %s", job.job_id, e)
+        _fail(job, str(e))
+
+    job.refresh_from_db()
+    logger.info(
+        "Disbursement job %s %s: %s paid, %s failed, %s invalid",
+        job.job_id, job.status, job.succeeded_legs, job.failed_legs, job.invalid_legs
+    )
+    return job
+
+
+def _fail(job, error):
+    DisbursementJob.objects.filter(id=job.id).exclude(status='cancelled').update(
+        status='failed', error=error[:2000], finished_at=timezone.now(), lease_owner='', lease_expires_at=None
+    )
+
+
+def result_rows(job):
+    """CSV lines (header first) of per-leg results, streamed from the DB"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    yield line(RESULT_COLUMNS)
+    legs = job.legs.order_by('row_number').values_list(
+        'row_number', 'recipient', 'amount', 'fee', 'status', 'message', 'transaction__transaction_id'
+    )
+    for row in legs.iterator(chunk_size=2000):
+        yield line(['' if value is None else value for value in row])
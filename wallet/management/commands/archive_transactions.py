@@ -0,0 +1,28 @@
+# wallet/management/commands/archive_transactions.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    help = 'Move finished transactions and their logs older than N months into compressed segment files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=getattr(settings, 'TRANSACTION_ARCHIVE_AFTER_MONTHS', 12),
+                            help='Archive whole months older than this many months')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        segments = archive_transactions(options['months'])
+        for segment in segments:
+            self.stdout.write(
+                f"{segment.period:%Y-%m}: {segment.transaction_count} transactions, "
+                f"{segment.log_count} logs -> {segment.path}.seg"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sum(segment.transaction_count for segment in segments)} transactions "
+            f"in {len(segments)} segments in {time.perf_counter() - started:.2f}s"
+        ))
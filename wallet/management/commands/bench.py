@@ -0,0 +1,366 @@
+# wallet/management/commands/bench.py
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from fnmatch import fnmatch
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+
+import django
+import httpx
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from wallet.models import Card, Transaction, Wallet
+from .bench_asgi import percentile
+
+MODES = ['threads', 'processes', 'asyncio']
+FUNDED = Decimal('9999999.00')
+
+
+def render(template, values):
+    """Fill {placeholders}; a value that is exactly one placeholder keeps the value's type"""
+    if isinstance(template, dict):
+        return {key: render(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [render(value, values) for value in template]
+    if isinstance(template, str):
+        if template.startswith('{') and template.endswith('}') and template[1:-1] in values:
+            return values[template[1:-1]]
+        return template.format(**values)
+    return template
+
+
+def build_requests(scenario, actors, run_id, count, rng):
+    """The requests of one scenario, each from the next actor in turn"""
+    path = reverse(scenario['url'], kwargs=scenario.get('kwargs'))
+    requests = []
+    for n in range(count):
+        actor = actors[n % len(actors)]
+        values = {
+            'run': run_id,
+            'n': n,
+            'username': actor['username'],
+            'password': actor['password'],
+            'card_id': actor['card_id'],
+            'recipient': actors[(n + 1) % len(actors)]['username'],
+            'mobile': f"01{rng.choice('3456789')}{rng.randrange(10 ** 8):08d}",
+        }
+        requests.append({
+            'method': scenario.get('method', 'GET'),
+            'path': path,
+            'params': render(scenario.get('params'), values),
+            'json': render(scenario.get('body'), values),
+            'headers': {'Authorization': f"Token {actor['token']}"} if scenario.get('auth', True) else {},
+        })
+    return requests
+
+
+def _client(base_url):
+    if base_url:
+        return httpx.Client(base_url=base_url, timeout=60)
+    from django.core.wsgi import get_wsgi_application
+    return httpx.Client(transport=httpx.WSGITransport(app=get_wsgi_application()), base_url='http://localhost')
+
+
+def _send(client, request):
+    """(latency in seconds, status code); 0 when the request never got a response"""
+    started = time.perf_counter()
+    try:
+        status = client.request(
+            request['method'], request['path'], params=request['params'], json=request['json'],
+            headers=request['headers']
+        ).status_code
+    except httpx.HTTPError:
+        status = 0
+    return time.perf_counter() - started, status
+
+
+_worker_client = None
+
+
+def init_worker(base_url):
+    """Pool initializer: set Django up, drop inherited connections and open this worker's client"""
+    global _worker_client
+    django.setup()
+    from django.db import connections
+    for worker_connection in connections.all():
+        worker_connection.close()
+    _worker_client = _client(base_url)
+
+
+def run_slice(requests):
+    """One worker process's share of a phase, sent back to back"""
+    return [_send(_worker_client, request) for request in requests]
+
+
+def summarize(samples, elapsed, queries):
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status in samples if not 0 < status < 400),
+        'status_codes': dict(sorted(Counter(str(status) for _, status in samples).items())),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0,
+        },
+        'queries': {'median': statistics.median(queries), 'max': max(queries)} if queries else None,
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(
+            ['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = 'Load-test the API routes from a scenario file and write machine-readable results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'api.json'),
+                            help='Scenario file (JSON)')
+        parser.add_argument('--only', default='',
+                            help='Comma-separated scenario names or patterns, e.g. "dashboard,transfer:*"')
+        parser.add_argument('--mode', choices=MODES, default='threads',
+                            help='Drive the load from a thread pool, a process pool or asyncio coroutines')
+        parser.add_argument('--concurrency', type=int, help='Requests in flight at once (scenario default)')
+        parser.add_argument('--requests', type=int, help='Requests per scenario (scenario default)')
+        parser.add_argument('--actors', type=int, help='Seeded users the requests are spread over')
+        parser.add_argument('--url', default='',
+                            help='Base URL of a running deployment; in-process (WSGI, or ASGI for asyncio) if omitted')
+        parser.add_argument('--skip-seed', action='store_true',
+                            help="Do not seed the database when the scenario's users are missing")
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the generated request data')
+        parser.add_argument('--calibrate', type=int, default=3,
+                            help='Requests per scenario run in-process first to count DB queries (also warms up)')
+        parser.add_argument('--output', help='Results file (default: benchmarks/results/<time>-<commit>-<mode>.json)')
+        parser.add_argument('--compare', help='Earlier results file to compare against')
+        parser.add_argument('--max-regression', type=float,
+                            help='With --compare, fail when a p95 grows by more than this fraction '
+                                 'or a query count grows at all')
+
+    def handle(self, *args, **options):
+        logging.getLogger('httpx').setLevel(logging.WARNING)  # one INFO line per request otherwise
+        path = Path(options['scenario'])
+        try:
+            plan = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read scenario file {path}: {e}")
+
+        scenarios = plan['scenarios']
+        if options['only']:
+            patterns = [pattern.strip() for pattern in options['only'].split(',') if pattern.strip()]
+            scenarios = [s for s in scenarios if any(fnmatch(s['name'], pattern) for pattern in patterns)]
+            if not scenarios:
+                raise CommandError(f"No scenario matches {options['only']}")
+
+        concurrency = options['concurrency'] or plan.get('concurrency', 8)
+        seed = plan.get('seed', {})
+        prefix = seed.get('prefix', 'load_')
+        if seed and not options['skip_seed'] and not User.objects.filter(username__startswith=prefix).exists():
+            self.stdout.write(f"Seeding the database ({seed.get('users')} users)...")
+            call_command('seed_load_data', stdout=self.stdout, **seed)
+
+        rng = random.Random(options['seed'])
+        random.seed(options['seed'])  # provider outcomes, for in-process runs
+        actors = self._prepare_actors(prefix, options['actors'] or plan.get('actors', 32), plan['password'], rng)
+        run_id = uuid.uuid4().hex[:8]
+
+        self.stdout.write(
+            f"{len(scenarios)} scenarios, mode {options['mode']}, concurrency {concurrency}, "
+            f"{len(actors)} actors, target {options['url'] or 'in-process'}"
+        )
+        self.stdout.write(
+            f"{'scenario':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}"
+        )
+
+        pool = None
+        if options['mode'] == 'processes':
+            pool = ProcessPoolExecutor(max_workers=concurrency, initializer=init_worker, initargs=(options['url'],))
+            list(pool.map(run_slice, [[]] * concurrency))  # start the workers before the clock does
+        endpoints = {}
+        try:
+            for scenario in scenarios:
+                count = scenario.get('requests', options['requests'] or plan.get('requests', 300))
+                requests = build_requests(scenario, actors, run_id, options['calibrate'] + count, rng)
+                queries = self._count_queries(requests[:options['calibrate']])
+                samples, elapsed = self._run(
+                    options['mode'], options['url'], requests[options['calibrate']:], concurrency, pool
+                )
+                endpoints[scenario['name']] = result = summarize(samples, elapsed, queries)
+                self._report(scenario['name'], result)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        results = {
+            'commit': _git('rev-parse', 'HEAD'),
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'created_at': timezone.now().isoformat(),
+            'scenario_file': str(path),
+            'mode': options['mode'],
+            'concurrency': concurrency,
+            'target': options['url'] or 'in-process',
+            'seed': options['seed'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cpus': os.cpu_count(),
+            },
+            'dataset': {'users': User.objects.count(), 'transactions': Transaction.objects.count()},
+            'endpoints': endpoints,
+        }
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' / 'results' / (
+            f"{timezone.now():%Y%m%dT%H%M%S}-{results['commit'][:10] or 'nogit'}-{options['mode']}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(f"Results written to {output}")
+
+        if options['compare']:
+            self._compare(json.loads(Path(options['compare']).read_text()), results, options['max_regression'])
+
+    def _prepare_actors(self, prefix, count, password, rng):
+        """The first seeded users: loginable, funded, with an API token and an active card each"""
+        users = list(User.objects.filter(username__startswith=prefix).order_by('id')[:count])
+        if len(users) < 2:
+            raise CommandError(f"Need at least 2 users named {prefix}*; run seed_load_data or drop --skip-seed")
+        ids = [user.id for user in users]
+        User.objects.filter(id__in=ids).update(password=make_password(password), is_active=True)
+        Wallet.objects.filter(user_id__in=ids).update(
+            balance=FUNDED, daily_limit=FUNDED, monthly_limit=FUNDED, is_active=True
+        )
+
+        this_year = timezone.localdate().year
+        cards = {}
+        for user_id, card_id in Card.objects.filter(
+            user_id__in=ids, is_active=True, expiry_year__gt=this_year
+        ).order_by('-id').values_list('user_id', 'id'):
+            cards[user_id] = card_id
+        actors = []
+        for user in users:
+            if user.id not in cards:
+                cards[user.id] = Card.objects.create(
+                    user=user, card_number=f'4{rng.randrange(10 ** 15):015d}', card_type='visa',
+                    card_holder_name=user.username.upper(), expiry_month=12, expiry_year=this_year + 3, cvv='123'
+                ).id
+            actors.append({
+                'username': user.username,
+                'password': password,
+                'token': Token.objects.get_or_create(user=user)[0].key,
+                'card_id': cards[user.id],
+            })
+        return actors
+
+    def _count_queries(self, requests):
+        """DB queries per request, counted in-process whatever the load target is"""
+        counts = []
+        with _client('') as client:
+            for request in requests:
+                with CaptureQueriesContext(connection) as captured:
+                    _send(client, request)
+                counts.append(len(captured.captured_queries))
+        return counts
+
+    def _run(self, mode, base_url, requests, concurrency, pool):
+        """Send one scenario's requests; returns ([(latency, status)], elapsed seconds)"""
+        if mode == 'asyncio':
+            return asyncio.run(self._run_asyncio(base_url, requests, concurrency))
+
+        started = time.perf_counter()
+        if mode == 'processes':
+            slices = [requests[i::concurrency] for i in range(concurrency)]
+            samples = [sample for part in pool.map(run_slice, slices) for sample in part]
+        else:
+            with _client(base_url) as client:
+                with ThreadPoolExecutor(max_workers=concurrency) as threads:
+                    samples = list(threads.map(lambda request: _send(client, request), requests))
+        return samples, time.perf_counter() - started
+
+    async def _run_asyncio(self, base_url, requests, concurrency):
+        """Coroutines bounded by a semaphore, against the ASGI application"""
+        if base_url:
+            client = httpx.AsyncClient(base_url=base_url, timeout=60)
+        else:
+            from daffodilPay.asgi import application
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url='http://localhost')
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(request):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = (await client.request(
+                        request['method'], request['path'], params=request['params'], json=request['json'],
+                        headers=request['headers']
+                    )).status_code
+                except httpx.HTTPError:
+                    status = 0
+                return time.perf_counter() - started, status
+
+        async with client:
+            started = time.perf_counter()
+            samples = await asyncio.gather(*(call(request) for request in requests))
+            return samples, time.perf_counter() - started
+
+    def _report(self, name, result):
+        latency = result['latency_ms']
+        queries = result['queries']['median'] if result['queries'] else '-'
+        self.stdout.write(
+            f"{name:<26} {result['throughput_rps']:>8.1f} {latency['p50']:>8.2f} {latency['p95']:>8.2f} "
+            f"{latency['p99']:>8.2f} {queries:>8} {result['errors']:>7}"
+        )
+
+    def _compare(self, baseline, results, max_regression):
+        """Print p95, throughput and query deltas against a baseline; fail on regressions if asked"""
+        self.stdout.write(f"Against {baseline.get('commit', '')[:10] or 'baseline'}:")
+        self.stdout.write(f"{'scenario':<26} {'p95 ms':>17} {'req/s':>17} {'queries':>11}")
+        regressions = []
+        for name, current in results['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if before is None:
+                continue
+            p95, p95_before = current['latency_ms']['p95'], before['latency_ms']['p95']
+            change = (p95 - p95_before) / p95_before if p95_before else 0.0
+            queries = (current['queries'] or {}).get('median')
+            queries_before = (before['queries'] or {}).get('median')
+            self.stdout.write(
+                f"{name:<26} {p95_before:>7.2f} -> {p95:<7.2f} "
+                f"{before['throughput_rps']:>7.1f} -> {current['throughput_rps']:<7.1f} "
+                f"{queries_before if queries_before is not None else '-':>3} -> {queries if queries is not None else '-'}"
+            )
+            if max_regression is None:
+                continue
+            if change > max_regression:
+                regressions.append(f"{name}: p95 {p95_before:.2f} -> {p95:.2f} ms (+{change:.0%})")
+            if queries is not None and queries_before is not None and queries > queries_before:
+                regressions.append(f"{name}: queries {queries_before} -> {queries}")
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
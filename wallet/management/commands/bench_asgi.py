@@ -0,0 +1,142 @@
+# wallet/management/commands/bench_asgi.py
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import asyncio
+import time
+
+import httpx
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from wallet.models import Wallet
+
+# endpoint name -> (sync path, async path, method, body)
+ENDPOINTS = {
+    'wallet': ('/api/v1/wallet/', '/api/v1/async/wallet/', 'GET', None),
+    'dashboard': ('/api/v1/dashboard/', '/api/v1/async/dashboard/', 'GET', None),
+    'transactions': ('/api/v1/transactions/', '/api/v1/async/transactions/', 'GET', None),
+    'transfer': ('/api/v1/transfer/', '/api/v1/async/transfer/', 'POST', {
+        'transaction_type': 'wallet_to_bkash',
+        'amount': '10.00',
+        'mobile_number': '01712345678',
+        'description': 'bench_asgi',
+    }),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/sec and latency of the sync (WSGI) and async (ASGI) endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and deployment')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--endpoints', default='wallet,dashboard,transactions',
+                            help=f'Comma-separated subset of: {", ".join(ENDPOINTS)}')
+        parser.add_argument('--wsgi-url', default='',
+                            help='Base URL of a running WSGI deployment (e.g. gunicorn); in-process if omitted')
+        parser.add_argument('--asgi-url', default='',
+                            help='Base URL of a running ASGI deployment (e.g. uvicorn); in-process if omitted')
+        parser.add_argument('--username', default='bench_asgi', help='User the benchmark authenticates as')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(names) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        headers = {'Authorization': f'Token {self._prepare_user(options["username"])}'}
+        total, concurrency = options['requests'], options['concurrency']
+
+        self.stdout.write(f"{total} requests per endpoint, concurrency {concurrency}")
+        self.stdout.write(f"{'deployment':<10} {'endpoint':<14} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+        for name in names:
+            sync_path, async_path, method, body = ENDPOINTS[name]
+            wsgi = self._run_wsgi(options['wsgi_url'], sync_path, method, body, headers, total, concurrency)
+            asgi = asyncio.run(
+                self._run_asgi(options['asgi_url'], async_path, method, body, headers, total, concurrency)
+            )
+            for deployment, result in (('wsgi', wsgi), ('asgi', asgi)):
+                self._report(deployment, name, result)
+
+    def _prepare_user(self, username):
+        """Create the benchmark user with a funded wallet and return its API token"""
+        user, created = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+        if created:
+            user.set_unusable_password()
+            user.save()
+        Wallet.objects.update_or_create(user=user, defaults={
+            'balance': Decimal('9999999.00'),
+            'daily_limit': Decimal('9999999.00'),
+            'monthly_limit': Decimal('9999999.00'),
+            'is_active': True,
+        })
+        token, _ = Token.objects.get_or_create(user=user)
+        return token.key
+
+    def _run_wsgi(self, base_url, path, method, body, headers, total, concurrency):
+        """Thread pool against the sync views: one blocked thread per request in flight"""
+        if base_url:
+            client = httpx.Client(base_url=base_url, headers=headers)
+        else:
+            from django.core.wsgi import get_wsgi_application
+            client = httpx.Client(
+                transport=httpx.WSGITransport(app=get_wsgi_application()),
+                base_url='http://localhost',
+                headers=headers
+            )
+
+        def call(_):
+            started = time.perf_counter()
+            response = client.request(method, path, json=body)
+            return time.perf_counter() - started, response.status_code < 400
+
+        with client:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(call, range(total)))
+            elapsed = time.perf_counter() - started
+        return samples, elapsed
+
+    async def _run_asgi(self, base_url, path, method, body, headers, total, concurrency):
+        """Coroutines against the async views, bounded by a semaphore"""
+        if base_url:
+            client = httpx.AsyncClient(base_url=base_url, headers=headers)
+        else:
+            from daffodilPay.asgi import application
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=application),
+                base_url='http://localhost',
+                headers=headers
+            )
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                return time.perf_counter() - started, response.status_code < 400
+
+        async with client:
+            started = time.perf_counter()
+            samples = await asyncio.gather(*(call() for _ in range(total)))
+            elapsed = time.perf_counter() - started
+        return samples, elapsed
+
+    def _report(self, deployment, name, result):
+        samples, elapsed = result
+        latencies = sorted(latency for latency, ok in samples)
+        errors = sum(1 for latency, ok in samples if not ok)
+        self.stdout.write(
+            f"{deployment:<10} {name:<14} {len(samples) / elapsed:>9.1f} "
+            f"{percentile(latencies, 0.50) * 1000:>9.2f} {percentile(latencies, 0.99) * 1000:>9.2f} {errors:>7}"
+        )
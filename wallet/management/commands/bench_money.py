@@ -0,0 +1,146 @@
+# wallet/management/commands/bench_money.py
+from decimal import Decimal
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from wallet.models import Transaction
+from utils.money import Money
+from utils.wallet_process import FeeCalculator, TransactionValidator
+
+
+def legacy_fee(transaction_type, amount):
+    """Previous Decimal-based FeeCalculator.calculate_fee, kept for comparison"""
+    rate = FeeCalculator.FEE_STRUCTURE.get(transaction_type)
+    if rate is None:
+        return Decimal('0.00')
+    calculated_fee = amount * rate
+    if calculated_fee < FeeCalculator.MIN_FEE:
+        return FeeCalculator.MIN_FEE
+    elif calculated_fee > FeeCalculator.MAX_FEE:
+        return FeeCalculator.MAX_FEE
+    return calculated_fee.quantize(Decimal('0.01'))
+
+
+def legacy_limit_checks(user, amount):
+    """Previous daily and monthly checks: one aggregate query each"""
+    wallet = user.wallet
+    daily_total = Transaction.objects.filter(
+        user=user, status='completed', created_at__date=timezone.now().date()
+    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    monthly_total = Transaction.objects.filter(
+        user=user, status='completed', created_at__gte=current_month
+    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    return daily_total + amount <= wallet.daily_limit and monthly_total + amount <= wallet.monthly_limit
+
+
+class Command(BaseCommand):
+    help = 'Benchmark Decimal/float money handling against integer minor-unit Money'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--legs', type=int, default=100000, help='Number of amounts for the fee benchmarks')
+        parser.add_argument('--transfers', type=int, default=2000, help='Iterations of the transfer critical path')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        types = list(FeeCalculator.FEE_STRUCTURE)
+        legs = [
+            (rng.choice(types), Decimal(rng.randint(1, 1000000)).scaleb(-2))
+            for _ in range(options['legs'])
+        ]
+
+        # Warm the compiled schedule so the first timed call is not a DB hit
+        FeeCalculator.get_schedule()
+
+        results = []
+        with transaction.atomic():
+            results.extend(self._bench_transfer_path(legs[:options['transfers']]))
+            transaction.set_rollback(True)
+        results.extend(self._bench_fees(legs))
+
+        for label, seconds, count in results:
+            self.stdout.write(f'{label:<40} {seconds * 1000:10.1f} ms  {count / seconds:12,.0f} ops/s')
+
+        # Fees must agree exactly with the old implementation
+        leg_types = [transaction_type for transaction_type, _ in legs]
+        fees_minor = FeeCalculator.calculate_fees_minor(leg_types, [Money.from_decimal(a).minor for _, a in legs])
+        mismatches = sum(
+            1 for (transaction_type, amount), fee_minor in zip(legs, fees_minor)
+            if legacy_fee(transaction_type, amount) != Money(int(fee_minor)).to_decimal()
+        )
+
+        # Rounding drift when summing the amounts
+        exact_total = sum(amount for _, amount in legs)
+        float_total = sum(float(amount) for _, amount in legs)
+        money_total = Money.zero()
+        for _, amount in legs:
+            money_total += Money.from_decimal(amount)
+
+        self.stdout.write(f'fee mismatches vs Decimal: {mismatches}')
+        self.stdout.write(f'float sum drift: {Decimal(repr(float_total)) - exact_total}')
+        self.stdout.write(f'Money sum drift: {money_total.to_decimal() - exact_total}')
+
+    def _bench_transfer_path(self, legs):
+        """Limit checks, fee and response rendering against a throwaway user"""
+        user = User.objects.create_user(username=f'bench-money-{time.time_ns()}')
+        user.wallet.daily_limit = Decimal('99999999.99')
+        user.wallet.monthly_limit = Decimal('99999999.99')
+        balance = user.wallet.balance
+
+        def legacy():
+            for transaction_type, amount in legs:
+                legacy_limit_checks(user, amount)
+                fee = legacy_fee(transaction_type, amount)
+                (float(amount), float(fee), float(amount + fee), float(balance))
+
+        def money():
+            wallet = user.wallet
+            for transaction_type, amount in legs:
+                TransactionValidator.validate_limits(user, amount)
+                amount = Money.from_decimal(amount, wallet.currency)
+                fee = FeeCalculator.calculate_fee_money(transaction_type, amount, wallet.fee_plan)
+                (str(amount), str(fee), str(amount + fee), str(Money.from_decimal(balance, wallet.currency)))
+
+        return [
+            ('transfer path (Decimal + float)', self._time(legacy), len(legs)),
+            ('transfer path (Money)', self._time(money), len(legs)),
+        ]
+
+    def _bench_fees(self, legs):
+        leg_types = [transaction_type for transaction_type, _ in legs]
+        leg_minor = [Money.from_decimal(amount).minor for _, amount in legs]
+        leg_money = [Money(minor) for minor in leg_minor]
+
+        def legacy_single():
+            for transaction_type, amount in legs:
+                legacy_fee(transaction_type, amount)
+
+        def money_single():
+            for transaction_type, amount in zip(leg_types, leg_money):
+                FeeCalculator.calculate_fee_money(transaction_type, amount)
+
+        def money_bulk():
+            FeeCalculator.calculate_fees_minor(leg_types, leg_minor)
+
+        return [
+            ('single-leg fees (Decimal)', self._time(legacy_single), len(legs)),
+            ('single-leg fees (Money)', self._time(money_single), len(legs)),
+            ('bulk fees (calculate_fees_minor)', self._time(money_bulk), len(legs)),
+        ]
+
+    def _time(self, func, repeat=3):
+        """Best of `repeat` wall-clock timings"""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
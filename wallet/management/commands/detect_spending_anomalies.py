@@ -0,0 +1,193 @@
+# wallet/management/commands/detect_spending_anomalies.py
+from datetime import timedelta
+from decimal import Decimal
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from wallet.models import UserProfile, Transaction, SpendingAnomaly
+from utils.anomaly import build_daily_matrix, rolling_zscores, peer_percentiles
+
+
+class Command(BaseCommand):
+    help = 'Flag users with anomalous daily spending against their own history and their peer group'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Length of the evaluated period in days')
+        parser.add_argument('--window', type=int, default=7, help='Trailing window for rolling statistics')
+        parser.add_argument('--end-date', type=str, help='Last day of the period (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Users loaded per chunk')
+        parser.add_argument('--z-threshold', type=float, default=4.0)
+        parser.add_argument('--percentile-threshold', type=float, default=99.5)
+        parser.add_argument('--min-amount', type=float, default=100.0, help='Ignore spending below this amount')
+        parser.add_argument('--min-std', type=float, default=1.0, help='Floor for the rolling standard deviation')
+        parser.add_argument('--min-peer-group', type=int, default=20, help='Smallest peer group used for percentiles')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        if options['end_date']:
+            try:
+                end_date = timezone.datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--end-date must be YYYY-MM-DD')
+        else:
+            end_date = timezone.now().date() - timedelta(days=1)
+
+        days = options['days']
+        window = options['window']
+        if days < 1 or window < 2:
+            raise CommandError('--days must be >= 1 and --window must be >= 2')
+
+        period_start = end_date - timedelta(days=days - 1)
+        history_start = period_start - timedelta(days=window)
+        n_days = days + window
+
+        # Per-user results, concatenated once all chunks are processed
+        user_chunks, total_chunks, z_chunks, day_chunks, amount_chunks, group_chunks = [], [], [], [], [], []
+        group_index = {}
+        group_labels = []
+
+        for user_ids, groups in self._iter_user_chunks(options['chunk_size']):
+            matrix = self._load_chunk(user_ids, history_start, end_date, n_days)
+
+            zscores = rolling_zscores(matrix, window, options['min_std'])[:, window:]
+            spending = matrix[:, window:]
+            # Small amounts are never interesting on their own
+            zscores[spending < options['min_amount']] = 0.0
+
+            worst_day = np.argmax(zscores, axis=1)
+            rows = np.arange(len(user_ids))
+
+            codes = np.empty(len(groups), dtype=np.int64)
+            for i, key in enumerate(groups):
+                code = group_index.get(key)
+                if code is None:
+                    code = group_index[key] = len(group_labels)
+                    group_labels.append(key)
+                codes[i] = code
+
+            user_chunks.append(user_ids)
+            total_chunks.append(spending.sum(axis=1))
+            z_chunks.append(zscores[rows, worst_day])
+            day_chunks.append(worst_day)
+            amount_chunks.append(spending[rows, worst_day])
+            group_chunks.append(codes)
+
+        if not user_chunks:
+            self.stdout.write('No users to evaluate.')
+            return
+
+        user_ids = np.concatenate(user_chunks)
+        totals = np.concatenate(total_chunks)
+        max_z = np.concatenate(z_chunks)
+        worst_day = np.concatenate(day_chunks)
+        worst_amount = np.concatenate(amount_chunks)
+        group_codes = np.concatenate(group_chunks)
+
+        percentiles, group_sizes = peer_percentiles(group_codes, totals)
+
+        z_flag = max_z >= options['z_threshold']
+        peer_flag = (
+            (percentiles >= options['percentile_threshold'])
+            & (group_sizes >= options['min_peer_group'])
+            & (totals >= options['min_amount'])
+        )
+        flagged = np.flatnonzero(z_flag | peer_flag)
+
+        anomalies = []
+        for i in flagged:
+            reasons = []
+            if z_flag[i]:
+                reasons.append('zscore')
+            if peer_flag[i]:
+                reasons.append('peer_percentile')
+            country, city = group_labels[group_codes[i]]
+            anomalies.append(SpendingAnomaly(
+                user_id=int(user_ids[i]),
+                period_start=period_start,
+                period_end=end_date,
+                anomaly_date=period_start + timedelta(days=int(worst_day[i])) if z_flag[i] else None,
+                anomaly_amount=Decimal(str(round(float(worst_amount[i]), 2))),
+                z_score=round(float(max_z[i]), 4),
+                period_total=Decimal(str(round(float(totals[i]), 2))),
+                peer_percentile=round(float(percentiles[i]), 4),
+                peer_group_size=int(group_sizes[i]),
+                current_country=country,
+                current_city=city,
+                reasons=','.join(reasons),
+            ))
+
+        with transaction.atomic():
+            # Re-running a period replaces anything that has not been reviewed yet
+            SpendingAnomaly.objects.filter(
+                period_start=period_start,
+                period_end=end_date,
+                status='pending'
+            ).delete()
+            SpendingAnomaly.objects.bulk_create(anomalies, batch_size=options['batch_size'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Evaluated {len(user_ids)} users for {period_start} to {end_date}: '
+            f'{len(anomalies)} flagged in {elapsed:.1f}s'
+        ))
+
+    def _iter_user_chunks(self, chunk_size):
+        """Yield (sorted user id array, [(country, city), ...]) using keyset pagination"""
+        last_id = 0
+        while True:
+            rows = list(
+                UserProfile.objects.filter(user_id__gt=last_id)
+                .order_by('user_id')
+                .values_list('user_id', 'current_country', 'current_city')[:chunk_size]
+            )
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            groups = [(row[1].strip().lower(), row[2].strip().lower()) for row in rows]
+            yield user_ids, groups
+
+    def _load_chunk(self, user_ids, history_start, end_date, n_days):
+        """Load daily outgoing totals for a chunk of users as a dense matrix"""
+        start = timezone.make_aware(timezone.datetime.combine(history_start, timezone.datetime.min.time()))
+        end = timezone.make_aware(timezone.datetime.combine(end_date + timedelta(days=1), timezone.datetime.min.time()))
+
+        daily = (
+            Transaction.objects.filter(
+                user_id__gte=int(user_ids[0]),
+                user_id__lte=int(user_ids[-1]),
+                status='completed',
+                transaction_type__in=Transaction.OUTGOING_TYPES,
+                created_at__gte=start,
+                created_at__lt=end,
+            )
+            .annotate(day=TruncDate('created_at'))
+            .values_list('user_id', 'day')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+
+        row_users, row_days, row_amounts = [], [], []
+        for user_id, day, total in daily.iterator(chunk_size=10000):
+            row_users.append(user_id)
+            row_days.append((day - history_start).days)
+            row_amounts.append(total)
+
+        # Users in the id range without a profile are dropped here
+        row_users = np.asarray(row_users, dtype=np.int64)
+        known = np.isin(row_users, user_ids)
+        return build_daily_matrix(
+            user_ids,
+            row_users[known],
+            np.asarray(row_days, dtype=np.int64)[known],
+            np.asarray(row_amounts, dtype=np.float64)[known],
+            n_days,
+        )
@@ -0,0 +1,57 @@
+# wallet/management/commands/dispatch_outbox.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from utils.outbox import OutboxDispatcher, compact
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox events to the configured sinks in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Events claimed per batch (OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--lease-seconds', type=int, default=None, help='Lease length (OUTBOX_LEASE_SECONDS)')
+        parser.add_argument('--node-id', type=str, default=None, help='Lease owner name; defaults to host-pid')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when drained')
+        parser.add_argument('--idle-sleep', type=float, default=0.5, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--compact-every', type=int, default=300,
+                            help='Seconds between compactions of delivered rows while looping')
+        parser.add_argument('--compact-only', action='store_true', help='Only delete old delivered rows')
+
+    def handle(self, *args, **options):
+        if options['compact_only']:
+            self.stdout.write(self.style.SUCCESS(f'Compacted {compact()} delivered events'))
+            return
+
+        dispatcher = OutboxDispatcher(
+            node_id=options['node_id'],
+            batch_size=options['batch_size'],
+            lease_seconds=options['lease_seconds']
+        )
+        started = time.perf_counter()
+        next_compaction = time.monotonic() + options['compact_every']
+        delivered = 0
+
+        try:
+            while True:
+                count = dispatcher.run_once()
+                delivered += count
+
+                if options['loop'] and time.monotonic() >= next_compaction:
+                    compact()
+                    next_compaction = time.monotonic() + options['compact_every']
+
+                if count == 0:
+                    if not options['loop']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Delivered {delivered} events in {elapsed:.2f}s ({delivered / elapsed if elapsed else 0:.0f}/s)'
+        ))
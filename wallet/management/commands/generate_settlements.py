@@ -0,0 +1,37 @@
+# wallet/management/commands/generate_settlements.py
+from datetime import date
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.settlements import SETTLEMENT_TYPES, generate_settlement, last_closed_window, settlement_window
+
+
+class Command(BaseCommand):
+    help = 'Write provider settlement files for one cut-off window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Cut-off date (YYYY-MM-DD); defaults to the last closed window')
+        parser.add_argument('--provider', action='append', choices=sorted(SETTLEMENT_TYPES),
+                            help='Provider to settle (repeatable); defaults to all')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                window_start, window_end = settlement_window(date.fromisoformat(options['date']))
+            except ValueError:
+                raise CommandError(f"Invalid --date: {options['date']}")
+        else:
+            window_start, window_end = last_closed_window()
+
+        for provider in options['provider'] or sorted(SETTLEMENT_TYPES):
+            started = time.perf_counter()
+            batch = generate_settlement(provider, window_start, window_end)
+            elapsed = time.perf_counter() - started
+            if batch is None:
+                self.stdout.write(f"{provider}: window {window_start} - {window_end} already settled")
+                continue
+            self.stdout.write(
+                f"{provider}: {batch.transaction_count} transactions, amount {batch.total_amount}, "
+                f"fee {batch.total_fee} -> {batch.file_path} in {elapsed:.1f}s"
+            )
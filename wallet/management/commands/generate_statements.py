@@ -0,0 +1,72 @@
+# wallet/management/commands/generate_statements.py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from wallet.statements import (
+    generate_shard, init_worker, plan_shards, shard_manifest_path, statement_period, statement_root, write_manifest
+)
+
+
+class Command(BaseCommand):
+    help = 'Write monthly CSV and HTML statements for every wallet, sharded across a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Statement month (YYYY-MM); defaults to last month')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (1 runs in this process)')
+        parser.add_argument('--shard-size', type=int, default=getattr(settings, 'STATEMENT_SHARD_SIZE', 1000),
+                            help='Users per shard; finished shards are skipped on a rerun')
+
+    def handle(self, *args, **options):
+        month = options['month'] or f"{timezone.localdate().replace(day=1) - timedelta(days=1):%Y-%m}"
+        try:
+            _, end = statement_period(month)
+        except ValueError:
+            raise CommandError(f"Invalid --month: {month}")
+        if end > timezone.now():
+            raise CommandError(f"{month} has not closed yet")
+
+        shards = plan_shards(month, options['shard_size'])
+        pending = [
+            (shard_no, first, last) for shard_no, (first, last) in enumerate(shards)
+            if not shard_manifest_path(month, shard_no).exists()
+        ]
+        self.stdout.write(
+            f"{month}: {len(shards)} shards, {len(shards) - len(pending)} already done, "
+            f"writing to {statement_root(month)}"
+        )
+
+        started = time.perf_counter()
+        written = 0
+        for shard_no, count in self._run(month, pending, options['workers']):
+            written += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"shard {shard_no}: {count} statements ({written / elapsed:.0f}/s overall)")
+
+        manifest = write_manifest(month, len(shards))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{manifest['statements']} statements in manifest; wrote {written} in {elapsed:.1f}s "
+            f"({written / elapsed if elapsed else 0:.0f} statements/s)"
+        ))
+
+    def _run(self, month, pending, workers):
+        """Yield (shard_no, count) as shards finish"""
+        if workers <= 1:
+            for shard_no, first, last in pending:
+                yield generate_shard(month, shard_no, first, last)
+            return
+
+        # Children must open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = [pool.submit(generate_shard, month, shard_no, first, last) for shard_no, first, last in pending]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,89 @@
+# wallet/management/commands/memory_report.py
+from pathlib import Path
+import json
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.memory import snapshot_paths, snapshot_root, top_growers
+
+
+def load(path):
+    """(snapshot, stats) of a dump; stats are empty when its .json is missing"""
+    path = Path(path)
+    try:
+        snapshot = tracemalloc.Snapshot.load(str(path))
+    except FileNotFoundError:
+        raise CommandError(f"No snapshot at {path}")
+    sidecar = path.with_suffix('.json')
+    return snapshot, json.loads(sidecar.read_text()) if sidecar.exists() else {}
+
+
+def object_deltas(old, new):
+    """(name, old count, new count) for every tracked object kind, biggest growth first"""
+    old_objects, new_objects = old.get('objects', {}), new.get('objects', {})
+    rows = []
+    for group in ('models', 'serializers'):
+        before, after = old_objects.get(group, {}), new_objects.get(group, {})
+        rows.extend((name, before.get(name, 0), after.get(name, 0)) for name in set(before) | set(after))
+    for name in ('querysets', 'queryset_cached_rows'):
+        rows.append((name, old_objects.get(name, 0), new_objects.get(name, 0)))
+    return sorted(rows, key=lambda row: (row[2] - row[1], row[2]), reverse=True)
+
+
+class Command(BaseCommand):
+    help = 'Diff two tracemalloc snapshots: top growing allocation sites and held model/queryset/serializer counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshots', nargs='*',
+                            help='OLD NEW snapshot files (default: oldest and newest kept for --pid)')
+        parser.add_argument('--pid', help='Process whose snapshots to diff (default: the latest written)')
+        parser.add_argument('--limit', type=int, default=20, help='Allocation sites to show')
+        parser.add_argument('--list', action='store_true', help='List the kept snapshots per process and stop')
+
+    def handle(self, *args, **options):
+        root = snapshot_root()
+        if options['list']:
+            for directory in sorted(root.iterdir()) if root.is_dir() else []:
+                paths = snapshot_paths(directory)
+                if paths:
+                    self.stdout.write(f"{directory.name}: {len(paths)} snapshots, {paths[0].name} .. {paths[-1].name}")
+            return
+
+        if len(options['snapshots']) == 2:
+            old_path, new_path = options['snapshots']
+        elif options['snapshots']:
+            raise CommandError('Give two snapshot files, or none to diff the oldest and newest of a process')
+        else:
+            old_path, new_path = self._oldest_and_newest(root, options['pid'])
+
+        old, old_stats = load(old_path)
+        new, new_stats = load(new_path)
+        self.stdout.write(f"{old_path} -> {new_path}")
+        if old_stats and new_stats:
+            self.stdout.write(
+                f"pid {new_stats['pid']}, {old_stats['taken_at']} -> {new_stats['taken_at']}: traced "
+                f"{old_stats['traced_kb']} -> {new_stats['traced_kb']} KiB, max RSS {new_stats['max_rss_kb']} KiB"
+            )
+
+        self.stdout.write(f"\n{'grew KiB':>10} {'now KiB':>10} {'blocks':>8}  allocation site")
+        for stat in top_growers(old, new, options['limit']):
+            self.stdout.write(
+                f"{stat['size_diff_kb']:>10.1f} {stat['size_kb']:>10.1f} {stat['count_diff']:>+8}  {stat['location']}"
+            )
+
+        if old_stats and new_stats:
+            self.stdout.write(f"\n{'held objects':<40} {'before':>8} {'after':>8} {'change':>8}")
+            for name, before, after in object_deltas(old_stats, new_stats):
+                self.stdout.write(f"{name:<40} {before:>8} {after:>8} {after - before:>+8}")
+
+    def _oldest_and_newest(self, root, pid):
+        directories = [entry for entry in root.iterdir() if entry.is_dir()] if root.is_dir() else []
+        if pid:
+            directories = [entry for entry in directories if entry.name == str(pid)]
+        if not directories:
+            raise CommandError(f"No snapshots for {'pid ' + str(pid) if pid else 'any process'} in {root}")
+        paths = snapshot_paths(max(directories, key=lambda entry: entry.stat().st_mtime))
+        if len(paths) < 2:
+            raise CommandError('Need at least two snapshots of the process to diff')
+        return paths[0], paths[-1]
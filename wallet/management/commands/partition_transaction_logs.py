@@ -0,0 +1,24 @@
+# wallet/management/commands/partition_transaction_logs.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet.partitions import drop_expired, roll_closed_months
+
+
+class Command(BaseCommand):
+    help = 'Move closed months of transaction logs into monthly tables and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int,
+                            default=getattr(settings, 'TRANSACTION_LOG_RETENTION_MONTHS', 36),
+                            help='Drop partitions older than this many months')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        for month, rows in roll_closed_months().items():
+            self.stdout.write(f"{month:%Y-%m}: moved {rows} logs")
+        for table in drop_expired(options['retention_months']):
+            self.stdout.write(f"Dropped {table}")
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.2f}s"))
@@ -0,0 +1,35 @@
+# wallet/management/commands/refresh_fx_rates.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wallet.models import ExchangeRate
+from utils.fx import LocalRateFeed, fx_rate_cache
+
+
+class Command(BaseCommand):
+    help = 'Pull the latest quotes from the rate feed into the exchange rate table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jitter', type=str, default='0', help='Relative random walk applied to mid rates')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--source', type=str, default='local-feed')
+
+    def handle(self, *args, **options):
+        feed = LocalRateFeed(jitter=options['jitter'], seed=options['seed'])
+        valid_from = timezone.now()
+
+        rates = ExchangeRate.objects.bulk_create([
+            ExchangeRate(
+                base_currency=base,
+                quote_currency=quote,
+                rate=rate,
+                source=options['source'],
+                valid_from=valid_from
+            )
+            for base, quote, rate in feed.fetch()
+        ])
+
+        # Other processes pick the new version up on their next refresh check
+        fx_rate_cache.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {len(rates)} rates valid from {valid_from:%Y-%m-%d %H:%M:%S}'))
@@ -0,0 +1,58 @@
+# wallet/management/commands/retry_transactions.py
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from wallet.models import Transaction
+from wallet.services import retry_transaction
+
+
+class Command(BaseCommand):
+    help = 'Retry provider calls of transactions that failed transiently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Due transactions fetched per scan')
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads calling providers')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when nothing is due')
+        parser.add_argument('--idle-sleep', type=float, default=2.0, help='Seconds to wait when nothing is due')
+
+    def handle(self, *args, **options):
+        totals = Counter()
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='retrier') as pool:
+            try:
+                while True:
+                    now = timezone.now()
+                    due = list(
+                        Transaction.objects.filter(status='retrying', next_attempt_at__lte=now)
+                        .order_by('next_attempt_at').values_list('id', flat=True)[:options['batch_size']]
+                    )
+                    if not due:
+                        if not options['loop']:
+                            break
+                        close_old_connections()
+                        time.sleep(options['idle_sleep'])
+                        continue
+
+                    for transaction_obj in pool.map(lambda transaction_id: self._retry(transaction_id, now), due):
+                        totals['skipped' if transaction_obj is None else transaction_obj.status] += 1
+            except KeyboardInterrupt:
+                pass
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Completed {totals['completed']}, rescheduled {totals['retrying']}, failed {totals['failed']}, "
+            f"taken elsewhere {totals['skipped']} in {elapsed:.2f}s"
+        ))
+
+    def _retry(self, transaction_id, now):
+        try:
+            return retry_transaction(transaction_id, now)
+        except Exception as e:
+            self.stderr.write(f"Retry of transaction {transaction_id} errored: {e}")
+            return None
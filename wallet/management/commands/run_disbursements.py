@@ -0,0 +1,39 @@
+# wallet/management/commands/run_disbursements.py
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from wallet.disbursements import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Parse and execute queued bulk disbursement jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when idle')
+        parser.add_argument('--idle-sleep', type=float, default=5.0, help='Seconds to wait when no job is queued')
+
+    def handle(self, *args, **options):
+        owner = f'{socket.gethostname()}-{os.getpid()}'
+        try:
+            while True:
+                job = claim_next_job(owner)
+                if job is None:
+                    if not options['loop']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['idle_sleep'])
+                    continue
+
+                started = time.perf_counter()
+                job = run_job(job)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{job.job_id}: {job.status}, {job.succeeded_legs} paid, {job.failed_legs} failed, "
+                    f"{job.invalid_legs} invalid in {elapsed:.1f}s"
+                )
+        except KeyboardInterrupt:
+            pass
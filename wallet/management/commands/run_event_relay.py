@@ -0,0 +1,39 @@
+# wallet/management/commands/run_event_relay.py
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run the local TCP relay that fans events out between processes (SocketBroker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        asyncio.run(self._serve(options['host'], options['port']))
+
+    async def _serve(self, host, port):
+        clients = set()
+
+        async def handle_client(reader, writer):
+            clients.add(writer)
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    for client in list(clients):
+                        try:
+                            client.write(line)
+                        except (ConnectionError, RuntimeError):
+                            clients.discard(client)
+            finally:
+                clients.discard(writer)
+                writer.close()
+
+        server = await asyncio.start_server(handle_client, host, port)
+        self.stdout.write(self.style.SUCCESS(f'Event relay listening on {host}:{port}'))
+        async with server:
+            await server.serve_forever()
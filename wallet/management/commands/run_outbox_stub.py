@@ -0,0 +1,45 @@
+# wallet/management/commands/run_outbox_stub.py
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run a local HTTP receiver for utils.outbox.HttpSink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--fail-rate', type=float, default=0.0,
+                            help='Fraction of batches answered with 503, to exercise retries')
+
+    def handle(self, *args, **options):
+        stdout = self.stdout
+        fail_rate = options['fail_rate']
+        received = {'batches': 0, 'events': 0}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                received['batches'] += 1
+                if random.random() < fail_rate:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                events = json.loads(body)
+                received['events'] += len(events)
+                stdout.write(f"batch of {len(events)} (total {received['events']})")
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(self.style.SUCCESS(f"Outbox stub listening on {options['host']}:{options['port']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
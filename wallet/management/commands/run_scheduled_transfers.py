@@ -0,0 +1,91 @@
+# wallet/management/commands/run_scheduled_transfers.py
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from wallet.models import ScheduledTransfer
+from wallet.services import execute_scheduled_transfer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Execute due scheduled and recurring transfers on a worker pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Due schedules fetched per scan')
+        parser.add_argument('--workers', type=int, default=8, help='Worker threads executing transfers')
+        parser.add_argument('--shard', type=str, default='',
+                            help='Only take schedules with id %% N == I, given as I/N, to split work across nodes')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when nothing is due')
+        parser.add_argument('--idle-sleep', type=float, default=5.0, help='Seconds to wait when nothing is due')
+
+    def handle(self, *args, **options):
+        shard = self._parse_shard(options['shard'])
+        totals = {'completed': 0, 'retrying': 0, 'failed': 0, 'skipped': 0, 'errors': 0}
+        attempted = set()
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='scheduler') as pool:
+            try:
+                while True:
+                    now = timezone.now()
+                    # A slot that errored stays due; do not spin on it
+                    due = [item for item in self._due(now, options['batch_size'], shard) if item not in attempted]
+                    attempted.update(due)
+                    if not due:
+                        if not options['loop']:
+                            break
+                        attempted.clear()
+                        close_old_connections()
+                        time.sleep(options['idle_sleep'])
+                        continue
+
+                    for outcome in pool.map(lambda item: self._execute(item, now), due):
+                        totals[outcome] += 1
+            except KeyboardInterrupt:
+                pass
+
+        elapsed = time.perf_counter() - started
+        executed = totals['completed'] + totals['retrying'] + totals['failed']
+        summary = (
+            f"Completed {totals['completed']}, retrying {totals['retrying']}, failed {totals['failed']}, "
+            f"already run {totals['skipped']}, errors {totals['errors']} "
+            f"in {elapsed:.2f}s ({executed / elapsed if elapsed else 0:.0f} runs/s)"
+        )
+        self.stdout.write(self.style.ERROR(summary) if totals['errors'] else self.style.SUCCESS(summary))
+
+    def _parse_shard(self, value):
+        if not value:
+            return None
+        try:
+            index, count = (int(part) for part in value.split('/'))
+        except ValueError:
+            raise CommandError('--shard must look like I/N, e.g. 0/4')
+        if not 0 <= index < count:
+            raise CommandError('--shard index must be in [0, N)')
+        return index, count
+
+    def _due(self, now, batch_size, shard):
+        """Oldest due slots, read from the (is_active, next_run_at) index"""
+        queryset = ScheduledTransfer.objects.filter(is_active=True, next_run_at__lte=now)
+        if shard:
+            queryset = queryset.annotate(shard=F('id') % shard[1]).filter(shard=shard[0])
+        return list(queryset.order_by('next_run_at', 'id').values_list('id', 'next_run_at')[:batch_size])
+
+    def _execute(self, item, now):
+        """Outcome of one slot: the run's status, 'skipped' if it had already run, or 'errors'"""
+        schedule_id, scheduled_for = item
+        try:
+            run = execute_scheduled_transfer(schedule_id, scheduled_for, now)
+        except Exception as e:
+            # Not a taken slot (execute_scheduled_transfer returns None for those): the slot stays due
+            logger.exception("Scheduled transfer %s for %s errored", schedule_id, scheduled_for)
+            self.stderr.write(f"Scheduled transfer {schedule_id} errored: {e}")
+            return 'errors'
+        return 'skipped' if run is None else run.status
@@ -0,0 +1,347 @@
+# wallet/management/commands/seed_load_data.py
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import repeat
+import time
+import zlib
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from wallet.models import Card, Transaction, TransactionLog, UserProfile, Wallet
+from utils.wallet_process import FeeCalculator
+
+# Observed mix of traffic: (type, share)
+TYPE_MIX = [
+    ('wallet_to_wallet', 0.30),
+    ('card_to_wallet', 0.22),
+    ('wallet_to_bkash', 0.15),
+    ('bkash_to_wallet', 0.12),
+    ('wallet_to_nagad', 0.08),
+    ('nagad_to_wallet', 0.06),
+    ('wallet_to_card', 0.07),
+]
+STATUS_MIX = [
+    ('completed', 0.91),
+    ('failed', 0.05),
+    ('cancelled', 0.02),
+    ('pending', 0.01),
+    ('processing', 0.005),
+    ('retrying', 0.005),
+]
+# Relative traffic per hour of day (quiet nights, lunchtime and evening peaks)
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 9, 10, 9, 8, 8, 8, 9, 10, 10, 9, 7, 4, 2]
+CITIES = [('Dhaka', 'Bangladesh'), ('Chattogram', 'Bangladesh'), ('Sylhet', 'Bangladesh'),
+          ('Khulna', 'Bangladesh'), ('Rajshahi', 'Bangladesh'), ('London', 'United Kingdom'),
+          ('New York', 'United States'), ('Dubai', 'United Arab Emirates')]
+CARD_TYPES = [('visa', 0.55), ('mastercard', 0.35), ('amex', 0.10)]
+CARD_TYPE_PREFIX = {'visa': '4', 'mastercard': '5', 'amex': '3'}
+MOBILE_TYPES = {'wallet_to_bkash', 'wallet_to_nagad', 'bkash_to_wallet', 'nagad_to_wallet'}
+CARD_TRANSACTION_TYPES = {'card_to_wallet', 'wallet_to_card'}
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the generated created_at/updated_at instead of stamping now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """
+    SQLite: drop the tables' secondary indexes for the load and rebuild them once at the end.
+
+    Building an index over sorted data is far cheaper than maintaining it
+    row by row. Unique constraints (autoindexes) are kept.
+    """
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND tbl_name IN ({', '.join(['%s'] * len(tables))})",
+            tables
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def insert_rows(model, columns, count):
+    """
+    executemany INSERT of column-oriented, already DB-formatted values.
+
+    bulk_create prepares every value field by field (hundreds of
+    microseconds per row); the big tables skip that. Fields without a
+    column get their default, and an omitted primary key is left to the
+    database.
+    """
+    if not count:
+        return
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field.attname in columns or not field.primary_key
+    ]
+    values = [
+        columns[field.attname] if field.attname in columns
+        else repeat(field.get_db_prep_save(field.get_default(), connection), count)
+        for field in fields
+    ]
+    quote = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(field.column) for field in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, list(zip(*values)))
+
+
+def _db_datetimes(values):
+    """numpy UTC datetime64[s] -> the 'YYYY-MM-DD HH:MM:SS' text Django stores"""
+    return np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ').tolist()
+
+
+def _db_money(minor):
+    return [f'{value // 100}.{value % 100:02d}' for value in np.asarray(minor).tolist()]
+
+
+def _pick(rng, mix, size):
+    names, weights = zip(*mix)
+    return np.array(names)[rng.choice(len(names), size=size, p=np.array(weights) / sum(weights))]
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, production-shaped dataset (users, wallets, cards, transactions, logs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--cards', type=int, default=None, help='Defaults to 1.5 per user')
+        parser.add_argument('--transactions', type=int, default=1000000)
+        parser.add_argument('--days', type=int, default=365, help='Spread transactions over this many days')
+        parser.add_argument('--until', help='Last day of generated activity (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='load_', help='Username prefix of the generated users')
+        parser.add_argument('--password', help='Hash this once and give it to every user (default: unusable)')
+        parser.add_argument('--batch-size', type=int, default=20000, help='Rows per insert batch')
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help='SQLite: rebuild transaction indexes after the load instead of maintaining them')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users prefixed {options['prefix']!r} already exist; pick another --prefix")
+        try:
+            until = date.fromisoformat(options['until']) if options['until'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('--until must be YYYY-MM-DD')
+
+        self.rng = np.random.default_rng(options['seed'])
+        # Separate stream for transaction UUIDs so datasets seeded alike under other prefixes can coexist
+        self.uuid_rng = np.random.default_rng([options['seed'], zlib.crc32(options['prefix'].encode())])
+        self.batch_size = options['batch_size']
+        self.end = timezone.make_aware(datetime.combine(until + timedelta(days=1), datetime.min.time()))
+        self.start = self.end - timedelta(days=options['days'])
+        started = time.perf_counter()
+        defer = nullcontext()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                # 256 MB page cache: index b-trees stay in memory during random inserts
+                cursor.execute('PRAGMA cache_size = -262144')
+            if options['defer_indexes']:
+                defer = deferred_indexes(Transaction, TransactionLog)
+
+        with explicit_timestamps(UserProfile, Wallet, Card, Transaction, TransactionLog):
+            user_ids = self._users(options['users'], options['prefix'], options['password'])
+            cards = self._cards(user_ids, options['cards'] if options['cards'] is not None else len(user_ids) * 3 // 2)
+            with defer:
+                self._transactions(user_ids, cards, options['transactions'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s"))
+
+    def _timed(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {count} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s)")
+
+    def _users(self, count, prefix, password):
+        """Users with explicit ids, plus their profile and wallet (the post_save signal is bypassed)"""
+        started = time.perf_counter()
+        first_id = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        # One hash shared by every user keeps hashing out of the hot loop
+        password_hash = make_password(password) if password else make_password(None)
+        # Everyone joined during the year before the generated activity starts
+        joined = [self.start - timedelta(seconds=int(seconds)) for seconds in self.rng.integers(1, 365 * 86400, size=count)]
+        cities = self.rng.integers(0, len(CITIES), size=count)
+        verified = self.rng.random(count) < 0.8
+        balances = np.round(self.rng.lognormal(mean=5.0, sigma=1.2, size=count), 2)
+
+        for offset in range(0, count, self.batch_size):
+            batch = range(offset, min(offset + self.batch_size, count))
+            with transaction.atomic():
+                User.objects.bulk_create([
+                    User(id=first_id + i, username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+                         password=password_hash, first_name='Load', last_name=f'User{i}', date_joined=joined[i])
+                    for i in batch
+                ])
+                UserProfile.objects.bulk_create([
+                    UserProfile(user_id=first_id + i, current_city=CITIES[cities[i]][0],
+                                current_country=CITIES[cities[i]][1], phone_number=f'+8801{700000000 + i:09d}'[:15],
+                                is_verified=bool(verified[i]), created_at=joined[i], updated_at=joined[i])
+                    for i in batch
+                ])
+                Wallet.objects.bulk_create([
+                    Wallet(user_id=first_id + i, balance=Decimal(f'{balances[i]:.2f}'),
+                           created_at=joined[i], updated_at=joined[i])
+                    for i in batch
+                ])
+        self._timed('users', count, started)
+        return np.arange(first_id, first_id + count)
+
+    def _cards(self, user_ids, count):
+        """Cards spread over users; returns (card ids grouped by owner, first index per user, count per user)"""
+        started = time.perf_counter()
+        first_id = (Card.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        owners = self.rng.choice(user_ids, size=count)
+        types = _pick(self.rng, CARD_TYPES, count)
+        expiry_years = self.rng.integers(self.end.year + 1, self.end.year + 6, size=count)
+        expiry_months = self.rng.integers(1, 13, size=count)
+
+        for offset in range(0, count, self.batch_size):
+            batch = range(offset, min(offset + self.batch_size, count))
+            with transaction.atomic():
+                # bulk_create skips Card.save() and its full_clean()
+                Card.objects.bulk_create([
+                    Card(id=first_id + i, user_id=int(owners[i]), card_type=types[i],
+                         card_number=f'{CARD_TYPE_PREFIX[types[i]]}{first_id + i:015d}',
+                         card_holder_name=f'LOAD USER {owners[i]}', expiry_month=int(expiry_months[i]),
+                         expiry_year=int(expiry_years[i]), cvv=f'{i % 1000:03d}',
+                         created_at=self.start, updated_at=self.start)
+                    for i in batch
+                ])
+        self._timed('cards', count, started)
+
+        order = np.argsort(owners, kind='stable')
+        per_user = np.bincount(owners - user_ids[0], minlength=len(user_ids))
+        return first_id + order, np.concatenate(([0], np.cumsum(per_user)[:-1])), per_user
+
+    def _transactions(self, user_ids, cards, count):
+        """Transactions in batches, each with the status log its lifecycle would have written"""
+        started = time.perf_counter()
+        first_id = (Transaction.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        card_ids, card_start, card_count = cards
+        # Heavy-tailed activity: a few users make most of the transfers
+        activity = self.rng.lognormal(mean=0.0, sigma=1.5, size=len(user_ids))
+        activity /= activity.sum()
+        span_days = (self.end - self.start).days
+        hours = np.array(HOURLY_WEIGHTS, dtype=float) / sum(HOURLY_WEIGHTS)
+        epoch = np.datetime64(int(self.start.timestamp()), 's')
+        logs = 0
+
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            ids = np.arange(first_id + offset, first_id + offset + size)
+            owner_index = self.rng.choice(len(user_ids), size=size, p=activity)
+            owners = user_ids[owner_index]
+            types = _pick(self.rng, TYPE_MIX, size)
+            statuses = _pick(self.rng, STATUS_MIX, size)
+            amounts = np.maximum(100, np.round(self.rng.lognormal(mean=8.0, sigma=1.1, size=size))).astype(np.int64)
+            created = (
+                self.rng.integers(0, span_days, size=size) * 86400
+                + self.rng.choice(24, size=size, p=hours) * 3600
+                + self.rng.integers(0, 3600, size=size)
+            )
+            finished = created + self.rng.integers(1, 30, size=size)
+
+            # Card legs use one of the owner's cards; users without one pay through bKash instead
+            owned = card_count[owner_index]
+            is_card = np.isin(types, list(CARD_TRANSACTION_TYPES))
+            types = np.where(is_card & (owned == 0) & (types == 'card_to_wallet'), 'bkash_to_wallet', types)
+            types = np.where(is_card & (owned == 0) & (types == 'wallet_to_card'), 'wallet_to_bkash', types)
+            with_card = is_card & (owned > 0)
+            picks = card_start[owner_index] + (self.rng.random(size) * owned).astype(np.int64)
+            cards_used = card_ids[np.minimum(picks, max(len(card_ids) - 1, 0))] if len(card_ids) else picks
+
+            recipient_index = self.rng.integers(0, len(user_ids), size=size)
+            recipient_index = np.where(recipient_index == owner_index, (recipient_index + 1) % len(user_ids), recipient_index)
+            is_transfer = types == 'wallet_to_wallet'
+            is_mobile = np.isin(types, list(MOBILE_TYPES))
+            completed, failed, pending = statuses == 'completed', statuses == 'failed', statuses == 'pending'
+            fees = FeeCalculator.calculate_fees_minor(types.tolist(), amounts.tolist())
+
+            created_at = _db_datetimes(epoch + created)
+            finished_at = _db_datetimes(epoch + finished)
+            owner_list, id_list, status_list = owners.tolist(), ids.tolist(), statuses.tolist()
+            columns = {
+                'id': id_list,
+                'transaction_id': self._uuid_hex(size),
+                'user_id': owner_list,
+                'transaction_type': types.tolist(),
+                'amount': _db_money(amounts),
+                'fee': _db_money(fees),
+                'status': status_list,
+                'card_id': [card if used else None for card, used in zip(cards_used.tolist(), with_card.tolist())],
+                'recipient_user_id': [
+                    int(user_ids[index]) if transfer else None
+                    for index, transfer in zip(recipient_index.tolist(), is_transfer.tolist())
+                ],
+                'mobile_number': [
+                    f'+8801{owner % 1000000000:09d}' if mobile else '' for owner, mobile in zip(owner_list, is_mobile.tolist())
+                ],
+                'reference_number': [f'LD{pk:012d}' if done else '' for pk, done in zip(id_list, completed.tolist())],
+                'completed_at': [at if done else None for at, done in zip(finished_at, completed.tolist())],
+                'failed_at': [at if done else None for at, done in zip(finished_at, failed.tolist())],
+                'attempt_count': (~pending).astype(int).tolist(),
+                'created_at': created_at,
+                'updated_at': [start if waiting else end for start, end, waiting in zip(created_at, finished_at, pending.tolist())],
+            }
+
+            # The status-change signal writes one log per transition out of pending
+            moved = np.flatnonzero(~pending).tolist()
+            log_statuses = [status_list[i] for i in moved]
+            log_columns = {
+                'transaction_id': [id_list[i] for i in moved],
+                'user_id': [owner_list[i] for i in moved],
+                'previous_status': ['pending'] * len(moved),
+                'new_status': log_statuses,
+                'reason': [f'Status changed from pending to {status}' for status in log_statuses],
+                'created_at': [finished_at[i] for i in moved],
+                'updated_at': [finished_at[i] for i in moved],
+            }
+
+            with transaction.atomic():
+                insert_rows(Transaction, columns, size)
+                insert_rows(TransactionLog, log_columns, len(moved))
+            logs += len(moved)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"transactions: {offset + size}/{count} ({(offset + size) / elapsed:.0f}/s)")
+
+        self._timed('transactions', count, started)
+        self.stdout.write(f"transaction logs: {logs}")
+
+    def _uuid_hex(self, count):
+        """Random version-4 UUIDs from the seeded generator, as 32-char hex"""
+        raw = self.uuid_rng.integers(0, 256, size=(count, 16), dtype=np.uint8)
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+        hex_data = raw.tobytes().hex()
+        return [hex_data[i:i + 32] for i in range(0, len(hex_data), 32)]
@@ -0,0 +1,35 @@
+# wallet/management/commands/snapshot_balances.py
+from datetime import date, timedelta
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from wallet.balances import snapshot_day
+
+
+class Command(BaseCommand):
+    help = 'Record every wallet\'s end-of-day balance (run nightly, after midnight)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to snapshot (YYYY-MM-DD); defaults to yesterday')
+        parser.add_argument('--days', type=int, default=1, help='Also backfill this many days ending at --date')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Wallets per bulk upsert')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                last_day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid --date: {options['date']}")
+        else:
+            last_day = timezone.localdate() - timedelta(days=1)
+
+        for offset in reversed(range(options['days'])):
+            day = last_day - timedelta(days=offset)
+            started = time.perf_counter()
+            try:
+                count = snapshot_day(day, options['chunk_size'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"{day}: {count} wallets in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,64 @@
+# wallet/management/commands/sweep_stale_transactions.py
+from collections import Counter
+from datetime import timedelta
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from wallet.models import Transaction
+from wallet.services import sweep_transaction
+
+
+class Command(BaseCommand):
+    help = 'Complete, fail or release transactions stuck in pending/processing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age-minutes', type=int,
+                            default=getattr(settings, 'TRANSACTION_STALE_AFTER_MINUTES', 15),
+                            help='Only touch transactions not updated for this long')
+        parser.add_argument('--batch-size', type=int, default=200, help='Transactions read per index scan')
+        parser.add_argument('--loop', action='store_true', help='Sweep again every --interval seconds')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.perf_counter()
+                totals = self._sweep(options['age_minutes'], options['batch_size'])
+                self.stdout.write(
+                    f"Completed {totals['completed']}, failed {totals['failed']}, released {totals['released']}, "
+                    f"changed elsewhere {totals[None]} in {time.perf_counter() - started:.2f}s"
+                )
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def _sweep(self, age_minutes, batch_size):
+        """Walk each status newest-first on the (status, -created_at) index in bounded batches"""
+        now = timezone.now()
+        stale_before = now - timedelta(minutes=age_minutes)
+        totals = Counter()
+
+        for status in ('pending', 'processing'):
+            last = None
+            while True:
+                # created_at <= updated_at, so the created_at bound is safe and keeps the scan on the index
+                queryset = Transaction.objects.filter(
+                    status=status, created_at__lt=stale_before, updated_at__lt=stale_before
+                )
+                if last is not None:
+                    queryset = queryset.filter(Q(created_at__lt=last[0]) | Q(created_at=last[0], id__lt=last[1]))
+                batch = list(queryset.order_by('-created_at', '-id').values_list('created_at', 'id')[:batch_size])
+                if not batch:
+                    break
+                last = batch[-1]
+                for _, transaction_id in batch:
+                    totals[sweep_transaction(transaction_id, stale_before, now)] += 1
+        return totals
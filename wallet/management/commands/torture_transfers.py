@@ -0,0 +1,294 @@
+# wallet/management/commands/torture_transfers.py
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+import logging
+import random
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Sum
+
+from wallet.balances import net_changes
+from wallet.models import OutboxEvent, Transaction, TransactionLog, Wallet
+from wallet.services import complete_transfer, prepare_transfer
+
+logger = logging.getLogger(__name__)
+
+# operation -> weight: a pair of wallets paying each other both ways, everyone paying
+# one hot wallet, transfers a concurrent cancel races against the processor, and
+# bKash payouts (provider called outside the DB transaction) raced the same way
+OPERATIONS = {'a_to_b': 3, 'b_to_a': 3, 'fan_in': 3, 'cancel': 1, 'payout': 2}
+OPENING_BALANCE = Decimal('1000.00')
+DESCRIPTION = 'torture_transfers'
+PAYOUT_TYPE = 'wallet_to_bkash'
+
+
+def use_database(alias):
+    """Serve this thread's default connection from alias, so the unmodified code paths run against it"""
+    if alias != DEFAULT_DB_ALIAS:
+        connections[DEFAULT_DB_ALIAS] = connections.create_connection(alias)
+
+
+def _transfer(sender_id, recipient, amount, race_delay=None):
+    """
+    One wallet_to_wallet the way TransferMoneyView runs it; returns the outcome.
+
+    With race_delay the pending transaction is committed first and left
+    that long, so other workers' cancels can reach it before the processor.
+    """
+    sender = User.objects.get(pk=sender_id)
+    data = {'transaction_type': 'wallet_to_wallet', 'amount': amount,
+            'recipient_username': recipient, 'description': DESCRIPTION}
+    if race_delay is None:
+        with transaction.atomic():
+            success, _ = complete_transfer(sender, prepare_transfer(sender, data))
+        return 'completed' if success else 'failed'
+
+    with transaction.atomic():
+        transaction_obj = prepare_transfer(sender, data)
+    time.sleep(race_delay)
+    with transaction.atomic():
+        complete_transfer(sender, transaction_obj)
+    return transaction_obj.status
+
+
+def _payout(sender_id, amount, race_delay):
+    """
+    One bKash payout the way TransferMoneyView runs it: the pending row
+    commits, then complete_transfer claims it and calls the provider
+    outside any DB transaction. Left race_delay first, like _transfer.
+    """
+    sender = User.objects.get(pk=sender_id)
+    data = {'transaction_type': PAYOUT_TYPE, 'amount': amount, 'mobile_number': '01712345678',
+            'description': DESCRIPTION}
+    with transaction.atomic():
+        transaction_obj = prepare_transfer(sender, data)
+    time.sleep(race_delay)
+    sender.wallet.refresh_from_db()
+    complete_transfer(sender, transaction_obj)
+    return transaction_obj.status
+
+
+def _cancel_someone_elses(prefix, rng):
+    """Cancel a random open torture transfer, as the owner would from the API; claimed ones must refuse"""
+    pending = list(
+        Transaction.objects.filter(
+            user__username__startswith=prefix, status__in=Transaction.OPEN_STATUSES, description=DESCRIPTION
+        ).values_list('id', flat=True)[:20]
+    )
+    if not pending:
+        return 'nothing_to_cancel'
+    transaction_obj = Transaction.objects.get(pk=rng.choice(pending))
+    return 'cancelled_other' if transaction_obj.cancel(changed_by=transaction_obj.user) else 'cancel_lost'
+
+
+def run_thread(alias, prefix, worker_no, operations, seed):
+    """One worker thread's share of the load; returns Counter of outcomes"""
+    use_database(alias)
+    rng = random.Random(seed * 10007 + worker_no)
+    users = list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', 'username'))
+    hot, others = users[0], users[1:]
+    pairs = [others[i:i + 2] for i in range(0, len(others) - 1, 2)]
+    names, weights = list(OPERATIONS), list(OPERATIONS.values())
+
+    outcomes = Counter()
+    try:
+        for _ in range(operations):
+            operation = rng.choices(names, weights)[0]
+            amount = Decimal(rng.randrange(100, 5000)) / 100
+            a, b = rng.choice(pairs)
+            try:
+                if operation == 'a_to_b':
+                    outcome = _transfer(a[0], b[1], amount)
+                elif operation == 'b_to_a':
+                    outcome = _transfer(b[0], a[1], amount)
+                elif operation == 'fan_in':
+                    outcome = _transfer(rng.choice(others)[0], hot[1], amount)
+                elif operation == 'payout':
+                    # Up to half a wallet, so concurrent transfers can drain it mid provider call
+                    outcome = _payout(rng.choice(others)[0], amount * 10, race_delay=rng.random() / 1000)
+                else:
+                    outcomes[_cancel_someone_elses(prefix, rng)] += 1
+                    outcome = _transfer(a[0], b[1], amount, race_delay=rng.random() / 1000)
+            except DatabaseError as e:
+                outcome = 'db_error'
+                logger.error("Torture worker %s: %s", worker_no, e)
+            outcomes[f'{operation}:{outcome}'] += 1
+    finally:
+        connections.close_all()
+    return outcomes
+
+
+def run_process(alias, prefix, first_worker, threads, operations, seed):
+    """A worker process: set Django up after the fork and run its threads"""
+    django.setup()
+    connections.close_all()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = pool.map(
+            run_thread, [alias] * threads, [prefix] * threads,
+            range(first_worker, first_worker + threads), [operations] * threads, [seed] * threads
+        )
+        return sum(results, Counter())
+
+
+def verify(prefix, opening_total):
+    """Invariant violations after a run; an empty list means the run was clean"""
+    problems = []
+    wallets = Wallet.objects.filter(user__username__startswith=prefix)
+    mine = Transaction.objects.filter(user__username__startswith=prefix)
+
+    # Conservation: fees and completed payouts leave the system, nothing else does
+    cent = Decimal('0.01')  # SQLite sums decimals as floats
+    completed = mine.filter(status='completed')
+    total = (wallets.aggregate(total=Sum('balance'))['total'] or Decimal('0')).quantize(cent)
+    fees = (completed.aggregate(fees=Sum('fee'))['fees'] or Decimal('0')).quantize(cent)
+    paid_out = (
+        completed.filter(transaction_type=PAYOUT_TYPE).aggregate(paid=Sum('amount'))['paid'] or Decimal('0')
+    ).quantize(cent)
+    if total + fees + paid_out != opening_total:
+        problems.append(f"money not conserved: {total} + {fees} fees + {paid_out} paid out != {opening_total}")
+
+    # Every payout the provider made was debited, or is held for reconciliation (drained
+    # by a concurrent transfer mid call); none may end up failed, cancelled or open
+    lost = mine.filter(transaction_type=PAYOUT_TYPE).exclude(reference_number='').exclude(
+        status__in=['completed', 'unreconciled']
+    ).count()
+    if lost:
+        problems.append(f"{lost} payouts made by the provider neither debited nor held for reconciliation")
+
+    negative = wallets.filter(balance__lt=0).count()
+    if negative:
+        problems.append(f"{negative} wallets went negative")
+
+    # Every wallet matches its ledger: opening balance plus its completed transactions
+    balances = dict(wallets.values_list('user_id', 'balance'))
+    ledger = net_changes(list(balances))
+    drifted = [user_id for user_id, balance in balances.items() if balance != (OPENING_BALANCE + ledger[user_id]).quantize(cent)]
+    if drifted:
+        problems.append(f"{len(drifted)} wallets disagree with their ledger (users {drifted[:5]})")
+
+    # Log trails: completed rows were logged completed and never cancelled or failed,
+    # and every finished row's latest log agrees with its status
+    unlogged = mine.filter(status='completed').exclude(logs__new_status='completed').count()
+    if unlogged:
+        problems.append(f"{unlogged} completed transactions without a completed log")
+    contradicted = mine.filter(status='completed', logs__new_status__in=['cancelled', 'failed']).distinct().count()
+    if contradicted:
+        problems.append(f"{contradicted} completed transactions also logged cancelled or failed")
+    latest = {}
+    for transaction_id, new_status in TransactionLog.objects.filter(
+        transaction__in=mine.exclude(status='pending')
+    ).order_by('created_at', 'id').values_list('transaction_id', 'new_status'):
+        latest[transaction_id] = new_status
+    mismatched = [
+        transaction_id for transaction_id, status in mine.exclude(status='pending').values_list('id', 'status')
+        if latest.get(transaction_id) != status
+    ]
+    if mismatched:
+        problems.append(f"{len(mismatched)} transactions whose latest log disagrees with their status")
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Hammer TransactionProcessor with concurrent mixed transfers and check money is conserved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallets', type=int, default=21, help='Wallets taking part; the first is the hot one')
+        parser.add_argument('--transfers', type=int, default=4000, help='Operations in total')
+        parser.add_argument('--processes', type=int, default=4, help='Worker processes (0: threads of this one)')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per worker process')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias to run against (migrated first if not the default)')
+        parser.add_argument('--prefix', default='torture_', help='Username prefix of the wallets taking part')
+        parser.add_argument('--keep', action='store_true', help='Keep the users and transactions afterwards')
+
+    def handle(self, *args, **options):
+        alias, prefix = options['database'], options['prefix']
+        if alias not in connections.settings:
+            raise CommandError(f"Unknown database alias {alias}")
+        if options['wallets'] < 3:
+            raise CommandError('Need at least 3 wallets')
+        if alias != DEFAULT_DB_ALIAS:
+            call_command('migrate', database=alias, verbosity=0)
+        use_database(alias)
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            self.stdout.write(f"SQLite {connection.settings_dict['NAME']} in {journal_mode} mode")
+
+        self._setup(prefix, options['wallets'])
+        opening_total = OPENING_BALANCE * options['wallets']
+
+        processes, threads = options['processes'], options['threads']
+        workers = max(processes, 1) * threads
+        per_worker = -(-options['transfers'] // workers)
+        self.stdout.write(
+            f"{per_worker * workers} operations from {max(processes, 1)} process(es) x {threads} threads "
+            f"over {options['wallets']} wallets"
+        )
+
+        started = time.perf_counter()
+        if processes:
+            # Parent connections must not leak into the forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                outcomes = sum(pool.map(
+                    run_process, [alias] * processes, [prefix] * processes,
+                    [process_no * threads for process_no in range(processes)],
+                    [threads] * processes, [per_worker] * processes, [options['seed']] * processes
+                ), Counter())
+            use_database(alias)
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = sum(pool.map(
+                    run_thread, [alias] * threads, [prefix] * threads, range(threads),
+                    [per_worker] * threads, [options['seed']] * threads
+                ), Counter())
+        elapsed = time.perf_counter() - started
+
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"  {outcome:<32} {count:>7}")
+        completed = sum(count for outcome, count in outcomes.items() if outcome.endswith(':completed'))
+        self.stdout.write(
+            f"{completed} transfers completed in {elapsed:.1f}s: {completed / elapsed:.1f} completed/s, "
+            f"{per_worker * workers / elapsed:.1f} operations/s"
+        )
+
+        unreconciled = Transaction.objects.filter(user__username__startswith=prefix, status='unreconciled').count()
+        if unreconciled:
+            self.stdout.write(f"{unreconciled} payouts held for reconciliation (wallet drained during the call)")
+        problems = verify(prefix, opening_total)
+        db_errors = sum(count for outcome, count in outcomes.items() if outcome.endswith(':db_error'))
+        if db_errors:
+            problems.append(f"{db_errors} operations failed with database errors (lock waits over the busy timeout?)")
+        if not options['keep']:
+            self._clean_up(prefix)
+        if problems:
+            raise CommandError('Torture test failed:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('Money conserved, no negative wallets, log trails consistent'))
+
+    def _setup(self, prefix, count):
+        """Fresh users with equally funded wallets in one currency and limits out of the way"""
+        self._clean_up(prefix)
+        for i in range(count):
+            User.objects.create_user(username=f'{prefix}{i:04d}', email=f'{prefix}{i:04d}@example.com')
+        Wallet.objects.filter(user__username__startswith=prefix).update(
+            balance=OPENING_BALANCE, currency='USD', is_active=True,
+            daily_limit=Decimal('9999999.00'), monthly_limit=Decimal('9999999.00')
+        )
+
+    def _clean_up(self, prefix):
+        """Drop the harness users with their transactions, logs and undelivered outbox rows"""
+        transaction_ids = Transaction.objects.filter(user__username__startswith=prefix).values_list(
+            'transaction_id', flat=True
+        )
+        OutboxEvent.objects.filter(aggregate_id__in=[str(value) for value in transaction_ids]).delete()
+        User.objects.filter(username__startswith=prefix).delete()
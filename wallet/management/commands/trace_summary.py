@@ -0,0 +1,99 @@
+# wallet/management/commands/trace_summary.py
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.tracing import read_spans
+from .bench_asgi import percentile
+
+
+def self_times(spans):
+    """span id -> time in ms spent in the span itself, not in its children"""
+    durations = {span['spanId']: (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e6 for span in spans}
+    own = dict(durations)
+    for span in spans:
+        parent = span.get('parentSpanId')
+        if parent in own:
+            own[parent] -= durations[span['spanId']]
+    return durations, {span_id: max(value, 0.0) for span_id, value in own.items()}
+
+
+def stage_breakdown(spans, root_name):
+    """
+    One entry per root_name span: (its duration, {stage: self time in ms}, {stage: calls}).
+
+    Each root's stages are the spans below it, itself included, grouped by name.
+    """
+    durations, own = self_times(spans)
+    children = defaultdict(list)
+    for span in spans:
+        children[span.get('parentSpanId')].append(span)
+
+    breakdowns = []
+    for root in (span for span in spans if span['name'] == root_name):
+        stages, calls = defaultdict(float), defaultdict(int)
+        pending = [root]
+        while pending:
+            span = pending.pop()
+            stages[span['name']] += own[span['spanId']]
+            calls[span['name']] += 1
+            pending.extend(children[span['spanId']])
+        breakdowns.append((durations[root['spanId']], stages, calls))
+    return breakdowns
+
+
+class Command(BaseCommand):
+    help = 'Summarize where time goes, stage by stage, in an OTLP/JSON trace file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='Trace file (default: TRACING_FILE)')
+        parser.add_argument('--root', default='transfer.create', help='Span name whose latency is broken down')
+        parser.add_argument('--percentile', type=float, default=99.0,
+                            help='Tail to attribute: roots at or above this latency percentile')
+
+    def handle(self, *args, **options):
+        path = options['file'] or getattr(settings, 'TRACING_FILE', '')
+        if not path:
+            raise CommandError('No trace file given and TRACING_FILE is not set')
+        try:
+            spans = list(read_spans(path))
+        except FileNotFoundError:
+            raise CommandError(f"No trace file at {path}")
+
+        breakdowns = stage_breakdown(spans, options['root'])
+        if not breakdowns:
+            raise CommandError(f"No '{options['root']}' spans among the {len(spans)} in {path}")
+
+        latencies = sorted(duration for duration, _, _ in breakdowns)
+        cutoff = percentile(latencies, options['percentile'] / 100)
+        tail = [breakdown for breakdown in breakdowns if breakdown[0] >= cutoff]
+        self.stdout.write(
+            f"{len(breakdowns)} {options['root']} spans: p50 {percentile(latencies, 0.5):.2f} ms, "
+            f"p{options['percentile']:g} {cutoff:.2f} ms, max {latencies[-1]:.2f} ms; "
+            f"tail = the {len(tail)} at or above p{options['percentile']:g}"
+        )
+
+        stages = sorted({stage for _, own, _ in breakdowns for stage in own})
+        tail_total = sum(duration for duration, _, _ in tail)
+        rows = []
+        for stage in stages:
+            everywhere = [own.get(stage, 0.0) for _, own, _ in breakdowns]
+            in_tail = [own.get(stage, 0.0) for _, own, _ in tail]
+            rows.append((
+                stage,
+                sum(calls.get(stage, 0) for _, _, calls in breakdowns) / len(breakdowns),
+                sum(everywhere) / len(everywhere),
+                percentile(sorted(everywhere), options['percentile'] / 100),
+                sum(in_tail) / len(in_tail),
+                sum(in_tail) / tail_total if tail_total else 0.0,
+            ))
+
+        self.stdout.write(
+            f"{'stage (self time, ms)':<32} {'calls':>6} {'mean':>9} {'p' + format(options['percentile'], 'g'):>9} "
+            f"{'tail mean':>10} {'tail share':>11}"
+        )
+        for stage, calls, mean, high, tail_mean, share in sorted(rows, key=lambda row: row[4], reverse=True):
+            self.stdout.write(
+                f"{stage:<32} {calls:>6.2f} {mean:>9.2f} {high:>9.2f} {tail_mean:>10.2f} {share:>10.1%}"
+            )
@@ -0,0 +1,215 @@
+# wallet/memory.py
+"""
+tracemalloc snapshots of long-running processes, for finding what grows.
+
+MEMORY_PROFILING starts tracing at startup. MEMORY_SNAPSHOT_INTERVAL > 0
+also dumps a snapshot, with counts of the model instances, querysets and
+serializers alive, every that many seconds to MEMORY_SNAPSHOT_DIR/<pid>/.
+Only the newest MEMORY_SNAPSHOT_KEEP of a process and the newest
+MEMORY_SNAPSHOT_PROCESSES process directories are kept. memory_report
+diffs two dumps; MemoryProfileView reports on the worker serving it.
+"""
+from collections import Counter
+from pathlib import Path
+import gc
+import json
+import logging
+import os
+import resource
+import shutil
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.tracemalloc'
+# Allocations made by tracemalloc itself and the import machinery are noise here
+FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+_lock = threading.Lock()
+_previous = None  # this process's last report snapshot, the baseline for the next one
+_periodic_pid = None
+_fork_hook_registered = False
+
+
+def ensure_tracing():
+    """Start tracemalloc unless it runs already; returns whether it did"""
+    if tracemalloc.is_tracing():
+        return True
+    tracemalloc.start(getattr(settings, 'MEMORY_TRACE_FRAMES', 1))
+    return False
+
+
+def snapshot_root():
+    return Path(getattr(settings, 'MEMORY_SNAPSHOT_DIR', Path(settings.BASE_DIR) / 'memory_snapshots'))
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(FILTERS)
+
+
+def object_counts():
+    """Live model instances by model, querysets (and the rows they cache) and serializers by class"""
+    models, serializers = Counter(), Counter()
+    querysets = cached_rows = 0
+    for obj in gc.get_objects():
+        # type(), not isinstance(): isinstance asks __class__, which evaluates lazy objects
+        kind = type(obj)
+        if issubclass(kind, Model):
+            models[kind._meta.label] += 1
+        elif issubclass(kind, QuerySet):
+            querysets += 1
+            if obj._result_cache is not None:
+                cached_rows += len(obj._result_cache)
+        elif issubclass(kind, BaseSerializer):
+            serializers[kind.__name__] += 1
+    return {
+        'models': dict(models.most_common()),
+        'querysets': querysets,
+        'queryset_cached_rows': cached_rows,
+        'serializers': dict(serializers.most_common()),
+    }
+
+
+def _location(frame):
+    filename = frame.filename
+    root = str(settings.BASE_DIR)
+    if filename.startswith(root):
+        filename = filename[len(root):].lstrip('/')
+    return f'{filename}:{frame.lineno}'
+
+
+def top_allocations(snapshot, limit=20):
+    """Biggest allocation sites by file and line"""
+    return [
+        {'location': _location(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def top_growers(old, new, limit=20):
+    """Allocation sites that grew most from old to new"""
+    growers = [stat for stat in new.compare_to(old, 'lineno') if stat.size_diff > 0]
+    growers.sort(key=lambda stat: stat.size_diff, reverse=True)
+    return [
+        {
+            'location': _location(stat.traceback[0]),
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'size_kb': round(stat.size / 1024, 1),
+            'count_diff': stat.count_diff,
+        }
+        for stat in growers[:limit]
+    ]
+
+
+def process_stats():
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'taken_at': timezone.now().isoformat(),
+        'traced_kb': current // 1024,
+        'traced_peak_kb': peak // 1024,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def save_snapshot(snapshot, stats):
+    """Dump a snapshot and its stats to MEMORY_SNAPSHOT_DIR/<pid>/, then apply the retention limits"""
+    directory = snapshot_root() / str(os.getpid())
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{timezone.now():%Y%m%dT%H%M%S%f}{SNAPSHOT_SUFFIX}'
+    snapshot.dump(str(path))
+    path.with_suffix('.json').write_text(json.dumps(stats, indent=2))
+
+    keep = getattr(settings, 'MEMORY_SNAPSHOT_KEEP', 24)
+    for old in snapshot_paths(directory)[:-keep]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.json').unlink(missing_ok=True)
+    # Recycled workers leave their directories behind; keep the most recently written ones
+    processes = sorted(
+        (entry for entry in snapshot_root().iterdir() if entry.is_dir()), key=lambda entry: entry.stat().st_mtime
+    )
+    for old in processes[:-getattr(settings, 'MEMORY_SNAPSHOT_PROCESSES', 20)]:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def snapshot_paths(directory):
+    """Snapshots in a process directory, oldest first"""
+    return sorted(Path(directory).glob(f'*{SNAPSHOT_SUFFIX}'))
+
+
+def report(limit=20, save=False):
+    """
+    This process's top allocations, growth since its previous report and
+    the objects it holds. Starts tracing on first use, which then has
+    nothing to show yet.
+    """
+    global _previous
+    if not ensure_tracing():
+        return {**process_stats(), 'tracing': 'started'}
+
+    snapshot = take_snapshot()
+    stats = {**process_stats(), 'objects': object_counts()}
+    with _lock:
+        previous, _previous = _previous, snapshot
+    data = {
+        **stats,
+        'tracing': 'running',
+        'top': top_allocations(snapshot, limit),
+        'growth': top_growers(previous, snapshot, limit) if previous is not None else [],
+    }
+    if save:
+        data['saved_to'] = str(save_snapshot(snapshot, stats))
+    return data
+
+
+def reset_snapshots():
+    """Forget the in-process report baseline (tests)"""
+    global _previous
+    with _lock:
+        _previous = None
+
+
+def _periodic(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            path = save_snapshot(take_snapshot(), {**process_stats(), 'objects': object_counts()})
+            logger.debug("Memory snapshot saved to %s", path)
+        except Exception as e:
+            logger.error("Memory snapshot failed: %s", e)
+
+
+def start_periodic():
+    """Dump snapshots every MEMORY_SNAPSHOT_INTERVAL seconds from a daemon thread of this process"""
+    global _periodic_pid
+    interval = getattr(settings, 'MEMORY_SNAPSHOT_INTERVAL', 0)
+    if not interval or _periodic_pid == os.getpid():
+        return
+    _periodic_pid = os.getpid()
+    ensure_tracing()
+    threading.Thread(target=_periodic, args=(interval,), name='memory-snapshots', daemon=True).start()
+
+
+def start_from_settings():
+    """At startup: tracing and periodic snapshots as configured, restarted in forked workers"""
+    global _fork_hook_registered
+    if getattr(settings, 'MEMORY_PROFILING', False):
+        ensure_tracing()
+    start_periodic()
+    if getattr(settings, 'MEMORY_SNAPSHOT_INTERVAL', 0) and not _fork_hook_registered:
+        # Threads do not survive a fork (gunicorn --preload), tracing does
+        os.register_at_fork(after_in_child=start_periodic)
+        _fork_hook_registered = True
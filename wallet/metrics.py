@@ -0,0 +1,106 @@
+# wallet/metrics.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from utils.metrics import COUNT_BUCKETS, SIZE_BUCKETS, Counter, Histogram, maybe_flush, render
+from utils.query_observers import observe
+from utils.resilience import guard_snapshots
+
+LABELS = ['route', 'method']
+
+REQUESTS = Counter('http_requests_total', 'Requests by route, method and status code', [*LABELS, 'status'])
+LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route', LABELS)
+DB_QUERIES = Histogram('http_request_db_queries', 'DB queries per request by route', LABELS, buckets=COUNT_BUCKETS)
+DB_TIME = Histogram('http_request_db_duration_seconds', 'Time in DB queries per request by route', LABELS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size by route', LABELS, buckets=SIZE_BUCKETS)
+
+GAUGE_HELP = {
+    'provider_circuit_open': 'Workers whose circuit breaker for the provider is open',
+    'provider_in_flight': 'Provider calls in flight',
+    'provider_breaker_rejections': 'Calls refused by the open breaker since the workers started',
+    'provider_bulkhead_rejections': 'Calls refused by a full bulkhead since the workers started',
+}
+
+
+def guard_gauges():
+    """utils.resilience guard state of this process as gauge samples"""
+    gauges = {}
+    for snapshot in guard_snapshots():
+        labels = (('provider', snapshot['provider']),)
+        gauges[('provider_circuit_open', labels)] = int(snapshot['state'] == 'open')
+        gauges[('provider_in_flight', labels)] = snapshot['in_flight']
+        gauges[('provider_breaker_rejections', labels)] = snapshot['breaker_rejections']
+        gauges[('provider_bulkhead_rejections', labels)] = snapshot['bulkhead_rejections']
+    return gauges
+
+
+class QueryStats:
+    """execute_wrapper counting the queries of one request and the time they took"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Latency, DB queries and time, response size and status of every request, by route"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        started = time.perf_counter()
+        with observe(stats):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        # observe() also sees the queries the view runs in sync_to_async threads
+        with observe(stats):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, elapsed, stats):
+        # The URL pattern, not the path, so ids do not explode the label space
+        match = getattr(request, 'resolver_match', None)
+        labels = (match.route if match else 'unmatched', request.method)
+        REQUESTS.inc(*labels, str(response.status_code))
+        LATENCY.observe(elapsed, *labels)
+        DB_QUERIES.observe(stats.count, *labels)
+        DB_TIME.observe(stats.duration, *labels)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), *labels)
+
+        # Writes a small file at most every METRICS_FLUSH_SECONDS, so fine on the event loop too
+        maybe_flush(guard_gauges)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs 'Authorization: Bearer <METRICS_TOKEN>' when one is set"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(render(guard_gauges(), GAUGE_HELP), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:45
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendingAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('anomaly_date', models.DateField(blank=True, null=True)),
+                ('anomaly_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('z_score', models.FloatField(default=0.0)),
+                ('period_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('peer_percentile', models.FloatField(default=0.0)),
+                ('peer_group_size', models.PositiveIntegerField(default=0)),
+                ('current_country', models.CharField(blank=True, max_length=100)),
+                ('current_city', models.CharField(blank=True, max_length=100)),
+                ('reasons', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending Review'), ('confirmed', 'Confirmed'), ('dismissed', 'Dismissed')], db_index=True, default='pending', max_length=15)),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_anomalies', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spending_anomalies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Spending Anomaly',
+                'verbose_name_plural': 'Spending Anomalies',
+                'ordering': ['-period_end', '-z_score'],
+                'indexes': [models.Index(fields=['period_end', 'status'], name='wallet_spen_period__39213e_idx')],
+            },
+        ),
+    ]
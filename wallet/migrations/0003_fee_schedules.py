@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:47
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_spendinganomaly'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('version', models.PositiveIntegerField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('is_active', models.BooleanField(default=False)),
+                ('min_fee', models.DecimalField(decimal_places=2, default=Decimal('0.10'), max_digits=8)),
+                ('max_fee', models.DecimalField(decimal_places=2, default=Decimal('50.00'), max_digits=8)),
+            ],
+            options={
+                'verbose_name': 'Fee Schedule',
+                'verbose_name_plural': 'Fee Schedules',
+                'ordering': ['-version'],
+            },
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='fee_plan',
+            field=models.CharField(default='standard', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='FeeRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('transaction_type', models.CharField(choices=[('card_to_wallet', 'Card to Wallet'), ('wallet_to_card', 'Wallet to Card'), ('wallet_to_bkash', 'Wallet to bKash'), ('wallet_to_nagad', 'Wallet to Nagad'), ('bkash_to_wallet', 'bKash to Wallet'), ('nagad_to_wallet', 'Nagad to Wallet'), ('wallet_to_wallet', 'Wallet to Wallet')], max_length=20)),
+                ('currency', models.CharField(blank=True, max_length=3)),
+                ('plan', models.CharField(blank=True, max_length=20)),
+                ('min_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))])),
+                ('rate', models.DecimalField(decimal_places=6, default=Decimal('0.000000'), max_digits=7, validators=[django.core.validators.MinValueValidator(Decimal('0.000000'))])),
+                ('flat_fee', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8)),
+                ('min_fee', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('max_fee', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='wallet.feeschedule')),
+            ],
+            options={
+                'verbose_name': 'Fee Rule',
+                'verbose_name_plural': 'Fee Rules',
+                'ordering': ['transaction_type', 'plan', 'currency', 'min_amount'],
+                'unique_together': {('schedule', 'transaction_type', 'currency', 'plan', 'min_amount')},
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:08
+
+from decimal import Decimal
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0005_outbox_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('transaction_type', models.CharField(choices=[('card_to_wallet', 'Card to Wallet'), ('wallet_to_card', 'Wallet to Card'), ('wallet_to_bkash', 'Wallet to bKash'), ('wallet_to_nagad', 'Wallet to Nagad'), ('bkash_to_wallet', 'bKash to Wallet'), ('nagad_to_wallet', 'Nagad to Wallet'), ('wallet_to_wallet', 'Wallet to Wallet')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('mobile_number', models.CharField(blank=True, max_length=15)),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('once', 'Once'), ('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='once', max_length=10)),
+                ('start_at', models.DateTimeField()),
+                ('end_at', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('card', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_transfers', to='wallet.card')),
+                ('recipient_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='incoming_scheduled_transfers', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Scheduled Transfer',
+                'verbose_name_plural': 'Scheduled Transfers',
+                'ordering': ['next_run_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduledTransferRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_for', models.DateTimeField()),
+                ('status', models.CharField(choices=[('claimed', 'Claimed'), ('completed', 'Completed'), ('failed', 'Failed')], default='claimed', max_length=10)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='wallet.scheduledtransfer')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_runs', to='wallet.transaction')),
+            ],
+            options={
+                'verbose_name': 'Scheduled Transfer Run',
+                'verbose_name_plural': 'Scheduled Transfer Runs',
+                'ordering': ['-scheduled_for'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledtransferrun',
+            constraint=models.UniqueConstraint(fields=('schedule', 'scheduled_for'), name='unique_schedule_slot'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledtransfer',
+            index=models.Index(fields=['is_active', 'next_run_at'], name='wallet_sche_is_acti_8e4708_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:13
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0006_scheduled_transfers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisbursementJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('source_file', models.FileField(upload_to='disbursements/%Y/%m/')),
+                ('original_filename', models.CharField(blank=True, max_length=255)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('parsing', 'Parsing'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=10)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('valid_legs', models.PositiveIntegerField(default=0)),
+                ('invalid_legs', models.PositiveIntegerField(default=0)),
+                ('processed_legs', models.PositiveIntegerField(default=0)),
+                ('succeeded_legs', models.PositiveIntegerField(default=0)),
+                ('failed_legs', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('total_fee', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('error', models.TextField(blank=True)),
+                ('lease_owner', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disbursement_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Disbursement Job',
+                'verbose_name_plural': 'Disbursement Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DisbursementLeg',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.PositiveIntegerField()),
+                ('recipient', models.CharField(max_length=150)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('fee', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('invalid', 'Invalid')], default='pending', max_length=10)),
+                ('message', models.TextField(blank=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legs', to='wallet.disbursementjob')),
+                ('recipient_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='disbursement_legs', to=settings.AUTH_USER_MODEL)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='disbursement_legs', to='wallet.transaction')),
+            ],
+            options={
+                'verbose_name': 'Disbursement Leg',
+                'verbose_name_plural': 'Disbursement Legs',
+                'ordering': ['job', 'row_number'],
+                'indexes': [models.Index(fields=['job', 'status', 'row_number'], name='wallet_disb_job_id_c1daaf_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='disbursementleg',
+            constraint=models.UniqueConstraint(fields=('job', 'row_number'), name='unique_disbursement_row'),
+        ),
+        migrations.AddIndex(
+            model_name='disbursementjob',
+            index=models.Index(fields=['status', 'created_at'], name='wallet_disb_status_5aed09_idx'),
+        ),
+    ]
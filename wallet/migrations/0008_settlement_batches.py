@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:15
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0007_disbursement_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('provider', models.CharField(choices=[('bkash', 'bKash'), ('nagad', 'Nagad'), ('card', 'Card')], max_length=10)),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('status', models.CharField(choices=[('generating', 'Generating'), ('generated', 'Generated'), ('failed', 'Failed')], default='generating', max_length=10)),
+                ('file_path', models.CharField(blank=True, max_length=500)),
+                ('checksum', models.CharField(blank=True, max_length=64)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('total_fee', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('error', models.TextField(blank=True)),
+                ('generated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Settlement Batch',
+                'verbose_name_plural': 'Settlement Batches',
+                'ordering': ['-window_end', 'provider'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='settlementbatch',
+            constraint=models.UniqueConstraint(fields=('provider', 'window_start', 'window_end'), name='unique_settlement_window'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='settlement_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='wallet.settlementbatch'),
+        ),
+    ]
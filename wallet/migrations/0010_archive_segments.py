@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:27
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0009_transaction_retries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('segment_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('path', models.CharField(help_text='File path without the .seg/.blk/.uidx/.tidx suffix', max_length=500)),
+                ('period', models.DateField(help_text='First day of the month the transactions were created in')),
+                ('status', models.CharField(choices=[('sealed', 'Sealed'), ('complete', 'Complete')], default='sealed', max_length=10)),
+                ('oldest_created_at', models.DateTimeField()),
+                ('newest_created_at', models.DateTimeField()),
+                ('min_user_id', models.PositiveIntegerField()),
+                ('max_user_id', models.PositiveIntegerField()),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('log_count', models.PositiveIntegerField(default=0)),
+                ('checksum', models.CharField(max_length=64)),
+            ],
+            options={
+                'verbose_name': 'Archive Segment',
+                'verbose_name_plural': 'Archive Segments',
+                'ordering': ['-newest_created_at'],
+                'indexes': [models.Index(fields=['min_user_id', 'max_user_id'], name='wallet_arch_min_use_770f69_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_log_users(apps, schema_editor):
+    """Copy each log's transaction owner in one set-based UPDATE"""
+    Transaction = apps.get_model('wallet', 'Transaction')
+    TransactionLog = apps.get_model('wallet', 'TransactionLog')
+    TransactionLog.objects.filter(user__isnull=True).update(
+        user_id=models.Subquery(
+            Transaction.objects.filter(id=models.OuterRef('transaction_id')).values('user_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0010_archive_segments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionLogPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month', unique=True)),
+                ('table_name', models.CharField(max_length=63, unique=True)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Transaction Log Partition',
+                'verbose_name_plural': 'Transaction Log Partitions',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transactionlog',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transaction_logs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transactionlog',
+            index=models.Index(fields=['user', '-created_at'], name='wallet_tran_user_id_c0d254_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionlog',
+            index=models.Index(fields=['created_at'], name='wallet_tran_created_a087a0_idx'),
+        ),
+        migrations.RunPython(backfill_log_users, migrations.RunPython.noop),
+    ]
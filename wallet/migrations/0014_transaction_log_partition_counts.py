@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_existing_partitions(apps, schema_editor):
+    """Per-user counts for partitions rolled before the counts were kept"""
+    TransactionLogPartition = apps.get_model('wallet', 'TransactionLogPartition')
+    TransactionLogPartitionCount = apps.get_model('wallet', 'TransactionLogPartitionCount')
+    quote = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for partition in TransactionLogPartition.objects.all():
+            cursor.execute(
+                f"INSERT INTO {quote(TransactionLogPartitionCount._meta.db_table)} "
+                f"(partition_id, user_pk, previous_status, new_status, row_count) "
+                f"SELECT %s, user_id, previous_status, new_status, COUNT(*) FROM {quote(partition.table_name)} "
+                f"GROUP BY user_id, previous_status, new_status",
+                [partition.id]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0013_transaction_completed_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionLogPartitionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_pk', models.IntegerField(null=True)),
+                ('previous_status', models.CharField(max_length=15)),
+                ('new_status', models.CharField(max_length=15)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('partition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counts', to='wallet.transactionlogpartition')),
+            ],
+            options={
+                'verbose_name': 'Transaction Log Partition Count',
+                'verbose_name_plural': 'Transaction Log Partition Counts',
+                'indexes': [models.Index(fields=['user_pk', 'partition'], name='wallet_tran_user_pk_120619_idx')],
+            },
+        ),
+        migrations.RunPython(count_existing_partitions, migrations.RunPython.noop),
+    ]
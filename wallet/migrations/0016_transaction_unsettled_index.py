@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0015_transaction_unreconciled_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('settlement_batch__isnull', True), ('status', 'completed')), fields=['transaction_type', 'completed_at'], name='wallet_txn_unsettled_idx'),
+        ),
+    ]
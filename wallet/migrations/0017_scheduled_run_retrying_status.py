@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0016_transaction_unsettled_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scheduledtransferrun',
+            name='status',
+            field=models.CharField(choices=[('claimed', 'Claimed'), ('retrying', 'Retrying'), ('completed', 'Completed'), ('failed', 'Failed')], default='claimed', max_length=10),
+        ),
+    ]
@@ -1,9 +1,12 @@
 # wallet/models.py
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+import calendar
+import random
 import uuid
+from datetime import timedelta
 from decimal import Decimal
 
 
@@ -67,6 +70,7 @@ class Wallet(TimeStampedModel):
         validators=[MinValueValidator(Decimal('0.00'))]
     )
     currency = models.CharField(max_length=3, default='USD')
+    fee_plan = models.CharField(max_length=20, default='standard')
     is_active = models.BooleanField(default=True)
     daily_limit = models.DecimalField(
         max_digits=10,
@@ -91,18 +95,30 @@ class Wallet(TimeStampedModel):
         return self.balance >= amount and self.is_active
 
     def debit(self, amount):
-        """Debit amount from wallet"""
-        if not self.can_debit(amount):
+        """
+        Debit amount from wallet.
+
+        One conditional UPDATE on the stored balance, not a read-modify-save
+        of this instance, so concurrent transfers can neither lose each
+        other's writes nor overdraw the wallet.
+        """
+        from django.utils import timezone
+        updated = Wallet.objects.filter(pk=self.pk, is_active=True, balance__gte=amount).update(
+            balance=models.F('balance') - amount, updated_at=timezone.now()
+        )
+        if not updated:
             raise ValidationError("Insufficient balance or inactive wallet")
-        self.balance -= amount
-        self.save()
+        self.refresh_from_db(fields=['balance', 'updated_at'])
 
     def credit(self, amount):
-        """Credit amount to wallet"""
-        if not self.is_active:
+        """Credit amount to wallet (atomic UPDATE, see debit)"""
+        from django.utils import timezone
+        updated = Wallet.objects.filter(pk=self.pk, is_active=True).update(
+            balance=models.F('balance') + amount, updated_at=timezone.now()
+        )
+        if not updated:
             raise ValidationError("Cannot credit to inactive wallet")
-        self.balance += amount
-        self.save()
+        self.refresh_from_db(fields=['balance', 'updated_at'])
 
 
 class Card(TimeStampedModel):
@@ -195,12 +211,22 @@ class Transaction(TimeStampedModel):
         ('wallet_to_wallet', 'Wallet to Wallet'),
     ]
 
+    # Types that move money out of / into the owner's wallet
+    OUTGOING_TYPES = ['wallet_to_card', 'wallet_to_bkash', 'wallet_to_nagad', 'wallet_to_wallet']
+    INCOMING_TYPES = ['card_to_wallet', 'bkash_to_wallet', 'nagad_to_wallet']
+    # Not finished yet: may still be processed
+    OPEN_STATUSES = ['pending', 'processing', 'retrying']
+    # Open and not claimed: 'processing' may have a provider call in flight
+    CANCELLABLE_STATUSES = ['pending', 'retrying']
+
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('processing', 'Processing'),
+        ('retrying', 'Retrying'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
+        ('unreconciled', 'Needs reconciliation'),
     ]
 
     transaction_id = models.UUIDField(
@@ -266,6 +292,24 @@ class Transaction(TimeStampedModel):
     completed_at = models.DateTimeField(null=True, blank=True)
     failed_at = models.DateTimeField(null=True, blank=True)
 
+    # Provider retries (see retry_transactions)
+    attempt_count = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    # Currency conversion (wallet-to-wallet across currencies)
+    fx_rate = models.DecimalField(max_digits=18, decimal_places=8, null=True, blank=True)
+    converted_amount = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    converted_currency = models.CharField(max_length=3, blank=True)
+
+    # Provider settlement (outgoing provider transfers only)
+    settlement_batch = models.ForeignKey(
+        'SettlementBatch',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transactions'
+    )
+
     # Metadata
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
@@ -278,11 +322,22 @@ class Transaction(TimeStampedModel):
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['transaction_type', '-created_at']),
+            models.Index(fields=['transaction_type', '-completed_at']),
+            # Settlement carry-over: only the few completed rows not settled yet
+            models.Index(
+                fields=['transaction_type', 'completed_at'], name='wallet_txn_unsettled_idx',
+                condition=models.Q(status='completed', settlement_batch__isnull=True)
+            ),
         ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.amount} - {self.get_status_display()}"
 
+    def save(self, *args, **kwargs):
+        # Keep the row, its status log and its outbox event in one DB transaction
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def total_amount(self):
         """Total amount including fees"""
@@ -290,13 +345,75 @@ class Transaction(TimeStampedModel):
 
     def can_cancel(self):
         """Check if transaction can be cancelled"""
-        return self.status in ['pending', 'processing']
+        return self.status in self.CANCELLABLE_STATUSES
+
+    def cancel(self, changed_by=None, reason='Cancelled by user'):
+        """
+        Cancel the transaction if it is still pending or retrying; False if it was not.
+
+        The status is switched by a conditional UPDATE, so a cancel racing
+        the processor either wins before any money moves or loses cleanly.
+        A 'processing' row is refused: its provider call may be in flight.
+        """
+        from django.utils import timezone
+        from utils.outbox import record_transaction_event
+
+        with db_transaction.atomic():
+            previous_status = Transaction.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+            if previous_status not in self.CANCELLABLE_STATUSES or not Transaction.objects.filter(
+                pk=self.pk, status=previous_status
+            ).update(status='cancelled', next_attempt_at=None, updated_at=timezone.now()):
+                return False
+            self.status = 'cancelled'
+            self.next_attempt_at = None
+            record_transaction_event(self, previous_status)
+            ScheduledTransferRun.settle(self)
+            TransactionLog.objects.create(
+                transaction=self,
+                previous_status=previous_status,
+                new_status='cancelled',
+                reason=reason,
+                changed_by=changed_by
+            )
+        return True
+
+    def claim(self, reason='Claimed for the provider call'):
+        """
+        Move a pending or retrying transaction to 'processing' before its
+        provider is called; False if it was no longer either.
+
+        Commits on its own (call it outside atomic blocks), so a cancel sees
+        the claim and refuses the row while the provider call is in flight.
+        """
+        from django.utils import timezone
+        from utils.outbox import record_transaction_event
+
+        with db_transaction.atomic():
+            previous_status = self.status
+            now = timezone.now()
+            if previous_status not in self.CANCELLABLE_STATUSES or not Transaction.objects.filter(
+                pk=self.pk, status=previous_status
+            ).update(status='processing', next_attempt_at=None, updated_at=now):
+                self.status = Transaction.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+                return False
+            self.status = 'processing'
+            self.next_attempt_at = None
+            self.updated_at = now
+            record_transaction_event(self, previous_status)
+            TransactionLog.objects.create(
+                transaction=self,
+                previous_status=previous_status,
+                new_status='processing',
+                reason=reason
+            )
+        return True
 
     def mark_completed(self):
         """Mark transaction as completed"""
         from django.utils import timezone
         self.status = 'completed'
         self.completed_at = timezone.now()
+        self.next_attempt_at = None
         self.save()
 
     def mark_failed(self, reason=None):
@@ -304,10 +421,40 @@ class Transaction(TimeStampedModel):
         from django.utils import timezone
         self.status = 'failed'
         self.failed_at = timezone.now()
+        self.next_attempt_at = None
         if reason:
             self.description = f"{self.description}\nFailure reason: {reason}"
         self.save()
 
+    def mark_unreconciled(self, reason=None):
+        """
+        The provider moved the money but the wallet side could not be
+        applied: kept out of retries and cancels for manual reconciliation.
+        """
+        self.status = 'unreconciled'
+        self.next_attempt_at = None
+        if reason:
+            self.description = f"{self.description}\nNeeds reconciliation: {reason}"
+        self.save()
+
+    def schedule_retry(self, reason=None):
+        """Queue another provider attempt with exponential backoff; False once attempts are exhausted"""
+        from django.conf import settings
+        from django.utils import timezone
+        if self.attempt_count >= getattr(settings, 'TRANSACTION_RETRY_MAX_ATTEMPTS', 5):
+            return False
+
+        delay = min(
+            getattr(settings, 'TRANSACTION_RETRY_MAX_BACKOFF_SECONDS', 600),
+            getattr(settings, 'TRANSACTION_RETRY_BACKOFF_SECONDS', 5) * 2 ** (self.attempt_count - 1)
+        )
+        self.status = 'retrying'
+        self.next_attempt_at = timezone.now() + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+        if reason:
+            self.description = f"{self.description}\nAttempt {self.attempt_count} failed: {reason}"
+        self.save()
+        return True
+
 
 class TransactionLog(TimeStampedModel):
     """Log of transaction status changes"""
@@ -325,11 +472,585 @@ class TransactionLog(TimeStampedModel):
         null=True,
         blank=True
     )
+    # Owner of the transaction, denormalised so history reads skip the join
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='transaction_logs'
+    )
 
     class Meta:
         verbose_name = 'Transaction Log'
         verbose_name_plural = 'Transaction Logs'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction.transaction_id} - {self.previous_status} to {self.new_status}"
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.transaction.user_id
+        super().save(*args, **kwargs)
+
+
+class TransactionLogPartition(models.Model):
+    """A closed month of TransactionLog rows moved to its own table (see partition_transaction_logs)"""
+    month = models.DateField(unique=True, help_text='First day of the month')
+    table_name = models.CharField(max_length=63, unique=True)
+    row_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Transaction Log Partition'
+        verbose_name_plural = 'Transaction Log Partitions'
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.table_name} ({self.row_count} rows)"
+
+
+class TransactionLogPartitionCount(models.Model):
+    """
+    Rows of one user and status change in a partition, counted when the
+    month is rolled, so listing logs needs no COUNT on the partitions
+    """
+    partition = models.ForeignKey(
+        TransactionLogPartition,
+        on_delete=models.CASCADE,
+        related_name='counts'
+    )
+    user_pk = models.IntegerField(null=True)
+    previous_status = models.CharField(max_length=15)
+    new_status = models.CharField(max_length=15)
+    row_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Transaction Log Partition Count'
+        verbose_name_plural = 'Transaction Log Partition Counts'
+        indexes = [
+            models.Index(fields=['user_pk', 'partition']),
+        ]
+
+
+class ExchangeRate(TimeStampedModel):
+    """FX rate quote: 1 base_currency = rate quote_currency from valid_from on"""
+    base_currency = models.CharField(max_length=3)
+    quote_currency = models.CharField(max_length=3)
+    rate = models.DecimalField(
+        max_digits=18,
+        decimal_places=8,
+        validators=[MinValueValidator(Decimal('0.00000001'))]
+    )
+    source = models.CharField(max_length=50, default='manual')
+    valid_from = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Exchange Rate'
+        verbose_name_plural = 'Exchange Rates'
+        ordering = ['-valid_from']
+        indexes = [
+            models.Index(fields=['base_currency', 'quote_currency', '-valid_from']),
+        ]
+
+    def __str__(self):
+        return f"1 {self.base_currency} = {self.rate} {self.quote_currency} ({self.valid_from})"
+
+
+class FeeSchedule(TimeStampedModel):
+    """Versioned set of fee rules; the highest active version is in force"""
+    version = models.PositiveIntegerField(unique=True)
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=False)
+    min_fee = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.10'))
+    max_fee = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('50.00'))
+
+    class Meta:
+        verbose_name = 'Fee Schedule'
+        verbose_name_plural = 'Fee Schedules'
+        ordering = ['-version']
+
+    def __str__(self):
+        return f"v{self.version} - {self.name}"
+
+
+class FeeRule(TimeStampedModel):
+    """
+    Fee for one amount band of a transaction type.
+
+    Blank currency/plan act as wildcards; the band starts at min_amount and
+    runs until the next rule's min_amount.
+    """
+    schedule = models.ForeignKey(
+        FeeSchedule,
+        on_delete=models.CASCADE,
+        related_name='rules'
+    )
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    currency = models.CharField(max_length=3, blank=True)
+    plan = models.CharField(max_length=20, blank=True)
+    min_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    rate = models.DecimalField(
+        max_digits=7,
+        decimal_places=6,
+        default=Decimal('0.000000'),
+        validators=[MinValueValidator(Decimal('0.000000'))]
+    )
+    flat_fee = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    min_fee = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    max_fee = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Fee Rule'
+        verbose_name_plural = 'Fee Rules'
+        ordering = ['transaction_type', 'plan', 'currency', 'min_amount']
+        unique_together = ['schedule', 'transaction_type', 'currency', 'plan', 'min_amount']
+
+    def __str__(self):
+        return f"{self.transaction_type} from {self.min_amount}: {self.rate} + {self.flat_fee}"
+
+
+class SpendingAnomaly(TimeStampedModel):
+    """Users flagged for review by the offline spending-anomaly job"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending Review'),
+        ('confirmed', 'Confirmed'),
+        ('dismissed', 'Dismissed'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='spending_anomalies'
+    )
+    period_start = models.DateField()
+    period_end = models.DateField()
+    anomaly_date = models.DateField(null=True, blank=True)
+    anomaly_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    z_score = models.FloatField(default=0.0)
+    period_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    peer_percentile = models.FloatField(default=0.0)
+    peer_group_size = models.PositiveIntegerField(default=0)
+    current_country = models.CharField(max_length=100, blank=True)
+    current_city = models.CharField(max_length=100, blank=True)
+    reasons = models.CharField(max_length=100)
+    status = models.CharField(
+        max_length=15,
+        choices=STATUS_CHOICES,
+        default='pending',
+        db_index=True
+    )
+    reviewed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reviewed_anomalies'
+    )
+
+    class Meta:
+        verbose_name = 'Spending Anomaly'
+        verbose_name_plural = 'Spending Anomalies'
+        ordering = ['-period_end', '-z_score']
+        indexes = [
+            models.Index(fields=['period_end', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.reasons} ({self.period_start} to {self.period_end})"
+
+
+class OutboxEvent(models.Model):
+    """
+    Transaction state change waiting for delivery to downstream sinks.
+
+    Rows are written in the same DB transaction as the change and read in
+    id order by the dispatch_outbox command.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('dead', 'Dead'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=50)
+    aggregate_id = models.CharField(max_length=64, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['status', 'delivered_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.event_type} {self.aggregate_id} ({self.status})"
+
+
+class ScheduledTransfer(TimeStampedModel):
+    """One-off or recurring transfer executed by run_scheduled_transfers"""
+    FREQUENCY_CHOICES = [
+        ('once', 'Once'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='scheduled_transfers'
+    )
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    card = models.ForeignKey(
+        Card,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scheduled_transfers'
+    )
+    recipient_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='incoming_scheduled_transfers'
+    )
+    mobile_number = models.CharField(max_length=15, blank=True)
+    description = models.TextField(blank=True)
+
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='once')
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    run_count = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = 'Scheduled Transfer'
+        verbose_name_plural = 'Scheduled Transfers'
+        ordering = ['next_run_at']
+        indexes = [
+            models.Index(fields=['is_active', 'next_run_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_transaction_type_display()} {self.amount} ({self.frequency})"
+
+    def next_occurrence(self, after):
+        """First slot strictly after `after`, or None when the schedule is finished"""
+        if self.frequency == 'once':
+            return None
+
+        slot = self.start_at
+        if slot <= after:
+            if self.frequency == 'daily':
+                slot += timedelta(days=(after - slot).days + 1)
+            elif self.frequency == 'weekly':
+                slot += timedelta(weeks=(after - slot).days // 7 + 1)
+            else:
+                # Months are counted from start_at so the 31st stays the 31st when it exists
+                months = (after.year - slot.year) * 12 + after.month - slot.month
+                slot = self._add_months(months)
+                if slot <= after:
+                    slot = self._add_months(months + 1)
+
+        if self.end_at and slot > self.end_at:
+            return None
+        return slot
+
+    def _add_months(self, months):
+        month_index = self.start_at.month - 1 + months
+        year, month = self.start_at.year + month_index // 12, month_index % 12 + 1
+        day = min(self.start_at.day, calendar.monthrange(year, month)[1])
+        return self.start_at.replace(year=year, month=month, day=day)
+
+
+class ScheduledTransferRun(models.Model):
+    """
+    One execution slot of a ScheduledTransfer.
+
+    The unique (schedule, scheduled_for) pair is the idempotency key: a
+    slot can be claimed once, so retries and parallel workers never
+    execute it twice.
+    """
+    # user_agent of the transactions runs create, so only their status changes look for runs
+    USER_AGENT = 'scheduler'
+
+    STATUS_CHOICES = [
+        ('claimed', 'Claimed'),
+        ('retrying', 'Retrying'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    schedule = models.ForeignKey(
+        ScheduledTransfer,
+        on_delete=models.CASCADE,
+        related_name='runs'
+    )
+    scheduled_for = models.DateTimeField()
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scheduled_runs'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='claimed')
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Scheduled Transfer Run'
+        verbose_name_plural = 'Scheduled Transfer Runs'
+        ordering = ['-scheduled_for']
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'scheduled_for'], name='unique_schedule_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.schedule_id} @ {self.scheduled_for} ({self.status})"
+
+    @staticmethod
+    def status_for(transaction_status):
+        """Run status for its transfer's status: 'retrying' while the transfer is still open"""
+        if transaction_status == 'completed':
+            return 'completed'
+        return 'retrying' if transaction_status in Transaction.OPEN_STATUSES else 'failed'
+
+    @classmethod
+    def settle(cls, transaction_obj):
+        """Give runs left 'retrying' their transfer's final outcome"""
+        status = cls.status_for(transaction_obj.status)
+        if status != 'retrying' and transaction_obj.user_agent == cls.USER_AGENT:
+            cls.objects.filter(transaction=transaction_obj, status='retrying').update(
+                status=status, message=f'Transaction {transaction_obj.status} after retrying'
+            )
+
+
+class DisbursementJob(TimeStampedModel):
+    """Bulk payout from an uploaded CSV, executed in chunks by run_disbursements"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('parsing', 'Parsing'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='disbursement_jobs'
+    )
+    source_file = models.FileField(upload_to='disbursements/%Y/%m/')
+    original_filename = models.CharField(max_length=255, blank=True)
+    description = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+
+    total_rows = models.PositiveIntegerField(default=0)
+    valid_legs = models.PositiveIntegerField(default=0)
+    invalid_legs = models.PositiveIntegerField(default=0)
+    processed_legs = models.PositiveIntegerField(default=0)
+    succeeded_legs = models.PositiveIntegerField(default=0)
+    failed_legs = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    total_fee = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    error = models.TextField(blank=True)
+
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Disbursement Job'
+        verbose_name_plural = 'Disbursement Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} - {self.user.username} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of valid legs processed"""
+        if not self.valid_legs:
+            return 100.0 if self.status in ['completed', 'failed', 'cancelled'] else 0.0
+        return round(100.0 * self.processed_legs / self.valid_legs, 1)
+
+
+class DisbursementLeg(models.Model):
+    """One CSV row of a disbursement job"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('invalid', 'Invalid'),
+    ]
+
+    job = models.ForeignKey(
+        DisbursementJob,
+        on_delete=models.CASCADE,
+        related_name='legs'
+    )
+    row_number = models.PositiveIntegerField()
+    recipient = models.CharField(max_length=150)
+    recipient_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='disbursement_legs'
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    fee = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    description = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    message = models.TextField(blank=True)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='disbursement_legs'
+    )
+
+    class Meta:
+        verbose_name = 'Disbursement Leg'
+        verbose_name_plural = 'Disbursement Legs'
+        ordering = ['job', 'row_number']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'row_number'], name='unique_disbursement_row'),
+        ]
+        indexes = [
+            models.Index(fields=['job', 'status', 'row_number']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} row {self.row_number} - {self.recipient} ({self.status})"
+
+
+class SettlementBatch(TimeStampedModel):
+    """Provider settlement file covering one cut-off window"""
+    PROVIDER_CHOICES = [
+        ('bkash', 'bKash'),
+        ('nagad', 'Nagad'),
+        ('card', 'Card'),
+    ]
+    STATUS_CHOICES = [
+        ('generating', 'Generating'),
+        ('generated', 'Generated'),
+        ('failed', 'Failed'),
+    ]
+
+    batch_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    provider = models.CharField(max_length=10, choices=PROVIDER_CHOICES)
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='generating')
+    file_path = models.CharField(max_length=500, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
+    transaction_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    total_fee = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    error = models.TextField(blank=True)
+    generated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Settlement Batch'
+        verbose_name_plural = 'Settlement Batches'
+        ordering = ['-window_end', 'provider']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'window_start', 'window_end'], name='unique_settlement_window'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_provider_display()} {self.window_start:%Y-%m-%d %H:%M} - {self.window_end:%Y-%m-%d %H:%M}"
+
+
+class ArchiveSegment(TimeStampedModel):
+    """Compressed, append-only file of archived transactions (see archive_transactions)"""
+    STATUS_CHOICES = [
+        ('sealed', 'Sealed'),  # files written, live rows still being deleted
+        ('complete', 'Complete'),
+    ]
+
+    segment_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    path = models.CharField(max_length=500, help_text='File path without the .seg/.blk/.uidx/.tidx suffix')
+    period = models.DateField(help_text='First day of the month the transactions were created in')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='sealed')
+    oldest_created_at = models.DateTimeField()
+    newest_created_at = models.DateTimeField()
+    min_user_id = models.PositiveIntegerField()
+    max_user_id = models.PositiveIntegerField()
+    transaction_count = models.PositiveIntegerField(default=0)
+    log_count = models.PositiveIntegerField(default=0)
+    checksum = models.CharField(max_length=64)
+
+    class Meta:
+        verbose_name = 'Archive Segment'
+        verbose_name_plural = 'Archive Segments'
+        ordering = ['-newest_created_at']
+        indexes = [
+            models.Index(fields=['min_user_id', 'max_user_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.period:%Y-%m} ({self.transaction_count} transactions)"
+
+
+class BalanceSnapshot(TimeStampedModel):
+    """A wallet's closing balance for one day (see snapshot_balances)"""
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots'
+    )
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name = 'Balance Snapshot'
+        verbose_name_plural = 'Balance Snapshots'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'date'], name='unique_balance_snapshot'),
+        ]
 
     def __str__(self):
-        return f"{self.transaction.transaction_id} - {self.previous_status} to {self.new_status}"
\ No newline at end of file
+        return f"{self.wallet.user.username} {self.date}: {self.currency} {self.balance}"
@@ -0,0 +1,267 @@
+# wallet/partitions.py
+import logging
+import threading
+
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .models import Transaction, TransactionLog, TransactionLogPartition, TransactionLogPartitionCount
+
+logger = logging.getLogger(__name__)
+
+# Shadow-table models live in their own registry so they never take part in
+# cascades or migrations of the real app
+partition_apps = Apps()
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def month_start(value):
+    """First instant of value's month in the current time zone"""
+    value = timezone.localtime(value)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def partition_table(month):
+    return f'wallet_txlog_{month:%Y%m}'
+
+
+def partition_model(table_name):
+    """Unmanaged model for one monthly TransactionLog shadow table"""
+    model = _models.get(table_name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(table_name)
+        if model is None:
+            suffix = table_name.rsplit('_', 1)[-1]
+            meta = type('Meta', (), {
+                'app_label': 'wallet',
+                'apps': partition_apps,
+                'db_table': table_name,
+                'managed': False,
+                'indexes': [models.Index(fields=['user_pk', '-created_at'], name=f'txlog_{suffix}_user')],
+            })
+            model = type(f'TransactionLogPartition{suffix}', (models.Model,), {
+                '__module__': __name__,
+                'Meta': meta,
+                'id': models.BigIntegerField(primary_key=True),
+                # Plain columns: the transaction may since have been archived
+                'transaction_pk': models.BigIntegerField(db_column='transaction_id', db_index=True),
+                'transaction_uuid': models.UUIDField(),
+                'user_pk': models.IntegerField(db_column='user_id', null=True),
+                'previous_status': models.CharField(max_length=15),
+                'new_status': models.CharField(max_length=15),
+                'reason': models.TextField(blank=True),
+                'changed_by_pk': models.IntegerField(db_column='changed_by_id', null=True),
+                'created_at': models.DateTimeField(),
+                'updated_at': models.DateTimeField(),
+            })
+            _models[table_name] = model
+    return model
+
+
+def _run_ddl(action, model):
+    """
+    Create or drop a shadow table inside the current DB transaction.
+
+    SQLite's schema editor refuses to run inside atomic(), so the SQL is
+    collected and executed on a plain cursor.
+    """
+    editor = connection.schema_editor(collect_sql=True)
+    editor.deferred_sql = []  # normally set up by __enter__
+    getattr(editor, action)(model)
+    with connection.cursor() as cursor:
+        for sql in editor.collected_sql + [str(statement) for statement in editor.deferred_sql]:
+            cursor.execute(sql.rstrip(';'))
+
+
+def roll_month(month):
+    """
+    Move one closed month of TransactionLog rows into its shadow table.
+
+    One INSERT ... SELECT and one range DELETE in a single DB transaction,
+    which also stores the partition's per-user counts.
+    """
+    table = partition_table(month)
+    model = partition_model(table)
+    start, end = (connection.ops.adapt_datetimefield_value(value) for value in (month, add_months(month, 1)))
+    quote = connection.ops.quote_name
+
+    with transaction.atomic():
+        partition, created = TransactionLogPartition.objects.get_or_create(
+            month=month.date(), defaults={'table_name': table}
+        )
+        if created:
+            _run_ddl('create_model', model)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(table)} (id, transaction_id, transaction_uuid, user_id, previous_status, "
+                f"new_status, reason, changed_by_id, created_at, updated_at) "
+                f"SELECT l.id, l.transaction_id, t.transaction_id, COALESCE(l.user_id, t.user_id), l.previous_status, "
+                f"l.new_status, l.reason, l.changed_by_id, l.created_at, l.updated_at "
+                f"FROM {quote(TransactionLog._meta.db_table)} l "
+                f"JOIN {quote(Transaction._meta.db_table)} t ON t.id = l.transaction_id "
+                f"WHERE l.created_at >= %s AND l.created_at < %s",
+                [start, end]
+            )
+            moved = cursor.rowcount
+        TransactionLog.objects.filter(created_at__gte=month, created_at__lt=add_months(month, 1)).delete()
+        TransactionLogPartition.objects.filter(id=partition.id).update(row_count=models.F('row_count') + moved)
+        count_partition(partition)
+
+    logger.info("Moved %s transaction logs into %s", moved, table)
+    return moved
+
+
+def count_partition(partition):
+    """(Re)count a partition's rows per user and status change, for PartitionedLogHistory"""
+    quote = connection.ops.quote_name
+    TransactionLogPartitionCount.objects.filter(partition=partition).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(TransactionLogPartitionCount._meta.db_table)} "
+            f"(partition_id, user_pk, previous_status, new_status, row_count) "
+            f"SELECT %s, user_id, previous_status, new_status, COUNT(*) FROM {quote(partition.table_name)} "
+            f"GROUP BY user_id, previous_status, new_status",
+            [partition.id]
+        )
+
+
+def roll_closed_months(now=None):
+    """Move every month before the current one out of the hot table; returns {month: rows}"""
+    current = month_start(now or timezone.now())
+    oldest = TransactionLog.objects.filter(created_at__lt=current).order_by('created_at').values_list(
+        'created_at', flat=True
+    ).first()
+    moved = {}
+    if oldest is None:
+        return moved
+
+    month = month_start(oldest)
+    while month < current:
+        if TransactionLog.objects.filter(created_at__gte=month, created_at__lt=add_months(month, 1)).exists():
+            moved[month.date()] = roll_month(month)
+        month = add_months(month, 1)
+    return moved
+
+
+def drop_expired(retention_months=None, now=None):
+    """Retention: drop whole partitions older than the window instead of deleting rows"""
+    if retention_months is None:
+        retention_months = getattr(settings, 'TRANSACTION_LOG_RETENTION_MONTHS', 36)
+    cutoff = add_months(month_start(now or timezone.now()), -retention_months).date()
+
+    dropped = []
+    for partition in TransactionLogPartition.objects.filter(month__lt=cutoff):
+        with transaction.atomic():
+            _run_ddl('delete_model', partition_model(partition.table_name))
+            partition.delete()
+        dropped.append(partition.table_name)
+        logger.info("Dropped transaction log partition %s", partition.table_name)
+    return dropped
+
+
+def _to_log(row):
+    """TransactionLog-shaped instance of a partition row, for the existing serializer"""
+    log = TransactionLog(
+        id=row.id, previous_status=row.previous_status, new_status=row.new_status, reason=row.reason,
+        changed_by_id=row.changed_by_pk, user_id=row.user_pk, created_at=row.created_at, updated_at=row.updated_at,
+        transaction_id=row.transaction_pk
+    )
+    log.transaction = Transaction(id=row.transaction_pk, transaction_id=row.transaction_uuid)
+    log._state.adding = False
+    return log
+
+
+class PartitionedLogHistory:
+    """
+    A user's logs across the hot table and the monthly partitions.
+
+    Sliceable for Django's Paginator. Sources are disjoint and ordered by
+    month. Partition sizes come from the counts stored when each month was
+    rolled, so a page costs one COUNT on the hot table, one lookup of the
+    stored counts and queries on only the sources the page overlaps;
+    partitions without rows for the user are left out altogether.
+    """
+    ordered = True
+
+    def __init__(self, queryset, user, filters=None, oldest_first=False):
+        self.user = user
+        self.filters = {key: value for key, value in (filters or {}).items() if value}
+        self.oldest_first = oldest_first
+        order = ['created_at', 'id'] if oldest_first else ['-created_at', '-id']
+
+        sizes = dict(
+            TransactionLogPartitionCount.objects.filter(user_pk=user.id, **self.filters)
+            .values('partition').annotate(rows=models.Sum('row_count')).values_list('partition', 'rows')
+        )
+        partitions = TransactionLogPartition.objects.filter(id__in=sizes).order_by(
+            'month' if oldest_first else '-month'
+        )
+        tables = [
+            partition_model(partition.table_name).objects.filter(user_pk=user.id, **self.filters).order_by(*order)
+            for partition in partitions
+        ]
+        table_sizes = [sizes[partition.id] for partition in partitions]
+        self.sources = tables + [queryset] if oldest_first else [queryset] + tables
+        self._table_sizes = table_sizes
+        self._counts = None
+
+    def counts(self):
+        if self._counts is None:
+            hot = self.sources[-1 if self.oldest_first else 0].count()
+            self._counts = self._table_sizes + [hot] if self.oldest_first else [hot] + self._table_sizes
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop if key.stop is not None else self.count()
+
+        items, offset = [], 0
+        for source, size in zip(self.sources, self.counts()):
+            if offset >= stop:
+                break
+            if start < offset + size:
+                rows = list(source[max(start - offset, 0):stop - offset])
+                if source.model is not TransactionLog:
+                    rows = [_to_log(row) for row in rows]
+                    prefetch_related_objects(rows, 'changed_by')
+                items += rows
+            offset += size
+        return items
+
+
+def partition_logs_for_transactions(transaction_ids, since):
+    """Log dicts (transaction_id + fields) for transactions, from partitions for months from `since` on"""
+    rows = []
+    for partition in TransactionLogPartition.objects.filter(month__gte=month_start(since).date()):
+        rows += [
+            {
+                'transaction_id': row['transaction_pk'], 'previous_status': row['previous_status'],
+                'new_status': row['new_status'], 'reason': row['reason'],
+                'changed_by_id': row['changed_by_pk'], 'created_at': row['created_at'],
+            }
+            for row in partition_model(partition.table_name).objects.filter(
+                transaction_pk__in=transaction_ids
+            ).values('transaction_pk', 'previous_status', 'new_status', 'reason', 'changed_by_pk', 'created_at')
+        ]
+    return rows
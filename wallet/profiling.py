@@ -0,0 +1,248 @@
+# wallet/profiling.py
+"""
+Opt-in slow-request profiler (SLOW_REQUEST_THRESHOLD_MS > 0).
+
+Every request records its SQL (statement, time, call site). A watchdog
+thread stack-samples only the requests already past the threshold, so a
+fast request costs a dict insert and the per-query bookkeeping, nothing
+more. When a request ends over the threshold its queries, stack samples
+(collapsed, flamegraph-ready), an optional cProfile dump and EXPLAIN of
+its slowest SELECT are written to a directory under SLOW_REQUEST_DIR;
+only the newest SLOW_REQUEST_KEEP are kept.
+"""
+from collections import Counter
+from pathlib import Path
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from utils.query_observers import observe
+
+logger = logging.getLogger(__name__)
+
+_in_flight = set()  # RequestSamples of the requests running now
+_watchdog = None
+_interval = 0.005
+_watchdog_lock = threading.Lock()
+# Django calls the execute_wrappers from here; the call site is above it
+_WRAPPER_CALLER = str(Path('django', 'db', 'backends', 'utils.py'))
+
+
+class RequestSample:
+    """What one request did: its queries and, once it ran long, its stack samples"""
+
+    def __init__(self, request, project_root, threshold, thread_id=None):
+        self.request = request
+        # Threads to sample: the request's own, and any that run its queries (sync_to_async)
+        self.threads = {thread_id} if thread_id is not None else set()
+        self.started = time.perf_counter()
+        self.late_at = self.started + threshold
+        self.project_root = project_root
+        self.queries = []
+        self.stacks = Counter()
+
+    def call_site(self):
+        """Innermost project frame, outside installed packages, that called into Django's cursor"""
+        frame = sys._getframe(2)
+        # Skip the chain of execute_wrappers, however deep
+        while frame is not None and not frame.f_code.co_filename.endswith(_WRAPPER_CALLER):
+            frame = frame.f_back
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self.project_root) and 'site-packages' not in filename:
+                return f'{filename[len(self.project_root):].lstrip("/")}:{frame.f_lineno} in {frame.f_code.co_name}'
+            frame = frame.f_back
+        return ''
+
+    def __call__(self, execute, sql, params, many, context):
+        self.threads.add(threading.get_ident())
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': params,  # kept for EXPLAIN only; never written out
+                'duration_ms': (time.perf_counter() - started) * 1000,
+                'call_site': self.call_site(),
+            })
+
+
+def _stack_key(frame):
+    names = []
+    while frame is not None:
+        names.append(f'{frame.f_code.co_name} ({Path(frame.f_code.co_filename).name}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _watch():
+    """Sample the stacks of the requests running past their threshold"""
+    while True:
+        time.sleep(_interval)
+        now = time.perf_counter()
+        late = [sample for sample in list(_in_flight) if now >= sample.late_at]
+        if not late:
+            continue
+        frames = sys._current_frames()
+        for sample in late:
+            for thread_id in list(sample.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    sample.stacks[_stack_key(frame)] += 1
+
+
+def _start_watchdog(interval):
+    global _watchdog, _interval
+    with _watchdog_lock:
+        _interval = interval
+        if _watchdog is None:
+            _watchdog = threading.Thread(target=_watch, name='slow-request-watchdog', daemon=True)
+            _watchdog.start()
+
+
+def explain(query):
+    """The backend's EXPLAIN output for a captured SELECT"""
+    connection = connections[query['alias']]
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}", query['params'])
+        return '\n'.join(' | '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def write_sample(sample, elapsed, response, profiler=None):
+    """Dump a slow request to its own directory, then prune the oldest ones"""
+    root = Path(getattr(settings, 'SLOW_REQUEST_DIR', Path(settings.BASE_DIR) / 'slow_requests'))
+    request = sample.request
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match else 'unmatched'
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-')[:60] or 'root'
+    directory = root / f"{timezone.now():%Y%m%dT%H%M%S%f}-{request.method}-{slug}-{elapsed * 1000:.0f}ms"
+    directory.mkdir(parents=True, exist_ok=True)
+
+    queries = [{key: value for key, value in query.items() if key != 'params'} for query in sample.queries]
+    (directory / 'request.json').write_text(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'route': route,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2),
+        'user_id': getattr(getattr(request, 'user', None), 'id', None),
+        'queries': len(queries),
+        'db_ms': round(sum(query['duration_ms'] for query in queries), 2),
+        'stack_samples': sum(sample.stacks.values()),
+    }, indent=2))
+    (directory / 'queries.json').write_text(json.dumps(queries, indent=2))
+
+    if sample.stacks:
+        (directory / 'stacks.txt').write_text(
+            ''.join(f'{stack} {count}\n' for stack, count in sample.stacks.most_common())
+        )
+    if profiler is not None:
+        profiler.dump_stats(directory / 'profile.prof')
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+        (directory / 'profile.txt').write_text(text.getvalue())
+
+    selects = [query for query in sample.queries if query['sql'].lstrip().upper().startswith('SELECT')]
+    if selects:
+        slowest = max(selects, key=lambda query: query['duration_ms'])
+        try:
+            plan = explain(slowest)
+        except Exception as e:
+            plan = f'EXPLAIN failed: {e}'
+        (directory / 'explain.txt').write_text(
+            f"-- {slowest['duration_ms']:.2f} ms at {slowest['call_site']}\n{slowest['sql']}\n\n{plan}\n"
+        )
+
+    keep = getattr(settings, 'SLOW_REQUEST_KEEP', 100)
+    for old in sorted(path for path in root.iterdir() if path.is_dir())[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    logger.warning(
+        "Slow request %s %s: %.0f ms, profile in %s", request.method, request.path, elapsed * 1000, directory
+    )
+    return directory
+
+
+class SlowRequestMiddleware:
+    """
+    See the module docstring; removed from the chain when SLOW_REQUEST_THRESHOLD_MS is 0.
+
+    Under ASGI the stacks come from the threads that run the request's
+    queries, and cProfile is skipped: it profiles one thread, and the event
+    loop interleaves every request's coroutines on it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        threshold_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 0)
+        if not threshold_ms:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.threshold = threshold_ms / 1000
+        self.cprofile_rate = getattr(settings, 'SLOW_REQUEST_CPROFILE_RATE', 0.0)
+        self.project_root = str(settings.BASE_DIR)
+        _start_watchdog(getattr(settings, 'SLOW_REQUEST_SAMPLE_INTERVAL_MS', 5) / 1000)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = RequestSample(request, self.project_root, self.threshold, threading.get_ident())
+        profiler = cProfile.Profile() if self.cprofile_rate and random.random() < self.cprofile_rate else None
+
+        _in_flight.add(sample)
+        try:
+            with observe(sample):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            _in_flight.discard(sample)
+
+        elapsed = time.perf_counter() - sample.started
+        if elapsed >= self.threshold:
+            self.write(sample, elapsed, response, profiler)
+        return response
+
+    async def __acall__(self, request):
+        sample = RequestSample(request, self.project_root, self.threshold)
+
+        _in_flight.add(sample)
+        try:
+            with observe(sample):
+                response = await self.get_response(request)
+        finally:
+            _in_flight.discard(sample)
+
+        elapsed = time.perf_counter() - sample.started
+        if elapsed >= self.threshold:
+            # File writes and EXPLAIN block, so off the event loop
+            await sync_to_async(self.write)(sample, elapsed, response)
+        return response
+
+    def write(self, sample, elapsed, response, profiler=None):
+        try:
+            write_sample(sample, elapsed, response, profiler)
+        except Exception as e:
+            logger.error("Could not write slow request profile: %s", e)
@@ -1,11 +1,17 @@
 # wallet/serializers.py
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
-from .models import UserProfile, Wallet, Card, Transaction, TransactionLog
+from .models import (
+    UserProfile, Wallet, Card, Transaction, TransactionLog, ScheduledTransfer, ScheduledTransferRun,
+    DisbursementJob
+)
 from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -130,10 +136,26 @@ class WalletSerializer(serializers.ModelSerializer):
     class Meta:
         model = Wallet
         fields = [
-            'username', 'balance', 'currency', 'is_active',
+            'username', 'balance', 'currency', 'fee_plan', 'is_active',
             'daily_limit', 'monthly_limit', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['balance', 'created_at', 'updated_at']
+        read_only_fields = ['balance', 'fee_plan', 'created_at', 'updated_at']
+
+
+class BalanceHistoryQuerySerializer(serializers.Serializer):
+    """Date range for the balance history endpoint (?from=&to=)"""
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        to_date = attrs.get('to_date') or timezone.localdate()
+        from_date = attrs.get('from_date') or to_date - timedelta(days=29)
+        if from_date > to_date:
+            raise serializers.ValidationError("'from' must not be after 'to'")
+        max_days = getattr(settings, 'BALANCE_HISTORY_MAX_DAYS', 366)
+        if (to_date - from_date).days >= max_days:
+            raise serializers.ValidationError(f"Date range cannot exceed {max_days} days")
+        return {'from_date': from_date, 'to_date': to_date}
 
 
 class CardSerializer(serializers.ModelSerializer):
@@ -196,11 +218,12 @@ class TransactionSerializer(serializers.ModelSerializer):
             'amount', 'fee', 'total_amount', 'status', 'status_display',
             'card', 'card_info', 'recipient_user', 'recipient_username',
             'mobile_number', 'description', 'reference_number',
+            'fx_rate', 'converted_amount', 'converted_currency',
             'created_at', 'completed_at', 'failed_at'
         ]
         read_only_fields = [
-            'transaction_id', 'status', 'fee', 'created_at',
-            'completed_at', 'failed_at'
+            'transaction_id', 'status', 'fee', 'fx_rate', 'converted_amount',
+            'converted_currency', 'created_at', 'completed_at', 'failed_at'
         ]
 
     def create(self, validated_data):
@@ -285,4 +308,119 @@ class TransactionLogSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'transaction_id', 'previous_status', 'new_status',
             'reason', 'changed_by_username', 'created_at'
-        ]
\ No newline at end of file
+        ]
+
+
+class ScheduledTransferSerializer(serializers.ModelSerializer):
+    """Serializer for scheduled and recurring transfers"""
+    card_id = serializers.IntegerField(required=False, allow_null=True)
+    recipient_username = serializers.CharField(
+        source='recipient_user.username', required=False, allow_blank=True
+    )
+
+    class Meta:
+        model = ScheduledTransfer
+        fields = [
+            'id', 'transaction_type', 'amount', 'card_id', 'recipient_username',
+            'mobile_number', 'description', 'frequency', 'start_at', 'end_at',
+            'next_run_at', 'last_run_at', 'run_count', 'is_active', 'created_at'
+        ]
+        read_only_fields = ['next_run_at', 'last_run_at', 'run_count', 'created_at']
+
+    # Changing any of these means a different schedule; create a new one instead
+    FIXED_FIELDS = ['transaction_type', 'card_id', 'recipient_user', 'mobile_number', 'frequency', 'start_at']
+
+    def validate(self, attrs):
+        """Apply the same rules as an immediate transfer"""
+        instance = self.instance
+        if instance is not None:
+            changed = [field for field in self.FIXED_FIELDS if field in attrs]
+            if changed:
+                raise serializers.ValidationError(
+                    {field: "Cannot be changed; create a new schedule instead." for field in changed}
+                )
+
+        def current(field, default=None):
+            return attrs.get(field, getattr(instance, field, default) if instance else default)
+
+        if 'recipient_user' in attrs:
+            recipient_username = attrs.pop('recipient_user').get('username')
+        else:
+            recipient_username = instance.recipient_user.username if instance and instance.recipient_user else None
+
+        transfer_data = {
+            'transaction_type': current('transaction_type'),
+            'amount': current('amount'),
+            'card_id': current('card_id'),
+            'recipient_username': recipient_username,
+            'mobile_number': current('mobile_number', ''),
+            'description': current('description', ''),
+        }
+        TransferSerializer(
+            data={key: value for key, value in transfer_data.items() if value is not None},
+            context=self.context
+        ).is_valid(raise_exception=True)
+
+        start_at, end_at = current('start_at'), current('end_at')
+        if instance is None and start_at < timezone.now() - timedelta(minutes=1):
+            raise serializers.ValidationError({"start_at": "Start time must not be in the past."})
+        if end_at and end_at <= start_at:
+            raise serializers.ValidationError({"end_at": "End time must be after the start time."})
+
+        if instance is None:
+            attrs['recipient_user'] = User.objects.get(username=recipient_username) if recipient_username else None
+        return attrs
+
+    def create(self, validated_data):
+        """Create schedule with user context; first run at start_at"""
+        validated_data['user'] = self.context['request'].user
+        validated_data['next_run_at'] = validated_data['start_at']
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        """Re-arm a finished schedule when it is reactivated"""
+        if validated_data.get('is_active') and instance.next_run_at is None:
+            validated_data['next_run_at'] = instance.next_occurrence(timezone.now())
+            validated_data['is_active'] = validated_data['next_run_at'] is not None
+        return super().update(instance, validated_data)
+
+
+class ScheduledTransferRunSerializer(serializers.ModelSerializer):
+    """Serializer for scheduled transfer runs"""
+    transaction_id = serializers.UUIDField(source='transaction.transaction_id', read_only=True, allow_null=True)
+
+    class Meta:
+        model = ScheduledTransferRun
+        fields = ['id', 'scheduled_for', 'status', 'message', 'transaction_id', 'created_at']
+
+
+class DisbursementJobSerializer(serializers.ModelSerializer):
+    """Serializer for bulk disbursement jobs"""
+    file = serializers.FileField(source='source_file', write_only=True)
+    progress = serializers.ReadOnlyField()
+
+    class Meta:
+        model = DisbursementJob
+        fields = [
+            'job_id', 'file', 'original_filename', 'description', 'status', 'progress',
+            'total_rows', 'valid_legs', 'invalid_legs', 'processed_legs',
+            'succeeded_legs', 'failed_legs', 'total_amount', 'total_fee', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'job_id', 'original_filename', 'status', 'total_rows', 'valid_legs', 'invalid_legs',
+            'processed_legs', 'succeeded_legs', 'failed_legs', 'total_amount', 'total_fee',
+            'error', 'created_at', 'started_at', 'finished_at'
+        ]
+
+    def validate_file(self, value):
+        """Only CSV uploads"""
+        if not value.name.lower().endswith('.csv'):
+            raise serializers.ValidationError("Upload a .csv file.")
+        return value
+
+    def create(self, validated_data):
+        """Create job with user context"""
+        validated_data['user'] = self.context['request'].user
+        validated_data['original_filename'] = validated_data['source_file'].name[:255]
+        return super().create(validated_data)
@@ -0,0 +1,361 @@
+# wallet/services.py
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from rest_framework import status
+import logging
+
+from .models import Card, Transaction, TransactionLog, ScheduledTransfer, ScheduledTransferRun
+from .serializers import TransferSerializer
+from utils.money import Money
+from utils.providers import provider_for, query_provider
+from utils.tracing import span, traced
+from utils.wallet_process import TransactionProcessor, FeeCalculator, TransactionValidator
+
+logger = logging.getLogger(__name__)
+
+
+class TransferError(Exception):
+    """Transfer rejected before a transaction was created"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class SerializerContext:
+    """Minimal request stand-in for serializer context outside a view"""
+
+    def __init__(self, user):
+        self.user = user
+
+
+def validate_transfer_data(user, data):
+    """Run TransferSerializer validation for a user; returns validated_data or raises TransferError"""
+    serializer = TransferSerializer(data=data, context={'request': SerializerContext(user)})
+    if not serializer.is_valid():
+        raise TransferError(serializer.errors)
+    return serializer.validated_data
+
+
+@traced('transfer.prepare')
+def prepare_transfer(user, validated_data, ip_address=None, user_agent=''):
+    """
+    Validate limits, price the transfer and create the pending Transaction.
+
+    Expects TransferSerializer.validated_data; must run inside an atomic block.
+    """
+    transaction_type = validated_data['transaction_type']
+    amount = validated_data['amount']
+    card_id = validated_data.get('card_id')
+    recipient_username = validated_data.get('recipient_username')
+
+    # Validate transaction limits
+    with span('transfer.validators'):
+        TransactionValidator.validate_minimum_amount(amount)
+        TransactionValidator.validate_maximum_amount(amount)
+        TransactionValidator.validate_limits(user, amount)
+
+    # Calculate fees
+    wallet = user.wallet
+    amount_money = Money.from_decimal(amount, wallet.currency)
+    fee_money = FeeCalculator.calculate_fee_money(transaction_type, amount_money, wallet.fee_plan)
+
+    # Get related objects
+    card = None
+    recipient_user = None
+
+    if card_id:
+        try:
+            card = Card.objects.get(id=card_id, user=user, is_active=True)
+        except Card.DoesNotExist:
+            raise TransferError('Card not found or inactive', status.HTTP_404_NOT_FOUND)
+
+    if recipient_username:
+        try:
+            recipient_user = User.objects.get(username=recipient_username)
+        except User.DoesNotExist:
+            raise TransferError('Recipient user not found', status.HTTP_404_NOT_FOUND)
+
+    with span('transaction.insert'):
+        return Transaction.objects.create(
+            user=user,
+            transaction_type=transaction_type,
+            amount=amount,
+            fee=fee_money.to_decimal(),
+            card=card,
+            recipient_user=recipient_user,
+            mobile_number=validated_data.get('mobile_number') or '',
+            description=validated_data.get('description', ''),
+            ip_address=ip_address,
+            user_agent=(user_agent or '')[:500]
+        )
+
+
+@traced('transfer.complete')
+def complete_transfer(user, transaction_obj, provider_result=None):
+    """
+    Call the provider, then run the processor on a pending transaction and
+    log the outcome in one DB transaction.
+
+    Call it outside atomic blocks for transfers that go to a provider, so
+    the row's claim commits before the call and the round trip holds no
+    write lock, or pass provider_result when the caller claimed the row
+    and called the provider itself (async path, sweeper). Returns
+    (success, message).
+    """
+    processor = TransactionProcessor(user, transaction_obj, provider_result=provider_result)
+    if not processor.call_provider_first():
+        # Cancelled or claimed by another worker first; whoever changed it has logged that
+        logger.info("Transaction %s is already %s", transaction_obj.transaction_id, transaction_obj.status)
+        return False, f"Transaction is already {transaction_obj.status}"
+
+    previous_status = transaction_obj.status
+    with transaction.atomic():
+        success, message = processor.process_transaction()
+        if transaction_obj.status == 'cancelled':
+            # Cancelled before the processor claimed it; cancel() has logged that
+            logger.info("Transaction %s was cancelled before processing", transaction_obj.transaction_id)
+            return success, message
+
+        with span('transaction_log.write'):
+            TransactionLog.objects.create(
+                transaction=transaction_obj,
+                previous_status=previous_status,
+                new_status=transaction_obj.status,
+                reason='Transaction processed successfully' if success else message,
+                changed_by=user
+            )
+
+    if success:
+        logger.info("Transaction completed: %s", transaction_obj.transaction_id)
+    elif transaction_obj.status == 'unreconciled':
+        logger.error("Transaction held for reconciliation: %s - %s", transaction_obj.transaction_id, message)
+    elif transaction_obj.status == 'retrying':
+        logger.info(
+            "Transaction %s will be retried at %s", transaction_obj.transaction_id, transaction_obj.next_attempt_at
+        )
+    else:
+        logger.warning("Transaction failed: %s - %s", transaction_obj.transaction_id, message)
+    return success, message
+
+
+@traced('transfer.response')
+def transfer_response(user, transaction_obj, success, message):
+    """Response payload and HTTP status for a processed transfer"""
+    wallet = user.wallet
+    balance = str(Money.from_decimal(wallet.balance, wallet.currency))
+
+    if success:
+        amount = Money.from_decimal(transaction_obj.amount, wallet.currency)
+        fee = Money.from_decimal(transaction_obj.fee, wallet.currency)
+        return {
+            'transaction_id': str(transaction_obj.transaction_id),
+            'status': transaction_obj.status,
+            'amount': str(amount),
+            'fee': str(fee),
+            'total_amount': str(amount + fee),
+            'message': message,
+            'new_balance': balance
+        }, status.HTTP_201_CREATED
+
+    payload = {
+        'transaction_id': str(transaction_obj.transaction_id),
+        'status': transaction_obj.status,
+        'message': message,
+        'balance': balance
+    }
+    if transaction_obj.status == 'retrying':
+        # Accepted: the retrier re-runs the provider step, no need to resubmit
+        payload['next_attempt_at'] = transaction_obj.next_attempt_at.isoformat()
+        return payload, status.HTTP_202_ACCEPTED
+    return payload, status.HTTP_400_BAD_REQUEST
+
+
+def dashboard_aggregates(now=None):
+    """Aggregate expressions for the dashboard counters, for one query"""
+    now = now or timezone.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    this_month = today.replace(day=1)
+
+    this_month_completed = Q(created_at__gte=this_month, status='completed')
+    return {
+        'total': Count('id'),
+        'completed': Count('id', filter=Q(status='completed')),
+        'pending': Count('id', filter=Q(status='pending')),
+        'failed': Count('id', filter=Q(status='failed')),
+        'today': Count('id', filter=Q(created_at__gte=today)),
+        'monthly_spent': Sum('amount', filter=this_month_completed & Q(
+            transaction_type__in=Transaction.OUTGOING_TYPES
+        )),
+        'monthly_received': Sum('amount', filter=this_month_completed & Q(
+            transaction_type__in=Transaction.INCOMING_TYPES
+        )),
+    }
+
+
+def dashboard_summary(wallet, stats):
+    """Dashboard summary block from the aggregated stats"""
+    return {
+        'wallet_balance': str(Money.from_decimal(wallet.balance, wallet.currency)),
+        'wallet_currency': wallet.currency,
+        'total_transactions': stats['total'],
+        'completed_transactions': stats['completed'],
+        'pending_transactions': stats['pending'],
+        'failed_transactions': stats['failed'],
+        'today_transactions': stats['today'],
+        'monthly_spent': str(Money.from_decimal(stats['monthly_spent'], wallet.currency)),
+        'monthly_received': str(Money.from_decimal(stats['monthly_received'], wallet.currency)),
+    }
+
+
+def scheduled_transfer_data(schedule):
+    """TransferSerializer input for a scheduled transfer"""
+    data = {
+        'transaction_type': schedule.transaction_type,
+        'amount': schedule.amount,
+        'description': schedule.description,
+    }
+    if schedule.card_id:
+        data['card_id'] = schedule.card_id
+    if schedule.recipient_user_id:
+        data['recipient_username'] = schedule.recipient_user.username
+    if schedule.mobile_number:
+        data['mobile_number'] = schedule.mobile_number
+    return data
+
+
+def execute_scheduled_transfer(schedule_id, scheduled_for, now=None):
+    """
+    Run one slot of a scheduled transfer at most once.
+
+    Inserting the ScheduledTransferRun row claims the slot; a duplicate
+    claim (another worker, a retry after a crash) hits the unique
+    constraint and is skipped. The claim, the schedule advance and the
+    pending transfer commit together; the transfer is then processed like
+    any other, and one left pending by a crash is settled by the stale
+    transaction sweeper. A transfer deferred to the retrier leaves the run
+    'retrying' until it finishes. Returns the run, or None if already taken.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        schedule = ScheduledTransfer.objects.select_related(
+            'user', 'user__wallet', 'recipient_user'
+        ).get(id=schedule_id)
+        next_run_at = schedule.next_occurrence(max(scheduled_for, now))
+
+        try:
+            with transaction.atomic():
+                run = ScheduledTransferRun.objects.create(schedule_id=schedule_id, scheduled_for=scheduled_for)
+        except IntegrityError:
+            # Slot already ran; only move a schedule still pointing at it
+            ScheduledTransfer.objects.filter(id=schedule_id, next_run_at=scheduled_for).update(
+                next_run_at=next_run_at,
+                is_active=next_run_at is not None
+            )
+            return None
+
+        ScheduledTransfer.objects.filter(id=schedule_id).update(
+            next_run_at=next_run_at,
+            is_active=next_run_at is not None,
+            last_run_at=now,
+            run_count=F('run_count') + 1
+        )
+
+        user = schedule.user
+        try:
+            with transaction.atomic():
+                validated_data = validate_transfer_data(user, scheduled_transfer_data(schedule))
+                if not user.wallet.is_active:
+                    raise TransferError('Wallet is inactive')
+                transaction_obj = prepare_transfer(user, validated_data, user_agent=ScheduledTransferRun.USER_AGENT)
+        except Exception as e:
+            run.status = 'failed'
+            run.message = str(e.message if isinstance(e, TransferError) else e)[:1000]
+            run.save(update_fields=['status', 'message'])
+            logger.warning("Scheduled transfer %s skipped for %s: %s", schedule_id, scheduled_for, run.message)
+            return run
+        run.transaction = transaction_obj
+        run.save(update_fields=['transaction'])
+
+    # After the claim commits: the provider call must not hold the write lock
+    success, message = complete_transfer(user, transaction_obj)
+    run.status = ScheduledTransferRun.status_for(transaction_obj.status)
+    run.message = message
+    run.save(update_fields=['status', 'message'])
+    if run.status == 'retrying':
+        # The retrier may have finished the transfer before the run was saved
+        transaction_obj.refresh_from_db(fields=['status'])
+        ScheduledTransferRun.settle(transaction_obj)
+        run.refresh_from_db(fields=['status', 'message'])
+    return run
+
+
+def retry_transaction(transaction_id, now=None):
+    """
+    Re-run the provider step of a due 'retrying' transaction.
+
+    The row is claimed with a conditional UPDATE so concurrent retriers
+    never process it twice. Returns the transaction, or None if it was no
+    longer due.
+    """
+    now = now or timezone.now()
+    claimed = Transaction.objects.filter(
+        id=transaction_id, status='retrying', next_attempt_at__lte=now
+    ).update(status='processing', updated_at=now)
+    if not claimed:
+        return None
+
+    transaction_obj = Transaction.objects.select_related('user__wallet').get(id=transaction_id)
+    complete_transfer(transaction_obj.user, transaction_obj)
+    return transaction_obj
+
+
+def sweep_transaction(transaction_id, stale_before, now=None):
+    """
+    Settle one transaction stuck in pending/processing since before stale_before.
+
+    The provider is asked what happened: approved rows are completed with
+    their balance effects, unknown ones are released for the next sweep and
+    everything else is failed. Internal transfers never reached a provider
+    and are failed. Returns 'completed', 'failed', 'released' or None if
+    the row changed under us.
+    """
+    now = now or timezone.now()
+    transaction_obj = Transaction.objects.select_related('user__wallet').filter(
+        id=transaction_id, status__in=['pending', 'processing'], updated_at__lt=stale_before
+    ).first()
+    if transaction_obj is None:
+        return None
+
+    # Claim it so the retrier and other sweepers leave it alone
+    claimed = Transaction.objects.filter(
+        id=transaction_id, status=transaction_obj.status, updated_at=transaction_obj.updated_at
+    ).update(status='processing', updated_at=now)
+    if not claimed:
+        return None
+
+    user = transaction_obj.user
+    if provider_for(transaction_obj.transaction_type) is None:
+        with transaction.atomic():
+            previous_status = transaction_obj.status
+            transaction_obj.mark_failed('Expired before processing')
+            TransactionLog.objects.create(
+                transaction=transaction_obj,
+                previous_status=previous_status,
+                new_status='failed',
+                reason='Expired before processing (stale transaction sweeper)'
+            )
+        return 'failed'
+
+    provider_result = query_provider(transaction_obj)
+    if provider_result is None:
+        Transaction.objects.filter(id=transaction_id, status='processing', updated_at=now).update(
+            status=transaction_obj.status
+        )
+        return 'released'
+
+    complete_transfer(user, transaction_obj, provider_result=provider_result)
+    return transaction_obj.status
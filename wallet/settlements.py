@@ -0,0 +1,301 @@
+# wallet/settlements.py
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import chain
+import csv
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import SettlementBatch, Transaction
+
+logger = logging.getLogger(__name__)
+
+# provider -> outgoing transaction type settled with it
+SETTLEMENT_TYPES = {
+    'bkash': 'wallet_to_bkash',
+    'nagad': 'wallet_to_nagad',
+    'card': 'wallet_to_card',
+}
+
+DETAIL_FIELDS = [
+    'id', 'transaction_id', 'created_at', 'completed_at', 'amount', 'fee',
+    'mobile_number', 'card__card_number', 'reference_number'
+]
+
+
+def _chunk_size():
+    return getattr(settings, 'SETTLEMENT_CHUNK_SIZE', 1000)
+
+
+def settlement_window(cutoff_date):
+    """[start, end) of the window that closes at the cut-off time on cutoff_date"""
+    cutoff = time(hour=getattr(settings, 'SETTLEMENT_CUTOFF_HOUR', 18))
+    end = timezone.make_aware(datetime.combine(cutoff_date, cutoff))
+    return end - timedelta(days=1), end
+
+
+def last_closed_window(now=None):
+    """The most recent window whose cut-off has already passed"""
+    now = timezone.localtime(now or timezone.now())
+    start, end = settlement_window(now.date())
+    if end > now:
+        start, end = settlement_window(now.date() - timedelta(days=1))
+    return start, end
+
+
+class SettlementWriter:
+    """Base provider file: header, one record per transaction, trailer"""
+    extension = 'csv'
+
+    def __init__(self, handle, batch):
+        self.handle = handle
+        self.batch = batch
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        self.digest.update(text.encode('utf-8'))
+        self.handle.write(text)
+
+    def header(self):
+        pass
+
+    def detail(self, sequence, row):
+        raise NotImplementedError
+
+    def trailer(self, count, total_amount, total_fee):
+        pass
+
+
+class BkashSettlementWriter(SettlementWriter):
+    """Pipe-delimited H/D/T records"""
+    extension = 'txt'
+
+    def header(self):
+        self.write(
+            f"H|DAFFODILPAY|{self.batch.batch_id}|{self.batch.window_start:%Y%m%d%H%M%S}"
+            f"|{self.batch.window_end:%Y%m%d%H%M%S}\n"
+        )
+
+    def detail(self, sequence, row):
+        self.write(
+            f"D|{sequence}|{row['transaction_id']}|{row['mobile_number']}|{row['amount']}"
+            f"|{row['fee']}|{row['reference_number']}\n"
+        )
+
+    def trailer(self, count, total_amount, total_fee):
+        self.write(f"T|{count}|{total_amount}|{total_fee}\n")
+
+
+class NagadSettlementWriter(SettlementWriter):
+    """CSV with a column header; totals row at the end"""
+    COLUMNS = ['sequence', 'transaction_id', 'msisdn', 'amount', 'fee', 'reference', 'completed_at']
+
+    def __init__(self, handle, batch):
+        super().__init__(handle, batch)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def _row(self, values):
+        self.writer.writerow(values)
+        self.write(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate(0)
+
+    def header(self):
+        self._row(self.COLUMNS)
+
+    def detail(self, sequence, row):
+        completed_at = row['completed_at'].isoformat() if row['completed_at'] else ''
+        self._row([
+            sequence, row['transaction_id'], row['mobile_number'], row['amount'], row['fee'],
+            row['reference_number'], completed_at
+        ])
+
+    def trailer(self, count, total_amount, total_fee):
+        self._row(['TOTAL', count, '', total_amount, total_fee, '', ''])
+
+
+class CardSettlementWriter(SettlementWriter):
+    """Fixed-width records; amounts in minor units, card numbers masked"""
+    extension = 'dat'
+
+    @staticmethod
+    def _minor(value):
+        return int(value * 100)
+
+    def header(self):
+        self.write(f"01{'DAFFODILPAY':<20}{self.batch.window_start:%Y%m%d%H%M}{self.batch.window_end:%Y%m%d%H%M}\n")
+
+    def detail(self, sequence, row):
+        card_number = row['card__card_number'] or ''
+        masked = f"{'*' * 12}{card_number[-4:]}" if card_number else ''
+        self.write(
+            f"02{sequence:08d}{str(row['transaction_id']).replace('-', ''):<32}{masked:<19}"
+            f"{self._minor(row['amount']):015d}{self._minor(row['fee']):011d}{row['reference_number']:<50}\n"
+        )
+
+    def trailer(self, count, total_amount, total_fee):
+        self.write(f"09{count:08d}{self._minor(total_amount):018d}{self._minor(total_fee):015d}\n")
+
+
+WRITERS = {
+    'bkash': BkashSettlementWriter,
+    'nagad': NagadSettlementWriter,
+    'card': CardSettlementWriter,
+}
+
+
+def _grace():
+    return timedelta(minutes=getattr(settings, 'SETTLEMENT_GRACE_MINUTES', 10))
+
+
+def _eligible(provider, window_start, window_end):
+    """
+    Completed, unsettled outgoing transactions that completed in the window
+    or the grace period before it (a completion committed just after the
+    previous file was written); one range scan bounded by the window, on
+    the partial index of unsettled completed rows.
+    """
+    return Transaction.objects.filter(
+        transaction_type=SETTLEMENT_TYPES[provider],
+        completed_at__gte=window_start - _grace(),
+        completed_at__lt=window_end,
+        status='completed',
+        settlement_batch__isnull=True
+    )
+
+
+def _carried_over(provider, window_start):
+    """
+    Older unsettled transactions whose own window's file is already
+    generated, so they would otherwise never be settled. Read through the
+    partial index on unsettled completed rows; rows of windows not yet
+    generated (a backfill running out of order) are left to their window.
+    """
+    generated = SettlementBatch.objects.filter(
+        provider=provider,
+        status='generated',
+        window_start__lte=OuterRef('completed_at'),
+        window_end__gt=OuterRef('completed_at')
+    )
+    return Transaction.objects.filter(
+        transaction_type=SETTLEMENT_TYPES[provider],
+        completed_at__lt=window_start - _grace(),
+        status='completed',
+        settlement_batch__isnull=True
+    ).filter(Exists(generated))
+
+
+def _id_chunks(queryset, chunk_size):
+    """Ids of queryset, latest completed first, in keyset-paginated chunks of one index range scan each"""
+    last = None
+    while True:
+        keys = queryset
+        if last is not None:
+            keys = keys.filter(Q(completed_at__lt=last[0]) | Q(completed_at=last[0], id__lt=last[1]))
+        keys = list(keys.order_by('-completed_at', '-id').values_list('completed_at', 'id')[:chunk_size])
+        if not keys:
+            return
+        last = keys[-1]
+        yield [key_id for _, key_id in keys]
+
+
+def _open_batch(provider, window_start, window_end):
+    """Get or create the batch row; unfinished batches are reset and regenerated"""
+    try:
+        with transaction.atomic():
+            batch, created = SettlementBatch.objects.get_or_create(
+                provider=provider, window_start=window_start, window_end=window_end
+            )
+    except IntegrityError:
+        batch = SettlementBatch.objects.get(provider=provider, window_start=window_start, window_end=window_end)
+
+    if batch.status == 'generated':
+        return batch, False
+
+    with transaction.atomic():
+        # A previous run died part way: release its rows and start over
+        Transaction.objects.filter(settlement_batch=batch).update(settlement_batch=None)
+        SettlementBatch.objects.filter(id=batch.id).update(
+            status='generating', transaction_count=0, total_amount=Decimal('0.00'),
+            total_fee=Decimal('0.00'), error='', checksum='', generated_at=None
+        )
+    batch.refresh_from_db()
+    return batch, True
+
+
+def _file_path(batch):
+    root = Path(getattr(settings, 'SETTLEMENT_ROOT', Path(settings.BASE_DIR) / 'settlements'))
+    directory = root / batch.provider / f'{batch.window_end:%Y%m%d}'
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'{batch.provider}_{batch.window_end:%Y%m%d%H%M}.{WRITERS[batch.provider].extension}'
+
+
+def generate_settlement(provider, window_start, window_end):
+    """
+    Write the settlement file for one provider and window.
+
+    Transactions completed in the window (and its grace period) are read
+    latest completed first in keyset-paginated chunks, so each chunk is one
+    index range scan and memory does not grow with the window; then any
+    carried over from already generated windows. Each chunk is claimed (settlement_batch set) before its records
+    are written; the file is written to a .part path and renamed once the
+    trailer is on disk. Returns the batch, or None if the window was
+    already settled.
+    """
+    batch, pending = _open_batch(provider, window_start, window_end)
+    if not pending:
+        return None
+
+    path = _file_path(batch)
+    part_path = path.with_name(path.name + '.part')
+    chunk_size = _chunk_size()
+    count, total_amount, total_fee = 0, Decimal('0.00'), Decimal('0.00')
+
+    try:
+        with open(part_path, 'w', encoding='utf-8', newline='') as handle:
+            writer = WRITERS[provider](handle, batch)
+            writer.header()
+
+            sources = (_eligible(provider, window_start, window_end), _carried_over(provider, window_start))
+            for ids in chain.from_iterable(_id_chunks(source, chunk_size) for source in sources):
+                with transaction.atomic():
+                    Transaction.objects.filter(id__in=ids, settlement_batch__isnull=True).update(settlement_batch=batch)
+                    rows = Transaction.objects.filter(id__in=ids, settlement_batch=batch).order_by(
+                        '-completed_at', '-id'
+                    ).values(*DETAIL_FIELDS)
+                    for row in rows:
+                        count += 1
+                        total_amount += row['amount']
+                        total_fee += row['fee']
+                        writer.detail(count, row)
+                    SettlementBatch.objects.filter(id=batch.id).update(
+                        transaction_count=count, total_amount=total_amount, total_fee=total_fee
+                    )
+
+            writer.trailer(count, total_amount, total_fee)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(part_path, path)
+    except Exception as e:
+        logger.error("Settlement %s %s - %s failed: %s", provider, window_start, window_end, e)
+        SettlementBatch.objects.filter(id=batch.id).update(status='failed', error=str(e)[:2000])
+        raise
+
+    SettlementBatch.objects.filter(id=batch.id).update(
+        status='generated', file_path=str(path), checksum=writer.digest.hexdigest(), generated_at=timezone.now()
+    )
+    batch.refresh_from_db()
+    logger.info(
+        "Settlement %s %s - %s: %s transactions, amount %s, fee %s",
+        provider, window_start, window_end, count, total_amount, total_fee
+    )
+    return batch
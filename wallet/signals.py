@@ -1,8 +1,13 @@
 # wallet/signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, Wallet, Transaction, TransactionLog
+from .models import (
+    UserProfile, Wallet, Transaction, TransactionLog, FeeSchedule, FeeRule, ExchangeRate, ScheduledTransferRun
+)
+from utils.fee_schedule import fee_schedule_cache
+from utils.fx import fx_rate_cache
+from utils.outbox import record_transaction_event
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,18 +30,20 @@ def create_user_profile_and_wallet(sender, instance, created, **kwargs):
             if not hasattr(instance, 'wallet'):
                 Wallet.objects.create(user=instance)
 
-            logger.info(f"Profile and wallet created for user: {instance.username}")
+            logger.info("Profile and wallet created for user: %s", instance.username)
 
         except Exception as e:
-            logger.error(f"Error creating profile/wallet for user {instance.username}: {str(e)}")
+            logger.error("Error creating profile/wallet for user %s: %s", instance.username, e)
 
 
 @receiver(pre_save, sender=Transaction)
 def log_transaction_status_change(sender, instance, **kwargs):
     """Log transaction status changes"""
+    instance._previous_status = None
     if instance.pk:  # Only for existing transactions
         try:
             old_instance = Transaction.objects.get(pk=instance.pk)
+            instance._previous_status = old_instance.status
             if old_instance.status != instance.status:
                 # Create transaction log
                 TransactionLog.objects.create(
@@ -46,11 +53,13 @@ def log_transaction_status_change(sender, instance, **kwargs):
                     reason=f'Status changed from {old_instance.status} to {instance.status}'
                 )
                 logger.info(
-                    f"Transaction status changed: {instance.transaction_id} - {old_instance.status} to {instance.status}")
+                    "Transaction status changed: %s - %s to %s",
+                    instance.transaction_id, old_instance.status, instance.status
+                )
         except Transaction.DoesNotExist:
             pass
         except Exception as e:
-            logger.error(f"Error logging transaction status change: {str(e)}")
+            logger.error("Error logging transaction status change: %s", e)
 
 
 @receiver(post_save, sender=Transaction)
@@ -62,4 +71,33 @@ def update_wallet_balance_on_completion(sender, instance, created, **kwargs):
             # In normal operation, the TransactionProcessor handles balance updates
             pass
         except Exception as e:
-            logger.error(f"Error in wallet balance update signal: {str(e)}")
\ No newline at end of file
+            logger.error("Error in wallet balance update signal: %s", e)
+
+
+@receiver(post_save, sender=Transaction)
+def write_transaction_outbox_event(sender, instance, created, **kwargs):
+    """Record creations and status changes for downstream delivery (same DB transaction)"""
+    previous_status = getattr(instance, '_previous_status', None)
+    if created or (previous_status is not None and previous_status != instance.status):
+        record_transaction_event(instance, None if created else previous_status)
+
+
+@receiver(post_save, sender=Transaction)
+def settle_scheduled_runs(sender, instance, created, **kwargs):
+    """A scheduled run whose transfer was deferred takes the transfer's final outcome"""
+    previous_status = getattr(instance, '_previous_status', None)
+    if previous_status in Transaction.OPEN_STATUSES and instance.status not in Transaction.OPEN_STATUSES:
+        ScheduledTransferRun.settle(instance)
+
+
+@receiver([post_save, post_delete], sender=FeeSchedule)
+@receiver([post_save, post_delete], sender=FeeRule)
+def invalidate_fee_schedule(sender, instance, **kwargs):
+    """Recompile the fee schedule on next use after any change in this process"""
+    fee_schedule_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def invalidate_fx_rates(sender, instance, **kwargs):
+    """Reload rates on next use after any change in this process"""
+    fx_rate_cache.invalidate()
@@ -0,0 +1,129 @@
+# wallet/streaming.py
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+
+from utils.events import event_hub
+from .authentication import aauthenticate_token, extract_token
+
+logger = logging.getLogger(__name__)
+
+
+async def authenticate_token(raw_token):
+    """Resolve a JWT access token or legacy DRF token to an active user id"""
+    user = await aauthenticate_token(raw_token)
+    return user.pk if user is not None else None
+
+
+def _extract_token(scope):
+    """Token from the Authorization header or a ?token= query parameter"""
+    return extract_token(scope.get('headers', []), scope.get('query_string', b''))
+
+
+class EventStreamApp:
+    """
+    ASGI endpoint streaming a user's balance and transaction events.
+
+    Serves Server-Sent Events over HTTP and JSON frames over WebSocket.
+    Each connection is one coroutine parked on a hub queue, so idle
+    clients cost no threads.
+    """
+
+    def __init__(self, hub=None, heartbeat_seconds=None):
+        self.hub = hub or event_hub
+        self.heartbeat_seconds = heartbeat_seconds or getattr(settings, 'EVENT_STREAM_HEARTBEAT_SECONDS', 15)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+        else:
+            await self._sse(scope, receive, send)
+
+    async def _sse(self, scope, receive, send):
+        user_id = await authenticate_token(_extract_token(scope))
+        if user_id is None:
+            await send({
+                'type': 'http.response.start',
+                'status': 401,
+                'headers': [(b'content-type', b'application/json')],
+            })
+            await send({
+                'type': 'http.response.body',
+                'body': b'{"detail": "Authentication credentials were not provided or are invalid."}',
+            })
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+        async def write(event):
+            if event is None:
+                payload = b': keep-alive\n\n'
+            else:
+                payload = (
+                    f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                ).encode('utf-8')
+            await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+
+        await self._pump(user_id, receive, write, disconnect_type='http.disconnect')
+
+    async def _websocket(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        user_id = await authenticate_token(_extract_token(scope))
+        if user_id is None:
+            await send({'type': 'websocket.close', 'code': 4401})
+            return
+        await send({'type': 'websocket.accept'})
+
+        async def write(event):
+            if event is not None:
+                await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+        await self._pump(user_id, receive, write, disconnect_type='websocket.disconnect')
+
+    async def _pump(self, user_id, receive, write, disconnect_type):
+        """Forward hub events until the client disconnects"""
+        subscription = self.hub.subscribe(user_id)
+
+        async def wait_for_disconnect():
+            while True:
+                message = await receive()
+                if message['type'] == disconnect_type:
+                    return
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            while not disconnected.done():
+                getter = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {getter, disconnected},
+                    timeout=self.heartbeat_seconds,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    await write(getter.result())
+                else:
+                    getter.cancel()
+                    if not done:
+                        await write(None)
+        except OSError:
+            logger.debug("Event stream for user %s closed by peer", user_id)
+        finally:
+            subscription.close()
+            disconnected.cancel()
+
+
+event_stream = EventStreamApp()
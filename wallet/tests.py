@@ -1,13 +1,63 @@
 # wallet/tests.py
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, AsyncClient
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.authtoken.models import Token
 from rest_framework import status
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
-from .models import UserProfile, Wallet, Card, Transaction
-from ..utils.wallet_process import FeeCalculator, TransactionValidator
+from io import StringIO
+import asyncio
+import json
+import logging
+import random
+from asgiref.sync import async_to_sync
+import numpy as np
+from .models import (
+    UserProfile, Wallet, Card, Transaction, SpendingAnomaly, FeeSchedule, FeeRule, ExchangeRate,
+    OutboxEvent, ScheduledTransfer, DisbursementJob, SettlementBatch, ArchiveSegment, TransactionLog,
+    TransactionLogPartition, BalanceSnapshot
+)
+from utils.wallet_process import FeeCalculator, TransactionValidator, TransactionProcessor
+from utils.anomaly import rolling_zscores, peer_percentiles
+from utils.fee_schedule import fee_schedule_cache
+from utils.money import Money, CurrencyMismatch
+from utils.fx import RateSnapshot, FxRateUnavailable, fx_rate_cache
+from utils.events import EventHub
+from utils import metrics
+from utils.metrics import reset_metrics
+from utils.providers import ProviderResult, SIMULATED_SUCCESS_RATES, call_provider
+from utils.resilience import BulkheadFull, CircuitBreaker, provider_guard, reset_guards
+from utils.tracing import exporter, parse_traceparent, read_spans, span, start_trace
+from utils.log_pipeline import JsonFormatter, QueueingHandler, SamplingFilter, SizeAndTimeRotatingFileHandler
+from utils.outbox import OutboxDispatcher
+from .services import execute_scheduled_transfer, complete_transfer, retry_transaction, sweep_transaction
+from .disbursements import claim_next_job, run_job, result_rows
+from .settlements import generate_settlement
+from .archive import archive_transactions, reset_readers
+from .memory import ensure_tracing, object_counts, process_stats, reset_snapshots, save_snapshot, take_snapshot
+from .partitions import add_months, drop_expired, month_start, roll_closed_months
+from .balances import balance_as_of, balance_history, day_bounds, snapshot_day
+from .statements import generate_shard, statement_root
+from .management.commands.bench import Command as BenchCommand, build_requests
+from .serializers import WalletSerializer
+from django.core.files.base import ContentFile
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest.mock import patch
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from .streaming import EventStreamApp
 
 
 class ModelTests(TestCase):
@@ -112,6 +162,1617 @@ class UtilTests(TestCase):
             TransactionValidator.validate_maximum_amount(Decimal('20000.00'))
 
 
+class MoneyTests(TestCase):
+    """Test cases for integer minor-unit money"""
+
+    def test_exact_rendering(self):
+        """Test amounts render as exact decimal strings"""
+        self.assertEqual(str(Money.from_decimal(Decimal('0.10'))), '0.10')
+        self.assertEqual(str(Money.from_decimal(Decimal('-12.05'))), '-12.05')
+        self.assertEqual(str(Money.from_decimal(Decimal('1500'), 'JPY')), '1500')
+        self.assertEqual(Money.from_decimal(Decimal('12.345')).to_decimal(), Decimal('12.34'))
+
+    def test_arithmetic_does_not_drift(self):
+        """Test repeated addition stays exact"""
+        total = Money.zero()
+        for _ in range(1000):
+            total += Money.from_decimal(Decimal('0.10'))
+        self.assertEqual(total, Money.from_decimal(Decimal('100.00')))
+
+    def test_currency_mismatch(self):
+        """Test amounts in different currencies cannot be combined"""
+        with self.assertRaises(CurrencyMismatch):
+            Money.from_decimal(Decimal('1.00'), 'USD') + Money.from_decimal(Decimal('1.00'), 'BDT')
+
+
+class FeeScheduleTests(TestCase):
+    """Test cases for stored, versioned fee schedules"""
+
+    def setUp(self):
+        self.schedule = FeeSchedule.objects.create(version=1, name='Tiered', is_active=True)
+        FeeRule.objects.create(schedule=self.schedule, transaction_type='wallet_to_bkash',
+                               rate=Decimal('0.02'))
+        FeeRule.objects.create(schedule=self.schedule, transaction_type='wallet_to_bkash',
+                               min_amount=Decimal('1000.00'), rate=Decimal('0.01'))
+        FeeRule.objects.create(schedule=self.schedule, transaction_type='wallet_to_bkash',
+                               plan='premium', rate=Decimal('0.00'), flat_fee=Decimal('0.25'))
+
+    def tearDown(self):
+        # Rolled-back test data does not fire the invalidation signals
+        fee_schedule_cache.invalidate()
+
+    def test_amount_bands(self):
+        """Test the band is picked by amount"""
+        self.assertEqual(FeeCalculator.calculate_fee('wallet_to_bkash', Decimal('500.00')), Decimal('10.00'))
+        self.assertEqual(FeeCalculator.calculate_fee('wallet_to_bkash', Decimal('2000.00')), Decimal('20.00'))
+
+    def test_plan_rules_and_unknown_types(self):
+        """Test plan-specific rules and types without a rule"""
+        self.assertEqual(
+            FeeCalculator.calculate_fee('wallet_to_bkash', Decimal('500.00'), 'USD', 'premium'),
+            Decimal('0.25')
+        )
+        self.assertEqual(FeeCalculator.calculate_fee('card_to_wallet', Decimal('100.00')), Decimal('0.00'))
+
+    def test_bulk_matches_single(self):
+        """Test vectorised pricing agrees with single-leg pricing"""
+        types = ['wallet_to_bkash', 'card_to_wallet', 'wallet_to_bkash'] * 100
+        amounts = [Decimal('12.34'), Decimal('50.00'), Decimal('1500.55')] * 100
+        fees = FeeCalculator.calculate_fees(types, amounts)
+        self.assertEqual(fees, [FeeCalculator.calculate_fee(t, a) for t, a in zip(types, amounts)])
+
+    def test_new_version_is_picked_up(self):
+        """Test activating a new schedule version replaces the compiled table"""
+        FeeSchedule.objects.filter(pk=self.schedule.pk).update(is_active=False)
+        FeeSchedule.objects.create(version=2, name='Flat', is_active=True)
+        self.assertEqual(FeeCalculator.calculate_fee('wallet_to_bkash', Decimal('500.00')), Decimal('0.00'))
+
+    @override_settings(FEE_SCHEDULE_CHECK_SECONDS=0)
+    def test_edited_rule_is_picked_up(self):
+        """Test a rule changed in place, here by another process, replaces the compiled table"""
+        self.assertEqual(FeeCalculator.calculate_fee('wallet_to_bkash', Decimal('500.00')), Decimal('10.00'))
+        # update() sends no signal, as with an edit made in another process
+        FeeRule.objects.filter(schedule=self.schedule, plan='', min_amount=Decimal('0.00')).update(
+            rate=Decimal('0.03'), updated_at=timezone.now()
+        )
+        self.assertEqual(FeeCalculator.calculate_fee('wallet_to_bkash', Decimal('500.00')), Decimal('15.00'))
+
+
+class FxTests(TestCase):
+    """Test cases for currency conversion"""
+
+    def tearDown(self):
+        fx_rate_cache.invalidate()
+
+    def test_snapshot_pairs(self):
+        """Test direct, inverse and cross rates come from one lookup"""
+        snapshot = RateSnapshot(1, [('USD', 'BDT', Decimal('120')), ('USD', 'JPY', Decimal('150'))])
+
+        converted, rate = snapshot.convert(Money.from_decimal(Decimal('10.00'), 'USD'), 'BDT')
+        self.assertEqual(str(converted), '1200.00')
+
+        converted, rate = snapshot.convert(Money.from_decimal(Decimal('1200.00'), 'BDT'), 'USD')
+        self.assertEqual(str(converted), '10.00')
+
+        converted, rate = snapshot.convert(Money.from_decimal(Decimal('100.00'), 'BDT'), 'JPY')
+        self.assertEqual(str(converted), '125')
+        self.assertEqual(rate, Decimal('1.25000000'))
+
+        with self.assertRaises(FxRateUnavailable):
+            snapshot.convert(Money.from_decimal(Decimal('1.00'), 'USD'), 'XYZ')
+
+    def test_wallet_to_wallet_conversion(self):
+        """Test cross-currency transfers credit the converted amount and record the rate"""
+        ExchangeRate.objects.create(base_currency='USD', quote_currency='BDT',
+                                    rate=Decimal('119.5'), valid_from=timezone.now())
+        sender = User.objects.create_user(username='sender', password='testpass123')
+        recipient = User.objects.create_user(username='recipient', password='testpass123')
+        Wallet.objects.filter(user=sender).update(balance=Decimal('100.00'))
+        Wallet.objects.filter(user=recipient).update(currency='BDT')
+        sender.refresh_from_db()
+        recipient.refresh_from_db()
+
+        transaction_obj = Transaction.objects.create(
+            user=sender,
+            transaction_type='wallet_to_wallet',
+            amount=Decimal('10.00'),
+            fee=Decimal('0.10'),
+            recipient_user=recipient
+        )
+        success, message = TransactionProcessor(sender, transaction_obj).process_transaction()
+
+        self.assertTrue(success, message)
+        transaction_obj.refresh_from_db()
+        self.assertEqual(transaction_obj.fx_rate, Decimal('119.5'))
+        self.assertEqual(transaction_obj.converted_amount, Decimal('1195.00'))
+        self.assertEqual(Wallet.objects.get(user=recipient).balance, Decimal('1195.00'))
+        self.assertEqual(Wallet.objects.get(user=sender).balance, Decimal('89.90'))
+
+    def test_quote_errors(self):
+        """Test quotes for a recipient without a wallet or a pair without a rate are client errors"""
+        sender = User.objects.create_user(username='sender', password='testpass123')
+        recipient = User.objects.create_user(username='recipient', password='testpass123')
+        walletless = User.objects.create_user(username='walletless', password='testpass123')
+        Wallet.objects.filter(user=recipient).update(currency='JPY')
+        Wallet.objects.filter(user=walletless).delete()
+        client = APIClient()
+        client.force_authenticate(sender)
+        url = reverse('wallet:transfer-quote')
+
+        response = client.post(url, {'transaction_type': 'wallet_to_wallet', 'amount': '10.00',
+                                     'recipient_username': 'walletless'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = client.post(url, {'transaction_type': 'wallet_to_wallet', 'amount': '10.00',
+                                     'recipient_username': 'recipient'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('No exchange rate', response.data['error'])
+
+
+class EventStreamTests(TestCase):
+    """Test cases for the ASGI balance event stream"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='streamer', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+
+    def _stream(self, query_string, publish=None):
+        """Run the SSE endpoint until it has sent an event (or rejected the request)"""
+        hub = EventHub()
+        app = EventStreamApp(hub=hub, heartbeat_seconds=5)
+        sent = []
+
+        async def run():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if message.get('body', b'').startswith(b'id:'):
+                    disconnect.set()
+
+            scope = {'type': 'http', 'path': '/api/v1/events/', 'headers': [], 'query_string': query_string}
+            task = asyncio.ensure_future(app(scope, receive, send))
+            while publish and hub.connection_count() == 0 and not task.done():
+                await asyncio.sleep(0.01)
+            if publish:
+                await asyncio.get_running_loop().run_in_executor(None, hub.publish, self.user.id, publish)
+            await asyncio.wait_for(task, 5)
+
+        async_to_sync(run)()
+        return sent
+
+    def test_rejects_missing_token(self):
+        """Test unauthenticated clients get 401"""
+        sent = self._stream(b'')
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_streams_published_event(self):
+        """Test events published from another thread reach the client"""
+        sent = self._stream(
+            f'token={self.token.key}'.encode(),
+            publish={'type': 'wallet.balance', 'balance': '10.00', 'currency': 'USD'}
+        )
+        self.assertEqual(sent[0]['status'], 200)
+        body = sent[-1]['body'].decode()
+        self.assertIn('event: wallet.balance', body)
+        data = json.loads(body.split('data: ', 1)[1])
+        self.assertEqual(data['balance'], '10.00')
+
+    def test_processor_publishes_on_commit(self):
+        """Test the processor queues events for after commit"""
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('50.00'))
+        self.user.refresh_from_db()
+        recipient = User.objects.create_user(username='listener', password='testpass123')
+        transaction_obj = Transaction.objects.create(
+            user=self.user,
+            transaction_type='wallet_to_wallet',
+            amount=Decimal('10.00'),
+            recipient_user=recipient
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            TransactionProcessor(self.user, transaction_obj).process_transaction()
+        self.assertEqual(len(callbacks), 4)
+
+
+class AsyncEndpointTests(TransactionTestCase):
+    """Test cases for the native async API endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123')
+        self.recipient = User.objects.create_user(username='asyncpeer', password='testpass123')
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+        self.user.refresh_from_db()
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {'Authorization': f'Token {self.token.key}'}
+        self.client = AsyncClient()
+
+    async def test_requires_token(self):
+        """Test requests without credentials get 401"""
+        response = await self.client.get(reverse('wallet:async-wallet'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_wallet_to_wallet_transfer(self):
+        """Test an internal transfer through the async endpoint"""
+        response = await self.client.post(
+            reverse('wallet:async-transfer'),
+            {'transaction_type': 'wallet_to_wallet', 'amount': '10.00', 'recipient_username': 'asyncpeer'},
+            content_type='application/json',
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['new_balance'], '89.90')
+
+        response = await self.client.get(
+            reverse('wallet:async-transactions'), {'status': 'completed'}, headers=self.headers
+        )
+        self.assertEqual(response.json()['count'], 1)
+
+        response = await self.client.get(reverse('wallet:async-dashboard'), headers=self.headers)
+        self.assertEqual(response.json()['summary']['monthly_spent'], '10.00')
+
+    async def test_provider_transfer_is_claimed_and_balance_checked(self):
+        """Test the async path claims the row before the provider and never calls it for an uncovered payout"""
+        statuses = []
+
+        async def submit(transaction_obj):
+            statuses.append(await Transaction.objects.filter(pk=transaction_obj.pk).values_list(
+                'status', flat=True
+            ).aget())
+            return ProviderResult(True, 'bk-async', 'Approved')
+
+        with patch('wallet.async_views.async_provider_client.submit', submit):
+            for amount in ('10.00', '500.00'):
+                response = await self.client.post(
+                    reverse('wallet:async-transfer'),
+                    {'transaction_type': 'wallet_to_bkash', 'amount': amount, 'mobile_number': '01712345678'},
+                    content_type='application/json',
+                    headers=self.headers
+                )
+                self.assertEqual(response.json()['status'], 'completed' if amount == '10.00' else 'failed')
+
+        self.assertEqual(statuses, ['processing'])
+        wallet = await Wallet.objects.aget(user=self.user)
+        self.assertEqual(wallet.balance, Decimal('89.90'))
+
+    def test_processor_applies_provider_result(self):
+        """Test a provider result computed outside the processor is honoured"""
+        transaction_obj = Transaction.objects.create(
+            user=self.user,
+            transaction_type='wallet_to_bkash',
+            amount=Decimal('10.00'),
+            fee=Decimal('0.15'),
+            mobile_number='01712345678'
+        )
+        processor = TransactionProcessor(
+            self.user, transaction_obj, provider_result=ProviderResult(True, 'BK123', 'Approved')
+        )
+        success, message = processor.process_transaction()
+        self.assertTrue(success)
+        transaction_obj.refresh_from_db()
+        self.assertEqual(transaction_obj.reference_number, 'BK123')
+
+
+class OutboxTests(TestCase):
+    """Test cases for the transactional outbox and dispatcher"""
+
+    class ListSink:
+        def __init__(self, fail=False):
+            self.fail = fail
+            self.events = []
+
+        def send(self, events):
+            if self.fail:
+                raise ConnectionError('sink down')
+            self.events.extend(events)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='outboxuser', password='testpass123')
+        self.transaction = Transaction.objects.create(
+            user=self.user,
+            transaction_type='wallet_to_bkash',
+            amount=Decimal('10.00'),
+            mobile_number='01712345678'
+        )
+
+    def test_status_change_writes_event(self):
+        """Test creation and status changes are recorded, other saves are not"""
+        self.transaction.description = 'edited'
+        self.transaction.save()
+        self.transaction.mark_completed()
+        events = list(OutboxEvent.objects.values_list('event_type', 'payload__status'))
+        self.assertEqual(events, [
+            ('transaction.created', 'pending'),
+            ('transaction.status_changed', 'completed'),
+        ])
+
+    def test_dispatch_in_order_with_leases(self):
+        """Test batches are delivered in order and leased rows are not shared"""
+        self.transaction.mark_completed()
+        sink = self.ListSink()
+        first = OutboxDispatcher(sinks=[sink], node_id='node-a')
+        second = OutboxDispatcher(sinks=[sink], node_id='node-b')
+
+        events = first.claim()
+        self.assertEqual(len(events), 2)
+        self.assertEqual(second.claim(), [])
+
+        self.assertEqual(first.deliver(events), 2)
+        self.assertEqual([event.event_type for event in sink.events],
+                         ['transaction.created', 'transaction.status_changed'])
+        self.assertEqual(OutboxEvent.objects.filter(status='delivered').count(), 2)
+        self.assertEqual(second.run_once(), 0)
+
+    def test_claim_skips_past_blocked_transactions(self):
+        """Test a batch blocked behind another node's lease does not stall the dispatcher"""
+        for status_value in ('processing', 'completed'):
+            self.transaction.status = status_value
+            self.transaction.save()
+        other = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_bkash', amount=Decimal('5.00'), mobile_number='01712345678'
+        )
+        first_event = OutboxEvent.objects.filter(aggregate_id=str(self.transaction.transaction_id)).earliest('id')
+        OutboxEvent.objects.filter(id=first_event.id).update(
+            lease_owner='node-b', lease_expires_at=timezone.now() + timedelta(seconds=30)
+        )
+
+        events = OutboxDispatcher(sinks=[self.ListSink()], node_id='node-a', batch_size=2).claim()
+        self.assertEqual([event.aggregate_id for event in events], [str(other.transaction_id)])
+
+    def test_failed_delivery_backs_off(self):
+        """Test a failing sink schedules a retry instead of redelivering at once"""
+        dispatcher = OutboxDispatcher(sinks=[self.ListSink(fail=True)], node_id='node-a')
+        self.assertEqual(dispatcher.run_once(), 0)
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, 'pending')
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(dispatcher.claim(), [])
+
+
+@override_settings(TRANSACTION_RETRY_MAX_ATTEMPTS=2)
+class ProviderRetryTests(TestCase):
+    """Test cases for retrying transient provider failures"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='retrier', password='testpass123')
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+        self.user.refresh_from_db()
+        self.transaction = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_bkash', amount=Decimal('10.00'),
+            fee=Decimal('0.10'), mobile_number='01712345678'
+        )
+
+    def _fail_transiently(self):
+        return complete_transfer(
+            self.user, self.transaction, provider_result=ProviderResult(False, '', 'bkash timeout', True)
+        )
+
+    def test_transient_failure_is_retried_then_escalated(self):
+        """Test a blip schedules a retry and exhausting attempts marks the transaction failed"""
+        success, message = self._fail_transiently()
+        self.assertFalse(success)
+        self.assertEqual(self.transaction.status, 'retrying')
+        self.assertEqual(self.transaction.attempt_count, 1)
+        self.assertIsNotNone(self.transaction.next_attempt_at)
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+
+        self.assertIsNone(retry_transaction(self.transaction.id))  # not due yet
+
+        Transaction.objects.filter(id=self.transaction.id).update(status='processing')
+        self._fail_transiently()
+        self.assertEqual(self.transaction.status, 'failed')
+        self.assertIsNone(self.transaction.next_attempt_at)
+
+    def test_due_retry_completes(self):
+        """Test the retrier re-runs only the provider step and debits once"""
+        self._fail_transiently()
+        Transaction.objects.filter(id=self.transaction.id).update(next_attempt_at=timezone.now())
+
+        with patch.dict(SIMULATED_SUCCESS_RATES, {'bkash': 1.0}):
+            retried = retry_transaction(self.transaction.id)
+
+        self.assertEqual(retried.status, 'completed')
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('89.90'))
+
+    def test_queued_retries_count_toward_limits(self):
+        """Test transfers waiting on a retry use up the limits they will complete against"""
+        self._fail_transiently()
+        Wallet.objects.filter(user=self.user).update(daily_limit=Decimal('15.00'))
+        self.user.refresh_from_db()
+        with self.assertRaises(ValidationError):
+            TransactionValidator.validate_limits(self.user, Decimal('10.00'))
+        TransactionValidator.validate_limits(self.user, Decimal('5.00'))
+
+
+class StaleTransactionSweepTests(TestCase):
+    """Test cases for the stale pending-transaction sweeper"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sweeper', password='testpass123')
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+        self.recipient = User.objects.create_user(username='sweepee', password='testpass123')
+
+    def _stuck(self, **fields):
+        transaction_obj = Transaction.objects.create(user=self.user, amount=Decimal('10.00'), fee=Decimal('0.10'), **fields)
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Transaction.objects.filter(id=transaction_obj.id).update(created_at=an_hour_ago, updated_at=an_hour_ago)
+        return transaction_obj
+
+    def test_sweep_settles_stale_transactions(self):
+        """Test stuck rows are failed without balance effects and logged; fresh rows are untouched"""
+        mobile = self._stuck(transaction_type='wallet_to_bkash', mobile_number='01712345678')
+        internal = self._stuck(transaction_type='wallet_to_wallet', recipient_user=self.recipient, status='processing')
+        fresh = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_nagad', amount=Decimal('5.00'), mobile_number='01712345678'
+        )
+
+        out = StringIO()
+        call_command('sweep_stale_transactions', stdout=out)
+        self.assertIn('failed 2', out.getvalue())
+
+        for transaction_obj in (mobile, internal):
+            transaction_obj.refresh_from_db()
+            self.assertEqual(transaction_obj.status, 'failed')
+            self.assertTrue(transaction_obj.logs.filter(new_status='failed').exists())
+        self.assertEqual(Transaction.objects.get(id=fresh.id).status, 'pending')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+        self.assertEqual(Wallet.objects.get(user=self.recipient).balance, Decimal('0.00'))
+
+    def test_sweep_skips_rows_that_moved_on(self):
+        """Test a row updated since the scan is left alone"""
+        stuck = self._stuck(transaction_type='wallet_to_card')
+        stale_before = timezone.now() - timedelta(minutes=15)
+        Transaction.objects.filter(id=stuck.id).update(updated_at=timezone.now())
+        self.assertIsNone(sweep_transaction(stuck.id, stale_before))
+
+
+@override_settings(PROVIDER_RESILIENCE={'default': {'MAX_CONCURRENT': 1, 'MAX_WAIT_SECONDS': 0, 'FAILURE_THRESHOLD': 2}})
+class ProviderResilienceTests(TestCase):
+    """Test cases for provider bulkheads and circuit breakers"""
+
+    def tearDown(self):
+        reset_guards()
+
+    def test_breaker_opens_and_probes(self):
+        """Test consecutive failures open the circuit and a half-open probe closes it"""
+        breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=0, half_open_calls=1)
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'open')
+
+        self.assertTrue(breaker.allow())  # recovery elapsed: one probe
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_open_circuit_and_full_bulkhead_fail_fast(self):
+        """Test calls are refused without reaching the provider and are retryable"""
+        guard = provider_guard('bkash')
+        with guard.bulkhead.slot():
+            with self.assertRaises(BulkheadFull):
+                with guard.bulkhead.slot():
+                    pass
+            result = call_provider('bkash')
+        self.assertFalse(result.success)
+        self.assertTrue(result.retryable)
+        self.assertEqual(guard.bulkhead.rejected, 2)
+
+        with patch.dict(SIMULATED_SUCCESS_RATES, {'bkash': 0.0}):
+            call_provider('bkash')
+            call_provider('bkash')
+        self.assertEqual(guard.breaker.state, 'open')
+        with patch.dict(SIMULATED_SUCCESS_RATES, {'bkash': 1.0}):
+            self.assertIn('circuit is open', call_provider('bkash').message)
+        self.assertEqual(provider_guard('card').breaker.state, 'closed')
+
+    def test_health_endpoint_is_staff_only(self):
+        """Test the provider health endpoint reports every provider to staff"""
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='ops', password='testpass123'))
+        self.assertEqual(client.get(reverse('wallet:provider-health')).status_code, status.HTTP_403_FORBIDDEN)
+
+        client.force_authenticate(User.objects.create_user(username='admin', password='x', is_staff=True))
+        response = client.get(reverse('wallet:provider-health'))
+        self.assertEqual([item['provider'] for item in response.data['providers']], ['bkash', 'card', 'nagad'])
+
+
+class ScheduledTransferTests(TestCase):
+    """Test cases for scheduled and recurring transfers"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer', password='testpass123')
+        self.recipient = User.objects.create_user(username='landlord', password='testpass123')
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('500.00'))
+        self.start = timezone.now() - timedelta(minutes=5)
+        self.schedule = ScheduledTransfer.objects.create(
+            user=self.user,
+            transaction_type='wallet_to_wallet',
+            amount=Decimal('100.00'),
+            recipient_user=self.recipient,
+            frequency='monthly',
+            start_at=self.start,
+            next_run_at=self.start
+        )
+
+    def test_monthly_occurrences_keep_day_of_month(self):
+        """Test the 31st falls back to the last day of short months only"""
+        self.schedule.start_at = self.start.replace(year=2026, month=1, day=31)
+        first = self.schedule.start_at
+        february = self.schedule.next_occurrence(first)
+        march = self.schedule.next_occurrence(february)
+        self.assertEqual((february.month, february.day), (2, 28))
+        self.assertEqual((march.month, march.day), (3, 31))
+
+    def test_slot_runs_once(self):
+        """Test a slot cannot be executed twice"""
+        run = execute_scheduled_transfer(self.schedule.id, self.start)
+        self.assertEqual(run.status, 'completed')
+        self.assertIsNone(execute_scheduled_transfer(self.schedule.id, self.start))
+
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.run_count, 1)
+        self.assertGreater(self.schedule.next_run_at, timezone.now())
+
+    def test_failed_validation_is_recorded(self):
+        """Test a run that fails transfer validation is logged and the schedule advances"""
+        Wallet.objects.filter(user=self.user).update(daily_limit=Decimal('50.00'))
+        run = execute_scheduled_transfer(self.schedule.id, self.start)
+        self.assertEqual(run.status, 'failed')
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+        self.schedule.refresh_from_db()
+        self.assertGreater(self.schedule.next_run_at, timezone.now())
+
+
+    def test_deferred_transfer_leaves_run_retrying(self):
+        """Test a run whose transfer went to the retrier is not reported failed and takes its outcome"""
+        ScheduledTransfer.objects.filter(id=self.schedule.id).update(
+            transaction_type='wallet_to_bkash', recipient_user=None, mobile_number='01712345678'
+        )
+        with patch('utils.wallet_process.call_provider', return_value=ProviderResult(False, '', 'timeout', True)):
+            run = execute_scheduled_transfer(self.schedule.id, self.start)
+        self.assertEqual(run.status, 'retrying')
+
+        Transaction.objects.filter(id=run.transaction_id).update(next_attempt_at=timezone.now())
+        with patch('utils.wallet_process.call_provider', return_value=ProviderResult(True, 'bk-3', 'Approved')):
+            retry_transaction(run.transaction_id)
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'completed')
+
+    def test_command_counts_errors_apart_from_taken_slots(self):
+        """Test only a taken slot counts as already run; other exceptions are reported as errors"""
+        out, err = StringIO(), StringIO()
+        with patch('wallet.management.commands.run_scheduled_transfers.execute_scheduled_transfer',
+                   side_effect=RuntimeError('database is locked')):
+            call_command('run_scheduled_transfers', workers=1, stdout=out, stderr=err)
+        self.assertIn('already run 0, errors 1', out.getvalue())
+        self.assertIn('database is locked', err.getvalue())
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DISBURSEMENT_CHUNK_SIZE=2)
+class DisbursementTests(TestCase):
+    """Test cases for bulk disbursement jobs"""
+
+    def setUp(self):
+        self.employer = User.objects.create_user(username='employer', password='testpass123')
+        Wallet.objects.filter(user=self.employer).update(balance=Decimal('1000.00'))
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        UserProfile.objects.filter(user=self.bob).update(phone_number='+8801712345678')
+
+    def _job(self, content):
+        job = DisbursementJob(user=self.employer)
+        job.source_file.save('payroll.csv', ContentFile(content.encode()), save=True)
+        return job
+
+    def test_job_pays_resolved_recipients(self):
+        """Test usernames and phone numbers resolve and invalid rows are reported"""
+        job = self._job(
+            'recipient,amount,description\n'
+            'alice,100.00,salary\n'
+            '+8801712345678,50.00,salary\n'
+            'nobody,10.00,\n'
+            'alice,abc,\n'
+        )
+        job = run_job(claim_next_job('test-node'))
+
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.total_rows, job.succeeded_legs, job.invalid_legs), (4, 2, 2))
+        self.assertEqual(Wallet.objects.get(user=self.alice).balance, Decimal('100.00'))
+        self.assertEqual(Wallet.objects.get(user=self.bob).balance, Decimal('50.00'))
+
+        lines = ''.join(result_rows(job)).splitlines()
+        self.assertEqual(lines[0], 'row,recipient,amount,fee,status,message,transaction_id')
+        self.assertIn('Recipient not found', lines[3])
+        self.assertIn('Invalid amount', lines[4])
+
+    def test_insufficient_balance_fails_before_paying(self):
+        """Test a job larger than the balance pays nobody"""
+        self._job('recipient,amount\nalice,900.00\nbob,900.00\n')
+        job = run_job(claim_next_job('test-node'))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Insufficient wallet balance', job.error)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_upload_and_poll(self):
+        """Test the upload endpoint queues a job that can be polled"""
+        client = APIClient()
+        client.force_authenticate(self.employer)
+        upload = ContentFile(b'recipient,amount\nalice,5.00\n', name='payroll.csv')
+        response = client.post(reverse('wallet:disbursements-list'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'queued')
+
+        run_job(claim_next_job('test-node'))
+        response = client.get(reverse('wallet:disbursements-detail', args=[response.data['job_id']]))
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['progress'], 100.0)
+
+
+@override_settings(SETTLEMENT_ROOT=tempfile.mkdtemp(), SETTLEMENT_CHUNK_SIZE=2)
+class SettlementTests(TestCase):
+    """Test cases for provider settlement files"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='settler', password='testpass123')
+        self.window_end = timezone.now() + timedelta(minutes=1)
+        self.window_start = self.window_end - timedelta(days=1)
+
+    def _transaction(self, transaction_type='wallet_to_bkash', status='completed', amount='10.00'):
+        return Transaction.objects.create(
+            user=self.user, transaction_type=transaction_type, amount=Decimal(amount),
+            fee=Decimal('0.10'), mobile_number='01712345678', status=status,
+            completed_at=timezone.now() if status == 'completed' else None
+        )
+
+    def test_settles_eligible_transactions_once(self):
+        """Test only completed outgoing transactions of the provider are settled, exactly once"""
+        settled = [self._transaction(amount=amount) for amount in ('10.00', '20.00', '30.00')]
+        pending = self._transaction(status='pending')
+        nagad = self._transaction(transaction_type='wallet_to_nagad')
+
+        batch = generate_settlement('bkash', self.window_start, self.window_end)
+        self.assertEqual(batch.status, 'generated')
+        self.assertEqual((batch.transaction_count, batch.total_amount, batch.total_fee),
+                         (3, Decimal('60.00'), Decimal('0.30')))
+        self.assertEqual(Transaction.objects.filter(settlement_batch=batch).count(), 3)
+        self.assertIsNone(Transaction.objects.get(id=pending.id).settlement_batch)
+        self.assertIsNone(Transaction.objects.get(id=nagad.id).settlement_batch)
+
+        with open(batch.file_path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines[0].startswith('H|DAFFODILPAY|'))
+        self.assertEqual(len(lines), 5)
+        self.assertIn(str(settled[-1].transaction_id), lines[1])
+        self.assertEqual(lines[-1], 'T|3|60.00|0.30')
+
+        self.assertIsNone(generate_settlement('bkash', self.window_start, self.window_end))
+
+    def test_unfinished_batch_is_regenerated(self):
+        """Test a batch left generating by a crashed run releases and re-settles its rows"""
+        self._transaction(transaction_type='wallet_to_card')
+        stale = SettlementBatch.objects.create(
+            provider='card', window_start=self.window_start, window_end=self.window_end
+        )
+        Transaction.objects.update(settlement_batch=stale)
+
+        batch = generate_settlement('card', self.window_start, self.window_end)
+        self.assertEqual(batch.id, stale.id)
+        self.assertEqual(batch.transaction_count, 1)
+        self.assertTrue(batch.file_path.endswith('.dat'))
+
+    def test_late_completion_is_settled_in_the_next_window(self):
+        """Test a transfer created in an already settled window is settled by the window it completed in"""
+        late = self._transaction(status='retrying')
+        Transaction.objects.filter(id=late.id).update(created_at=self.window_start - timedelta(hours=1))
+        previous = generate_settlement('bkash', self.window_start - timedelta(days=1), self.window_start)
+        self.assertEqual(previous.transaction_count, 0)
+
+        late.mark_completed()
+        batch = generate_settlement('bkash', self.window_start, self.window_end)
+        self.assertEqual(batch.transaction_count, 1)
+        self.assertEqual(Transaction.objects.get(id=late.id).settlement_batch, batch)
+
+    def test_older_rows_wait_for_their_window_unless_it_was_generated(self):
+        """Test a window takes older unsettled rows only when their own file was already written"""
+        older = [self._transaction(), self._transaction()]
+        Transaction.objects.filter(id=older[0].id).update(completed_at=self.window_start - timedelta(days=2, hours=1))
+        Transaction.objects.filter(id=older[1].id).update(completed_at=self.window_start - timedelta(hours=1))
+        SettlementBatch.objects.create(
+            provider='bkash', window_start=self.window_start - timedelta(days=1), window_end=self.window_start,
+            status='generated'
+        )
+
+        batch = generate_settlement('bkash', self.window_start, self.window_end)
+        self.assertEqual(batch.transaction_count, 1)
+        self.assertEqual(Transaction.objects.get(id=older[1].id).settlement_batch, batch)
+        self.assertIsNone(Transaction.objects.get(id=older[0].id).settlement_batch)
+
+        backfill = generate_settlement(
+            'bkash', self.window_start - timedelta(days=3), self.window_start - timedelta(days=2)
+        )
+        self.assertEqual(Transaction.objects.get(id=older[0].id).settlement_batch, backfill)
+
+
+@override_settings(
+    TRANSACTION_ARCHIVE_ROOT=tempfile.mkdtemp(), TRANSACTION_ARCHIVE_BLOCK_SIZE=2, TRANSACTION_ARCHIVE_CHUNK_SIZE=3
+)
+class ArchiveTests(TestCase):
+    """Test cases for archiving old transactions to segment files"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='archivist', password='testpass123')
+        self.other = User.objects.create_user(username='bystander', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.old = []
+        for days, user, transaction_type in [
+            (800, self.user, 'wallet_to_wallet'), (790, self.user, 'card_to_wallet'), (780, self.other, 'wallet_to_wallet'),
+            (770, self.user, 'wallet_to_wallet'), (500, self.user, 'card_to_wallet'),
+        ]:
+            transaction_obj = Transaction.objects.create(
+                user=user, transaction_type=transaction_type, amount=Decimal('5.00'), status='completed'
+            )
+            TransactionLog.objects.create(transaction=transaction_obj, previous_status='pending', new_status='completed')
+            Transaction.objects.filter(id=transaction_obj.id).update(created_at=timezone.now() - timedelta(days=days))
+            self.old.append(transaction_obj)
+        self.live = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_wallet', amount=Decimal('1.00'), status='completed'
+        )
+
+    def tearDown(self):
+        reset_readers()
+
+    def test_archive_moves_rows_and_history_reads_through(self):
+        """Test old rows leave the table and the history API still lists them in order"""
+        segments = archive_transactions(months=12)
+        self.assertEqual(sum(segment.transaction_count for segment in segments), 5)
+        self.assertEqual(sum(segment.log_count for segment in segments), 5)
+        self.assertTrue(all(segment.status == 'complete' for segment in ArchiveSegment.objects.all()))
+        self.assertEqual(list(Transaction.objects.values_list('id', flat=True)), [self.live.id])
+        self.assertEqual(TransactionLog.objects.count(), 0)
+
+        response = self.client.get(reverse('wallet:transactions-list'))
+        expected = [self.live, self.old[4], self.old[3], self.old[1], self.old[0]]
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(
+            [item['transaction_id'] for item in response.data['results']],
+            [str(transaction_obj.transaction_id) for transaction_obj in expected]
+        )
+
+        response = self.client.get(reverse('wallet:transactions-list'), {'transaction_type': 'card_to_wallet'})
+        self.assertEqual(response.data['count'], 2)
+
+        response = self.client.get(reverse('wallet:transactions-list'), {'ordering': 'created_at'})
+        self.assertEqual(response.data['results'][0]['transaction_id'], str(self.old[0].transaction_id))
+
+    def test_retrieve_archived_by_transaction_id(self):
+        """Test an archived transaction is found by transaction_id, but only by its owner"""
+        archive_transactions(months=12)
+        url = reverse('wallet:transactions-detail', args=[self.old[1].transaction_id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount'], '5.00')
+
+        other_url = reverse('wallet:transactions-detail', args=[self.old[2].transaction_id])
+        self.assertEqual(self.client.get(other_url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TransactionLogPartitionTests(TestCase):
+    """Test cases for rolling transaction logs into monthly partitions"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.transaction = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_wallet', amount=Decimal('5.00'), status='completed'
+        )
+        TransactionLog.objects.all().delete()
+
+        current = month_start(timezone.now())
+        self.logs = []
+        for months_ago, new_status in [(3, 'processing'), (1, 'completed'), (0, 'cancelled')]:
+            log = TransactionLog.objects.create(
+                transaction=self.transaction, previous_status='pending', new_status=new_status
+            )
+            created_at = add_months(current, -months_ago) + timedelta(days=1)
+            TransactionLog.objects.filter(id=log.id).update(created_at=created_at)
+            self.logs.append(log)
+
+    def test_roll_moves_closed_months_and_history_spans_partitions(self):
+        """Test closed months leave the hot table and the log API still lists them in order"""
+        moved = roll_closed_months()
+        self.assertEqual(sorted(moved.values()), [1, 1])
+        self.assertEqual(list(TransactionLog.objects.values_list('id', flat=True)), [self.logs[2].id])
+
+        response = self.client.get(reverse('wallet:transaction-logs'))
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([item['id'] for item in response.data['results']], [log.id for log in reversed(self.logs)])
+        self.assertEqual(response.data['results'][1]['transaction_id'], str(self.transaction.transaction_id))
+
+        response = self.client.get(reverse('wallet:transaction-logs'), {'ordering': 'created_at'})
+        self.assertEqual(response.data['results'][0]['new_status'], 'processing')
+
+        response = self.client.get(reverse('wallet:transaction-logs'), {'new_status': 'completed'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_listing_does_not_count_partitions(self):
+        """Test pages are sized from the stored counts and skip partitions without the user's rows"""
+        roll_closed_months()
+        other = User.objects.create_user(username='bystander', password='testpass123')
+        self.client.force_authenticate(other)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('wallet:transaction-logs'))
+        self.assertEqual(response.data['count'], 0)
+        self.assertFalse([query for query in queries.captured_queries if 'wallet_txlog_' in query['sql']])
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('wallet:transaction-logs'), {'new_status': 'processing'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.logs[0].id])
+        partition_queries = [query['sql'] for query in queries.captured_queries if 'wallet_txlog_' in query['sql']]
+        self.assertEqual(len(partition_queries), 1)
+        self.assertNotIn('COUNT', partition_queries[0])
+
+    def test_retention_drops_whole_partitions(self):
+        """Test expired months are dropped as tables rather than deleted row by row"""
+        roll_closed_months()
+        self.assertEqual(len(drop_expired(retention_months=2)), 1)
+        self.assertEqual(TransactionLogPartition.objects.count(), 1)
+
+        response = self.client.get(reverse('wallet:transaction-logs'))
+        self.assertEqual([item['new_status'] for item in response.data['results']], ['cancelled', 'completed'])
+
+
+class BalanceSnapshotTests(TestCase):
+    """Test cases for end-of-day balance snapshots and balance-as-of queries"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='saver', password='testpass123')
+        self.sender = User.objects.create_user(username='payer', password='testpass123')
+        self.client = APIClient()
+
+        self.today = timezone.localdate()
+        self.days = [self.today - timedelta(days=offset) for offset in (3, 2, 1)]
+        Wallet.objects.filter(user__in=[self.user, self.sender]).update(
+            created_at=day_bounds(self.today - timedelta(days=5))[0]
+        )
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('44.00'))
+        Wallet.objects.filter(user=self.sender).update(balance=Decimal('100.00'))
+
+        # 0 -> +50 -> -21 -> +10 (from payer) -> +5 today
+        for day, user, transaction_type, amount, fee in [
+            (self.days[0], self.user, 'card_to_wallet', '50.00', '0.00'),
+            (self.days[1], self.user, 'wallet_to_card', '20.00', '1.00'),
+            (self.days[2], self.sender, 'wallet_to_wallet', '10.00', '0.00'),
+            (None, self.user, 'bkash_to_wallet', '5.00', '0.00'),
+        ]:
+            transaction_obj = Transaction.objects.create(
+                user=user, transaction_type=transaction_type, amount=Decimal(amount), fee=Decimal(fee),
+                recipient_user=self.user if transaction_type == 'wallet_to_wallet' else None, status='completed'
+            )
+            completed_at = day_bounds(day)[0] + timedelta(hours=12) if day else timezone.now()
+            Transaction.objects.filter(id=transaction_obj.id).update(completed_at=completed_at)
+
+    def test_snapshot_day_and_balance_as_of(self):
+        """Test closing balances are derived in bulk and as-of replays from the nearest snapshot"""
+        for day in self.days:
+            self.assertEqual(snapshot_day(day), 2)
+        snapshot_day(self.days[0])  # rerun upserts
+
+        wallet = Wallet.objects.get(user=self.user)
+        self.assertEqual(
+            list(wallet.balance_snapshots.order_by('date').values_list('balance', flat=True)),
+            [Decimal('50.00'), Decimal('29.00'), Decimal('39.00')]
+        )
+        self.assertEqual(self.sender.wallet.balance_snapshots.get(date=self.days[1]).balance, Decimal('110.00'))
+
+        noon = day_bounds(self.days[2])[0] + timedelta(hours=12)
+        self.assertEqual(balance_as_of(wallet, noon - timedelta(minutes=1)), Decimal('29.00'))
+        self.assertEqual(balance_as_of(wallet, noon + timedelta(minutes=1)), Decimal('39.00'))
+
+        BalanceSnapshot.objects.all().delete()
+        self.assertEqual(balance_as_of(wallet, noon + timedelta(minutes=1)), Decimal('39.00'))
+
+        with self.assertRaises(ValueError):
+            snapshot_day(self.today)
+
+    def test_history_endpoint_fills_gaps(self):
+        """Test the series uses snapshots, covers unsnapshotted days and today, and validates the range"""
+        snapshot_day(self.days[0])
+        self.client.force_authenticate(User.objects.get(id=self.user.id))  # wallet updated behind the cached one
+        response = self.client.get(
+            reverse('wallet:wallet-history'), {'from': str(self.days[0]), 'to': str(self.today)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [point['balance'] for point in response.data['series']], ['50.00', '29.00', '39.00', '44.00']
+        )
+
+        response = self.client.get(reverse('wallet:wallet-history'), {'from': str(self.today), 'to': str(self.days[0])})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_history_query_count_does_not_grow_with_range(self):
+        """Test a long unsnapshotted range rolls one daily-net query forward instead of querying per day"""
+        wallet = Wallet.objects.get(user=self.user)
+        Wallet.objects.filter(id=wallet.id).update(created_at=day_bounds(self.today - timedelta(days=400))[0])
+        wallet.refresh_from_db()
+        with CaptureQueriesContext(connection) as short:
+            balance_history(wallet, self.today - timedelta(days=5), self.today)
+        with CaptureQueriesContext(connection) as long:
+            series = balance_history(wallet, self.today - timedelta(days=365), self.today)
+        self.assertEqual(len(long.captured_queries), len(short.captured_queries))
+        self.assertEqual([balance for _, balance in series[-5:]], [
+            Decimal('0.00'), Decimal('50.00'), Decimal('29.00'), Decimal('39.00'), Decimal('44.00')
+        ])
+
+
+class StatementTests(TestCase):
+    """Test cases for bulk monthly statement generation"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='statement', password='testpass123')
+        self.sender = User.objects.create_user(username='tipper', password='testpass123')
+        first = timezone.localdate().replace(day=1) - timedelta(days=1)
+        self.month = f'{first:%Y-%m}'
+        month_start = day_bounds(first.replace(day=1))[0]
+        Wallet.objects.filter(user__in=[self.user, self.sender]).update(created_at=month_start - timedelta(days=40))
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('44.00'))
+
+        for completed_at, user, transaction_type, amount, fee in [
+            (month_start + timedelta(days=1), self.user, 'card_to_wallet', '50.00', '0.50'),
+            (month_start + timedelta(days=2), self.user, 'wallet_to_bkash', '20.00', '1.00'),
+            (month_start + timedelta(days=3), self.sender, 'wallet_to_wallet', '10.00', '0.00'),
+            (timezone.now(), self.user, 'card_to_wallet', '5.00', '0.00'),
+        ]:
+            transaction_obj = Transaction.objects.create(
+                user=user, transaction_type=transaction_type, amount=Decimal(amount), fee=Decimal(fee),
+                recipient_user=self.user if transaction_type == 'wallet_to_wallet' else None, status='completed'
+            )
+            Transaction.objects.filter(id=transaction_obj.id).update(completed_at=completed_at)
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(STATEMENT_ROOT=self.tempdir.name)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.tempdir.cleanup()
+
+    def _generate(self):
+        call_command('generate_statements', month=self.month, workers=1, shard_size=1, stdout=StringIO())
+        return json.loads((statement_root(self.month) / 'manifest.json').read_text())
+
+    def test_statements_and_manifest(self):
+        """Test balances, fees and lines add up and every statement is in the manifest"""
+        manifest = self._generate()
+        self.assertEqual(manifest['statements'], 2)
+        shard = json.loads((statement_root(self.month) / manifest['shards'][0]['file']).read_text())
+        entry = shard['statements'][0]
+        self.assertEqual(entry['user_id'], self.user.id)
+        self.assertEqual(
+            [entry['opening_balance'], entry['closing_balance'], entry['fees'], entry['transactions']],
+            ['0.00', '39.00', '1.00', 3]
+        )
+
+        directory = statement_root(self.month) / 'shard-00000'
+        lines = (directory / f'{self.user.id}.csv').read_text().splitlines()
+        self.assertEqual([line.split(',')[-1] for line in lines[1:]], ['50.00', '29.00', '39.00'])
+        self.assertIn('39.00', (directory / f'{self.user.id}.html').read_text())
+
+    def test_rerun_only_redoes_unfinished_shards(self):
+        """Test a resumed run skips shards whose manifest was written"""
+        self._generate()
+        (statement_root(self.month) / 'shard-00001.json').unlink()
+        with patch('wallet.management.commands.generate_statements.generate_shard',
+                   wraps=generate_shard) as shard:
+            manifest = self._generate()
+        self.assertEqual([call.args[1] for call in shard.call_args_list], [1])
+        self.assertEqual(manifest['statements'], 2)
+
+
+class SeedLoadDataTests(TestCase):
+    """Test cases for the synthetic dataset generator"""
+
+    def _seed(self, prefix):
+        call_command('seed_load_data', users=30, transactions=300, seed=7, until='2026-01-31',
+                     prefix=prefix, batch_size=100, stdout=StringIO())
+        return Transaction.objects.filter(user__username__startswith=prefix).order_by('id')
+
+    def test_seeds_users_with_wallets_and_logs(self):
+        """Test users get a profile and wallet without the signal, and moved transactions a log"""
+        transactions = self._seed('seed_a_')
+        users = User.objects.filter(username__startswith='seed_a_')
+        self.assertEqual(users.count(), 30)
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 30)
+        self.assertEqual(Wallet.objects.filter(user__in=users).count(), 30)
+        self.assertEqual(transactions.count(), 300)
+        self.assertEqual(
+            TransactionLog.objects.filter(user__in=users).count(), transactions.exclude(status='pending').count()
+        )
+        self.assertFalse(transactions.filter(transaction_type='wallet_to_wallet', recipient_user__isnull=True).exists())
+        self.assertTrue(all(
+            transaction_obj.created_at < transaction_obj.completed_at
+            for transaction_obj in transactions.filter(status='completed')
+        ))
+
+        with self.assertRaises(CommandError):
+            self._seed('seed_a_')
+
+    def test_same_seed_same_data(self):
+        """Test two runs with one seed generate the same transactions"""
+        fields = ['transaction_type', 'status', 'amount', 'fee', 'created_at']
+        first = list(self._seed('seed_b_').values_list(*fields))
+        second = list(self._seed('seed_c_').values_list(*fields))
+        self.assertEqual(first, second)
+
+
+class BenchCommandTests(TestCase):
+    """Test cases for the API benchmark command"""
+
+    def _results(self, p95, queries):
+        return {'commit': 'abc', 'endpoints': {'dashboard': {
+            'throughput_rps': 50.0, 'latency_ms': {'p95': p95}, 'queries': {'median': queries, 'max': queries},
+        }}}
+
+    def test_requests_from_seeded_actors(self):
+        """Test actors are funded with a card and token, and requests fill in typed placeholders"""
+        call_command('seed_load_data', users=5, transactions=20, seed=7, prefix='bench_t_', stdout=StringIO())
+        actors = BenchCommand()._prepare_actors('bench_t_', 3, 'Daffodil-Bench-2024', random.Random(1))
+        self.assertEqual(len(actors), 3)
+        self.assertTrue(Wallet.objects.get(user__username=actors[0]['username']).balance > Decimal('1000000'))
+
+        scenario = {'name': 'transfer', 'method': 'POST', 'url': 'wallet:transfer', 'body': {
+            'transaction_type': 'wallet_to_card', 'amount': '10.00', 'card_id': '{card_id}', 'description': 'n{n}',
+        }}
+        requests = build_requests(scenario, actors, 'run', 4, random.Random(1))
+        self.assertEqual(requests[0]['path'], reverse('wallet:transfer'))
+        self.assertIsInstance(requests[0]['json']['card_id'], int)
+        self.assertEqual(requests[3]['json']['description'], 'n3')
+        self.assertEqual(requests[3]['headers'], requests[0]['headers'])
+
+        counts = BenchCommand()._count_queries(requests[:2])
+        self.assertTrue(all(count > 0 for count in counts))
+        self.assertEqual(Transaction.objects.filter(description='n0', transaction_type='wallet_to_card').count(), 1)
+
+    def test_compare_fails_on_regression(self):
+        """Test --max-regression trips on a slower p95 or an extra query, and only then"""
+        command = BenchCommand(stdout=StringIO())
+        command._compare(self._results(100.0, 4), self._results(110.0, 4), 0.2)
+        command._compare(self._results(100.0, 4), self._results(300.0, 6), None)
+        with self.assertRaisesMessage(CommandError, 'dashboard: p95'):
+            command._compare(self._results(100.0, 4), self._results(130.0, 4), 0.2)
+        with self.assertRaisesMessage(CommandError, 'dashboard: queries 4 -> 5'):
+            command._compare(self._results(100.0, 4), self._results(100.0, 5), 0.2)
+
+
+class ConcurrencyTests(TransactionTestCase):
+    """Test cases for atomic wallet updates, cancel races and the torture harness"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='racer', password='testpass123')
+        self.recipient = User.objects.create_user(username='racee', password='testpass123')
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+
+    def test_stale_instance_cannot_overdraw(self):
+        """Test a debit checks the stored balance, not the instance's copy"""
+        first = Wallet.objects.get(user=self.user)
+        second = Wallet.objects.get(user=self.user)
+        first.debit(Decimal('80.00'))
+        with self.assertRaises(ValidationError):
+            second.debit(Decimal('80.00'))
+        second.credit(Decimal('5.00'))
+        self.assertEqual(second.balance, Decimal('25.00'))
+
+    def test_cancel_beats_processor(self):
+        """Test a transfer cancelled before processing moves no money and keeps a clean trail"""
+        transaction_obj = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_wallet', amount=Decimal('10.00'),
+            recipient_user=self.recipient
+        )
+        stale = Transaction.objects.get(pk=transaction_obj.pk)
+        self.assertTrue(transaction_obj.cancel(changed_by=self.user))
+        self.assertFalse(transaction_obj.cancel(changed_by=self.user))
+
+        success, message = complete_transfer(User.objects.get(pk=self.user.pk), stale)
+        self.assertFalse(success)
+        self.assertIn('cancelled', message)
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+        self.assertEqual(
+            list(transaction_obj.logs.values_list('new_status', flat=True)), ['cancelled']
+        )
+
+    def test_provider_is_called_outside_db_transactions(self):
+        """Test a transfer and its retry reach the provider without holding the write lock"""
+        from django.db import connection
+        in_transaction = []
+
+        def provider(name):
+            in_transaction.append(connection.in_atomic_block)
+            return ProviderResult(False, '', f'{name} timeout', True)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with patch('utils.wallet_process.call_provider', provider):
+            response = client.post(reverse('wallet:transfer'), {
+                'transaction_type': 'wallet_to_bkash', 'amount': '10.00', 'mobile_number': '01712345678'
+            }, format='json')
+            transaction_obj = Transaction.objects.get()
+            self.assertEqual(transaction_obj.status, 'retrying', response.data)
+            Transaction.objects.filter(id=transaction_obj.id).update(next_attempt_at=timezone.now())
+            retry_transaction(transaction_obj.id)
+        self.assertEqual(in_transaction, [False, False])
+
+    def test_claimed_payout_refuses_cancel(self):
+        """Test a cancel arriving while the provider is paying out is refused and the wallet is debited"""
+        transaction_obj = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_bkash', amount=Decimal('10.00'),
+            fee=Decimal('0.10'), mobile_number='01712345678'
+        )
+        cancelled = []
+
+        def provider(name):
+            cancelled.append(Transaction.objects.get(pk=transaction_obj.pk).cancel(changed_by=self.user))
+            return ProviderResult(True, 'bk-1', 'Approved')
+
+        with patch('utils.wallet_process.call_provider', provider):
+            success, _ = complete_transfer(User.objects.get(pk=self.user.pk), transaction_obj)
+
+        self.assertTrue(success)
+        self.assertEqual(cancelled, [False])
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('89.90'))
+        self.assertEqual(
+            list(transaction_obj.logs.order_by('id').values_list('new_status', flat=True)),
+            ['processing', 'completed', 'completed']
+        )
+
+    def test_payout_drained_mid_call_is_held_for_reconciliation(self):
+        """Test a provider success the wallet can no longer cover is held, not failed"""
+        transaction_obj = Transaction.objects.create(
+            user=self.user, transaction_type='wallet_to_bkash', amount=Decimal('10.00'),
+            fee=Decimal('0.10'), mobile_number='01712345678'
+        )
+
+        def provider(name):
+            Wallet.objects.filter(user=self.user).update(balance=Decimal('5.00'))
+            return ProviderResult(True, 'bk-2', 'Approved')
+
+        with patch('utils.wallet_process.call_provider', provider):
+            success, message = complete_transfer(User.objects.get(pk=self.user.pk), transaction_obj)
+
+        self.assertFalse(success)
+        self.assertIn('reconciliation', message)
+        transaction_obj.refresh_from_db()
+        self.assertEqual(transaction_obj.status, 'unreconciled')
+        self.assertEqual(transaction_obj.reference_number, 'bk-2')
+        self.assertFalse(transaction_obj.cancel(changed_by=self.user))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('5.00'))
+
+    def test_torture_run_is_clean(self):
+        """Test the harness checks a run and cleans up after itself"""
+        # One thread: the in-memory test database locks whole tables, so real concurrency
+        # needs the file-backed database (python manage.py torture_transfers)
+        out = StringIO()
+        call_command('torture_transfers', wallets=5, transfers=30, processes=0, threads=1, stdout=out)
+        self.assertIn('Money conserved', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='torture_').exists())
+
+
+class MetricsTests(APITestCase):
+    """Test cases for request metrics and the /metrics endpoint"""
+
+    def setUp(self):
+        reset_metrics()
+        self.user = User.objects.create_user(username='scraped', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        reset_metrics()
+
+    def test_requests_exposed_by_route(self):
+        """Test latency, query, size and status series per route pattern, and the scrape token"""
+        self.client.get(reverse('wallet:wallet'))
+        self.client.get(reverse('wallet:wallet'))
+        self.client.get('/api/v1/nowhere/')
+
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{route="api/v1/wallet/",method="GET",status="200"} 2', text)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{route="api/v1/wallet/",method="GET"} 2', text)
+        self.assertIn('http_request_db_queries_bucket{route="api/v1/wallet/",method="GET",le="+Inf"} 2', text)
+        self.assertIn('# TYPE http_response_size_bytes histogram', text)
+
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    async def test_async_requests_count_their_queries(self):
+        """Test the async path counts the queries an async view runs in sync_to_async threads"""
+        token = await Token.objects.acreate(user=self.user)
+        response = await AsyncClient().get(
+            reverse('wallet:async-wallet'), headers={'Authorization': f'Token {token.key}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        text = metrics.render()
+        self.assertIn('http_requests_total{route="api/v1/async/wallet/",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_db_queries_bucket{route="api/v1/async/wallet/",method="GET",le="1"} 0', text)
+        self.assertIn('http_request_db_queries_bucket{route="api/v1/async/wallet/",method="GET",le="+Inf"} 1', text)
+
+    def test_threads_and_workers_add_up(self):
+        """Test samples from finished threads and other workers' files are summed"""
+        counter = metrics.Counter('test_events_total', 'Test events', ['kind'])
+        threads = [threading.Thread(target=counter.inc, args=('a',)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc('a')
+
+        dead_pid = 2 ** 22 + 1
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_MULTIPROCESS_DIR=directory):
+            for nonce, count in (('dead', 10), ('gone', 100)):
+                with open(os.path.join(directory, f'metrics-{dead_pid}-{nonce}.json'), 'w') as f:
+                    json.dump({'pid': dead_pid, 'series': [['test_events_total', ['a'], [count]]],
+                               'gauges': [['provider_in_flight', [['provider', 'bkash']], 3]]}, f)
+            metrics.flush()
+            text = metrics.render()
+            # Exited workers' files are folded into one
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if not name.startswith('.')),
+                sorted([os.path.basename(metrics._process_file), metrics.EXITED_FILE])
+            )
+            self.assertEqual(metrics.render(), text)
+
+        self.assertIn('test_events_total{kind="a"} 115', text)
+        self.assertNotIn('provider_in_flight', text)
+
+
+class SlowRequestProfilingTests(APITestCase):
+    """Test cases for the slow-request profiler"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sluggish', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_slow_request_sampled(self):
+        """Test a request over the threshold leaves its queries, stacks and EXPLAIN behind"""
+        original = WalletSerializer.to_representation
+
+        def slow(serializer, instance):
+            time.sleep(0.1)
+            return original(serializer, instance)
+
+        with self.settings(SLOW_REQUEST_THRESHOLD_MS=20, SLOW_REQUEST_SAMPLE_INTERVAL_MS=2,
+                           SLOW_REQUEST_DIR=self.directory), \
+                patch.object(WalletSerializer, 'to_representation', slow):
+            response = self.client.get(reverse('wallet:wallet'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [sample] = os.listdir(self.directory)
+        sample = os.path.join(self.directory, sample)
+        with open(os.path.join(sample, 'request.json')) as f:
+            summary = json.load(f)
+        with open(os.path.join(sample, 'queries.json')) as f:
+            queries = json.load(f)
+        with open(os.path.join(sample, 'stacks.txt')) as f:
+            stacks = f.read()
+        with open(os.path.join(sample, 'explain.txt')) as f:
+            plan = f.read()
+
+        self.assertEqual(summary['route'], 'api/v1/wallet/')
+        self.assertGreaterEqual(summary['duration_ms'], 100)
+        self.assertEqual(summary['queries'], len(queries))
+        self.assertTrue(any(query['call_site'].startswith('wallet/views.py:') for query in queries))
+        self.assertNotIn('params', queries[0])
+        self.assertIn('slow (tests.py:', stacks)
+        self.assertIn('SELECT', plan)
+
+    async def test_slow_async_request_sampled(self):
+        """Test the async path records the queries the view runs in sync_to_async threads"""
+        token = await Token.objects.acreate(user=self.user)
+        original = WalletSerializer.to_representation
+
+        def slow(serializer, instance):
+            time.sleep(0.05)
+            return original(serializer, instance)
+
+        with self.settings(SLOW_REQUEST_THRESHOLD_MS=20, SLOW_REQUEST_DIR=self.directory), \
+                patch.object(WalletSerializer, 'to_representation', slow):
+            response = await AsyncClient().get(
+                reverse('wallet:async-wallet'), headers={'Authorization': f'Token {token.key}'}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [sample] = os.listdir(self.directory)
+        with open(os.path.join(self.directory, sample, 'request.json')) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['route'], 'api/v1/async/wallet/')
+        self.assertGreaterEqual(summary['queries'], 2)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, sample, 'explain.txt')))
+
+    def test_fast_requests_and_rotation(self):
+        """Test requests under the threshold write nothing and only the newest samples are kept"""
+        with self.settings(SLOW_REQUEST_THRESHOLD_MS=10000, SLOW_REQUEST_DIR=self.directory):
+            self.client.get(reverse('wallet:wallet'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+        with self.settings(SLOW_REQUEST_THRESHOLD_MS=1, SLOW_REQUEST_DIR=self.directory, SLOW_REQUEST_KEEP=2):
+            for _ in range(4):
+                self.client = APIClient()
+                self.client.force_authenticate(user=self.user)
+                self.client.get(reverse('wallet:wallet'))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+
+class TracingTests(APITestCase):
+    """Test cases for transfer tracing and trace_summary"""
+
+    TRACEPARENT = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+
+    def setUp(self):
+        exporter.clear()
+        user = User.objects.create_user(username='traced', password='testpass123')
+        User.objects.create_user(username='tracedpeer', password='testpass123')
+        Wallet.objects.filter(user=user).update(balance=Decimal('100.00'))
+        self.user = User.objects.get(pk=user.pk)
+        self.client.force_authenticate(user=self.user)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'traces.jsonl')
+
+    def transfer(self, **headers):
+        return self.client.post(reverse('wallet:transfer'), {
+            'transaction_type': 'wallet_to_wallet', 'amount': '10.00', 'recipient_username': 'tracedpeer'
+        }, format='json', **headers)
+
+    def test_transfer_spans_continue_incoming_trace(self):
+        """Test the pipeline stages nest under the caller's trace and reach the file"""
+        with self.settings(TRACING_FILE=self.path):
+            response = self.transfer(HTTP_TRACEPARENT=self.TRACEPARENT)
+            exporter.flush()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        spans = {span['name']: span for span in read_spans(self.path)}
+        self.assertEqual({span['traceId'] for span in spans.values()}, {'4bf92f3577b34da6a3ce929d0e0e4736'})
+        root = spans['POST api/v1/transfer/']
+        self.assertEqual(root['parentSpanId'], '00f067aa0ba902b7')
+        self.assertEqual(spans['transfer.create']['parentSpanId'], root['spanId'])
+        self.assertEqual(spans['processor.wallet_to_wallet']['parentSpanId'], spans['processor.process']['spanId'])
+        for stage in ['transfer.validators', 'fee.calculate', 'processor.lock', 'transaction_log.write']:
+            self.assertIn(stage, spans)
+        self.assertIn({'key': 'transaction.status', 'value': {'stringValue': 'completed'}},
+                      spans['processor.process']['attributes'])
+
+    async def test_async_request_traced(self):
+        """Test the async path opens the server span and continues the incoming trace"""
+        token = await Token.objects.acreate(user=self.user)
+        with self.settings(TRACING_FILE=self.path):
+            response = await AsyncClient().get(reverse('wallet:async-wallet'), headers={
+                'Authorization': f'Token {token.key}', 'traceparent': self.TRACEPARENT
+            })
+            exporter.flush()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [root] = read_spans(self.path)
+        self.assertEqual(root['name'], 'GET api/v1/async/wallet/')
+        self.assertEqual(root['traceId'], '4bf92f3577b34da6a3ce929d0e0e4736')
+        self.assertEqual(root['parentSpanId'], '00f067aa0ba902b7')
+
+    def test_summary_and_untraced_requests(self):
+        """Test trace_summary breaks latency down by stage and nothing is recorded with tracing off"""
+        self.transfer()
+        with span('outside.trace'):
+            pass
+        self.assertEqual(exporter.flush(), 0)
+        self.assertIsNone(parse_traceparent('00-00000000000000000000000000000000-00f067aa0ba902b7-01'))
+
+        with self.settings(TRACING_FILE=self.path):
+            # A fresh client, so the tracing middleware is loaded
+            self.client = APIClient()
+            self.client.force_authenticate(user=self.user)
+            for _ in range(3):
+                self.transfer()
+            exporter.flush()
+        out = StringIO()
+        call_command('trace_summary', self.path, '--percentile', '50', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('3 transfer.create spans', output)
+        self.assertIn('transfer.validators', output)
+        self.assertIn('transaction_log.write', output)
+
+
+class MemoryProfilingTests(APITestCase):
+    """Test cases for tracemalloc snapshots, the memory endpoint and memory_report"""
+
+    def setUp(self):
+        reset_snapshots()
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        self.addCleanup(reset_snapshots)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_endpoint_is_staff_only_and_reports_growth(self):
+        """Test the memory endpoint starts tracing, then reports allocations, growth and held objects"""
+        self.client.force_authenticate(User.objects.create_user(username='curious', password='testpass123'))
+        self.assertEqual(self.client.get(reverse('wallet:memory-profile')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user(username='sre', password='x', is_staff=True))
+        with self.settings(MEMORY_SNAPSHOT_DIR=self.directory):
+            self.client.get(reverse('wallet:memory-profile'))
+            self.client.get(reverse('wallet:memory-profile'))
+            held = [User(username=f'leak{i}') for i in range(50)]
+            response = self.client.get(reverse('wallet:memory-profile'), {'save': '1', 'limit': '5'})
+
+        self.assertEqual(response.data['tracing'], 'running')
+        self.assertEqual(len(response.data['top']), 5)
+        self.assertTrue(response.data['growth'])
+        self.assertGreaterEqual(response.data['objects']['models']['auth.User'], len(held))
+        self.assertTrue(os.path.exists(response.data['saved_to']))
+
+    def test_report_diffs_dumps_with_retention(self):
+        """Test memory_report names the growing line and only MEMORY_SNAPSHOT_KEEP dumps are kept"""
+        ensure_tracing()
+        with self.settings(MEMORY_SNAPSHOT_DIR=self.directory, MEMORY_SNAPSHOT_KEEP=2):
+            save_snapshot(take_snapshot(), {**process_stats(), 'objects': object_counts()})
+            save_snapshot(take_snapshot(), {**process_stats(), 'objects': object_counts()})
+            held = [str(i) * 100 for i in range(5000)]
+            save_snapshot(take_snapshot(), {**process_stats(), 'objects': object_counts()})
+
+            out = StringIO()
+            call_command('memory_report', '--pid', str(os.getpid()), stdout=out)
+            self.assertEqual(len(os.listdir(os.path.join(self.directory, str(os.getpid())))), 4)
+
+        output = out.getvalue()
+        self.assertTrue(held)
+        self.assertRegex(output, r'wallet/tests\.py:\d+')
+        self.assertIn('queryset_cached_rows', output)
+
+
+class LogPipelineTests(TestCase):
+    """Test cases for the queued JSON logging pipeline"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'app.log')
+
+    def test_json_records_are_masked(self):
+        """Test card and mobile numbers are masked in the message and extra fields, with trace ids attached"""
+        handler = QueueingHandler(self.path, console=False)
+        logger = logging.getLogger('wallet.tests.masked')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        with self.settings(TRACING_FILE=os.path.join(os.path.dirname(self.path), 'traces.jsonl')):
+            with start_trace('test') as root:
+                logger.warning('Card %s paid from %s', '4111 1111 1111 1111', '01712345678',
+                               extra={'cvv': '123', 'card_number': '4111111111111111', 'amount': '10.00'})
+        exporter.clear()
+        handler.close()
+
+        with open(self.path) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record['message'], 'Card ****-****-****-1111 paid from ***-***-5678')
+        self.assertEqual(record['cvv'], '***')
+        self.assertEqual(record['card_number'], '****-****-****-1111')
+        self.assertEqual(record['amount'], '10.00')
+        self.assertEqual(record['trace_id'], root.trace_id)
+        self.assertEqual(record['level'], 'WARNING')
+
+    def test_sampling_lazy_formatting_and_rotation(self):
+        """Test sampled-out info records are never formatted, warnings always pass and files rotate"""
+        formatted = []
+
+        class Spy:
+            def __str__(self):
+                formatted.append(True)
+                return 'spy'
+
+        handler = QueueingHandler(self.path, max_bytes=2000, backup_count=2, console=False)
+        handler.addFilter(SamplingFilter({'chatty': 0.0}))
+        chatty = logging.getLogger('chatty.child')
+        chatty.setLevel(logging.INFO)
+        chatty.propagate = False
+        chatty.addHandler(handler)
+        self.addCleanup(chatty.removeHandler, handler)
+
+        for i in range(50):
+            chatty.info('Noise %s', Spy())
+            chatty.warning('Kept %s', i)
+        handler.close()
+
+        self.assertEqual(formatted, [])
+        files = sorted(name for name in os.listdir(os.path.dirname(self.path)) if name.startswith('app.log'))
+        self.assertEqual(files, ['app.log', 'app.log.1', 'app.log.2', 'app.log.lock'])
+        with open(self.path) as f:
+            last = [json.loads(line) for line in f][-1]
+        self.assertEqual(last['message'], 'Kept 49')
+        self.assertEqual(JsonFormatter().format(logging.makeLogRecord({'msg': 'x'}))[:7], '{"ts": ')
+
+    def test_one_writer_rotates_a_shared_file(self):
+        """Test only the lock holder rotates, the other writer follows the rename and takes over later"""
+        first = SizeAndTimeRotatingFileHandler(self.path, max_bytes=1000, backup_count=20)
+        second = SizeAndTimeRotatingFileHandler(self.path, max_bytes=1000, backup_count=20)
+        self.addCleanup(second.close)
+        for i in range(200):
+            for handler in (first, second):
+                handler.handle(logging.makeLogRecord({'msg': f'{id(handler)} record {i:03d}'}))
+
+        self.assertTrue(first.rotates())
+        self.assertFalse(second.rotates())
+        directory = os.path.dirname(self.path)
+        files = [name for name in os.listdir(directory) if name.startswith('app.log.') and name[8:].isdigit()]
+        self.assertGreater(len(files), 3)
+        lines = []
+        for name in files + ['app.log']:
+            with open(os.path.join(directory, name)) as f:
+                lines.extend(f.read().splitlines())
+        self.assertEqual(len(lines), 400)
+
+        first.close()
+        second._lock_tried_at = None
+        self.assertTrue(second.rotates())
+
+
+class SpendingAnomalyTests(TestCase):
+    """Test cases for the offline spending-anomaly job"""
+
+    def test_rolling_zscores(self):
+        """Test a spike stands out against the trailing window"""
+        matrix = np.array([[10.0] * 10 + [500.0], [10.0] * 11])
+        zscores = rolling_zscores(matrix, window=7)
+        self.assertGreater(zscores[0, -1], 100)
+        self.assertEqual(zscores[1, -1], 0)
+        self.assertTrue((zscores[:, :7] == 0).all())
+
+    def test_peer_percentiles(self):
+        """Test percentiles are ranked within each group"""
+        groups = np.array([0, 0, 0, 1, 1])
+        values = np.array([5.0, 1.0, 3.0, 7.0, 2.0])
+        percentiles, sizes = peer_percentiles(groups, values)
+        self.assertEqual(list(percentiles), [100.0, 0.0, 50.0, 100.0, 0.0])
+        self.assertEqual(list(sizes), [3, 3, 3, 2, 2])
+
+    def test_command_flags_spending_spike(self):
+        """Test the command writes flagged users to the review table"""
+        end_date = timezone.now().date() - timedelta(days=1)
+        steady = User.objects.create_user(username='steady', password='testpass123')
+        spiky = User.objects.create_user(username='spiky', password='testpass123')
+
+        for user in (steady, spiky):
+            for offset in range(14):
+                amount = Decimal('5000.00') if user == spiky and offset == 0 else Decimal('20.00')
+                txn = Transaction.objects.create(
+                    user=user,
+                    transaction_type='wallet_to_bkash',
+                    amount=amount,
+                    status='completed',
+                    mobile_number='+8801234567890'
+                )
+                created = timezone.now() - timedelta(days=offset + 1)
+                Transaction.objects.filter(pk=txn.pk).update(created_at=created)
+
+        call_command('detect_spending_anomalies', days=7, window=7, end_date=str(end_date), stdout=StringIO())
+
+        flagged = SpendingAnomaly.objects.filter(reasons__contains='zscore')
+        self.assertEqual([anomaly.user for anomaly in flagged], [spiky])
+        self.assertEqual(flagged[0].anomaly_amount, Decimal('5000.00'))
+
+
 class APITests(APITestCase):
     """Test cases for API endpoints"""
 
@@ -235,6 +1896,57 @@ class APITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn('transaction_id', response.data)
 
+    def test_transfer_quote(self):
+        """Test quoting a transfer does not create a transaction"""
+        user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('wallet:transfer-quote')
+        quote_data = {
+            'transaction_type': 'wallet_to_bkash',
+            'amount': '100.00',
+            'mobile_number': '+8801234567890'
+        }
+        response = self.client.post(url, quote_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['fee'], '1.00')
+        self.assertEqual(response.data['daily_limit_remaining'], '1000.00')
+        self.assertFalse(response.data['sufficient_balance'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_scheduled_transfer_create(self):
+        """Test scheduling a recurring transfer validates like a transfer"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        User.objects.create_user(username='landlord', password='testpass123')
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        url = reverse('wallet:scheduled-transfers-list')
+        start_at = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self.client.post(url, {
+            'transaction_type': 'wallet_to_wallet',
+            'amount': '250.00',
+            'frequency': 'monthly',
+            'start_at': start_at
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {
+            'transaction_type': 'wallet_to_wallet',
+            'amount': '250.00',
+            'recipient_username': 'landlord',
+            'frequency': 'monthly',
+            'start_at': start_at
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['recipient_username'], 'landlord')
+        self.assertEqual(response.data['next_run_at'], response.data['start_at'])
+
     def test_dashboard_access(self):
         """Test dashboard endpoint"""
         # Create user and authenticate
@@ -0,0 +1,47 @@
+# wallet/tracing.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from utils.tracing import start_trace, tracing_enabled
+
+
+class TracingMiddleware:
+    """Server span per request, continuing the trace of an incoming traceparent header"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not tracing_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def root_span(self, request):
+        return start_trace(request.method, request.headers.get('traceparent'), attributes={
+            'http.method': request.method,
+            'http.target': request.path,
+        })
+
+    def finish(self, root, request, response):
+        # The URL pattern, not the path, so spans of one endpoint group together
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match else 'unmatched'
+        root.rename(f'{request.method} {route}')
+        root.set('http.route', route)
+        root.set('http.status_code', response.status_code)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.root_span(request) as root:
+            response = self.get_response(request)
+            self.finish(root, request, response)
+        return response
+
+    async def __acall__(self, request):
+        # The span lives in a context variable, so sync_to_async work nests under it too
+        with self.root_span(request) as root:
+            response = await self.get_response(request)
+            self.finish(root, request, response)
+        return response
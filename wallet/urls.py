@@ -2,12 +2,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
-from . import views
+from . import views, async_views
 
 # Create router for viewsets
 router = DefaultRouter()
 router.register(r'cards', views.CardViewSet, basename='cards')
 router.register(r'transactions', views.TransactionViewSet, basename='transactions')
+router.register(r'scheduled-transfers', views.ScheduledTransferViewSet, basename='scheduled-transfers')
+router.register(r'disbursements', views.DisbursementJobViewSet, basename='disbursements')
 
 app_name = 'wallet'
 
@@ -24,9 +26,11 @@ urlpatterns = [
 
     # Wallet management
     path('wallet/', views.WalletView.as_view(), name='wallet'),
+    path('wallet/history/', views.WalletHistoryView.as_view(), name='wallet-history'),
 
     # Money transfer
     path('transfer/', views.TransferMoneyView.as_view(), name='transfer'),
+    path('transfer/quote/', views.TransferQuoteView.as_view(), name='transfer-quote'),
 
     # Transaction logs
     path('transaction-logs/', views.TransactionLogView.as_view(), name='transaction-logs'),
@@ -34,6 +38,18 @@ urlpatterns = [
     # Dashboard
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
 
+    # Provider circuit breakers and bulkheads (staff only)
+    path('providers/health/', views.ProviderHealthView.as_view(), name='provider-health'),
+
+    # tracemalloc report of the serving worker (staff only)
+    path('memory/', views.MemoryProfileView.as_view(), name='memory-profile'),
+
+    # Native async endpoints (serve under ASGI)
+    path('async/wallet/', async_views.wallet_detail, name='async-wallet'),
+    path('async/dashboard/', async_views.dashboard, name='async-dashboard'),
+    path('async/transactions/', async_views.transaction_list, name='async-transactions'),
+    path('async/transfer/', async_views.transfer, name='async-transfer'),
+
     # Include router URLs
     path('', include(router.urls)),
 ]
\ No newline at end of file